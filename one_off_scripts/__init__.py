@@ -1,9 +1,12 @@
+import logging
 import os
 from datetime import date, datetime
-from typing import Optional, List
+from typing import Optional, List, Type, Any, AsyncIterator
 
 from beanie import Document, Indexed, init_beanie
+from beanie.odm.operators.update import BaseUpdateOperator
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, UpdateOne, ASCENDING, DESCENDING
 
 MONGO_DB_USER: str = os.environ['MONGO_DB_USER']
 MONGO_DB_PASS: str = os.environ['MONGO_DB_PASS']
@@ -12,8 +15,21 @@ DRY_RUN: bool = os.environ.get('DRY_RUN', "True").lower() == 'true'
 
 MONGO_DATABASE_URL = f"mongodb://{MONGO_DB_USER}:{MONGO_DB_PASS}@{MONGO_DB_URL}"
 OUTPUT_FOLDER = os.environ.get("OUTPUT", "/output")
+# structured results of the batch analyzer
+ANALYTICS_FOLDER = os.environ.get("ANALYTICS_OUTPUT", "/analytics")
+# when set graphs are rendered into this folder instead of being shown
+GRAPH_OUTPUT_FOLDER: Optional[str] = os.environ.get("GRAPH_OUTPUT", None)
+GRAPH_OUTPUT_FORMAT: str = os.environ.get("GRAPH_OUTPUT_FORMAT", "svg")
 
 MONGO_QUERY = os.environ.get('QUERY', None)
+BULK_WRITE_BATCH_SIZE: int = int(os.environ.get('BULK_WRITE_BATCH_SIZE', "500"))
+
+# most starred and most recently active repositories first, _id breaks the ties so keyset pages are stable
+PRIORITY_SORT: list[tuple[str, int]] = [("star_gazers", DESCENDING), ("last_pushed_at", DESCENDING),
+                                        ("created_at", DESCENDING), ("_id", ASCENDING)]
+ID_SORT: list[tuple[str, int]] = [("_id", ASCENDING)]
+
+logger = logging.getLogger("one_off_scripts")
 
 # logging.basicConfig(level=logging.WARNING)
 
@@ -57,3 +73,81 @@ class GithubSearchResult(Document):
 
     class Settings:
         name = "github-search-results"
+        indexes = [IndexModel(PRIORITY_SORT, name="priority_sort")]
+
+
+def _get_sort_value(document: Document, field: str) -> Any:
+    return document.id if field == "_id" else getattr(document, field)
+
+
+def get_keyset_query(sort: list[tuple[str, int]], last: Document) -> dict:
+    # everything strictly after the last document in the sort order:
+    # (a > x) or (a == x and b > y) or (a == x and b == y and c > z) ...
+    alternatives: list[dict] = []
+
+    for i, (field, direction) in enumerate(sort):
+        alternative = {f: _get_sort_value(last, f) for f, _ in sort[:i]}
+        alternative[field] = {"$gt" if direction == ASCENDING else "$lt": _get_sort_value(last, field)}
+        alternatives.append(alternative)
+
+    return {"$or": alternatives}
+
+
+async def iterate_pages(document_model: Type[Document], query: dict, sort: list[tuple[str, int]],
+                        page_size: int) -> AsyncIterator[list[Document]]:
+    # keyset pagination, unlike skip it costs the same for every page and does not skip documents
+    # when the processed ones stop matching the query
+    if sort[-1][0] != "_id":
+        raise RuntimeError("Keyset pagination needs _id as the last sort key")
+
+    last: Optional[Document] = None
+
+    while True:
+        page_query = query if last is None else {"$and": [query, get_keyset_query(sort, last)]}
+
+        # noinspection PyTypeChecker
+        results: list[Document] = await document_model.find(page_query).sort(sort).limit(page_size).to_list()
+
+        if not results:
+            return
+
+        yield results
+
+        last = results[-1]
+
+
+class BulkUpdater:
+    # buffers per document updates, they are sent as unordered bulk writes of batch_size operations
+
+    def __init__(self, document_model: Type[Document], batch_size: int = BULK_WRITE_BATCH_SIZE):
+        self.document_model = document_model
+        self.batch_size = batch_size
+        self.written = 0
+        self._operations: list[UpdateOne] = []
+
+    async def update(self, document_id: Any, *operators: BaseUpdateOperator):
+        update: dict = {}
+        for operator in operators:
+            for key, value in operator.query.items():
+                update.setdefault(key, {}).update(value)
+
+        self._operations.append(UpdateOne({"_id": document_id}, update))
+
+        if len(self._operations) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self._operations:
+            return
+
+        operations, self._operations = self._operations, []
+        result = await self.document_model.get_motor_collection().bulk_write(operations, ordered=False)
+        self.written += len(operations)
+
+        logger.info(f"Bulk wrote {len(operations)} updates ({result.modified_count} modified)")
+
+    async def __aenter__(self) -> "BulkUpdater":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.flush()
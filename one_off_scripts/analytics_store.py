@@ -0,0 +1,216 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Iterable, Optional
+
+from one_off_scripts import ANALYTICS_FOLDER
+from one_off_scripts.batch_analyzer import RepoAnalysisRecord, RESULTS_FILE_NAME
+
+ANALYTICS_DB_FILE_NAME = "analytics.sqlite"
+# records per transaction while ingesting
+INGEST_BATCH_SIZE = 1000
+
+logger = logging.getLogger("analytics_store")
+logger.setLevel(logging.INFO)
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS repos ("
+    "id INTEGER PRIMARY KEY, "
+    "repo_id TEXT NOT NULL UNIQUE, "
+    "status TEXT NOT NULL, "
+    "error TEXT, "
+    "total_file_count INTEGER, "
+    "total_seconds REAL, "
+    "resource_count INTEGER NOT NULL, "
+    "connection_count INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS resources ("
+    "id INTEGER PRIMARY KEY, "
+    "repo INTEGER NOT NULL REFERENCES repos(id), "
+    "name TEXT NOT NULL, "
+    "resource_class TEXT NOT NULL, "
+    "cloud_resource_type TEXT NOT NULL)",
+    # graph nodes are not resources, the ends of an edge are kept by name and type
+    "CREATE TABLE IF NOT EXISTS edges ("
+    "id INTEGER PRIMARY KEY, "
+    "repo INTEGER NOT NULL REFERENCES repos(id), "
+    "a TEXT NOT NULL, "
+    "a_type TEXT NOT NULL, "
+    "b TEXT NOT NULL, "
+    "b_type TEXT NOT NULL, "
+    "justification TEXT NOT NULL)",
+    # results file -> bytes already ingested, the file is append only
+    "CREATE TABLE IF NOT EXISTS ingested ("
+    "path TEXT PRIMARY KEY, "
+    "offset INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS repos_status ON repos (status)",
+    "CREATE INDEX IF NOT EXISTS resources_type ON resources (cloud_resource_type, repo)",
+    "CREATE INDEX IF NOT EXISTS resources_class ON resources (resource_class, repo)",
+    "CREATE INDEX IF NOT EXISTS resources_repo ON resources (repo)",
+    "CREATE INDEX IF NOT EXISTS edges_type ON edges (a_type, b_type, repo)",
+    "CREATE INDEX IF NOT EXISTS edges_repo ON edges (repo)",
+]
+
+
+class AnalyticsStore:
+
+    def __init__(self, path: str = f"{ANALYTICS_FOLDER}/{ANALYTICS_DB_FILE_NAME}"):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+
+        for statement in SCHEMA:
+            self._connection.execute(statement)
+        self._connection.commit()
+
+    def _put_record(self, record: RepoAnalysisRecord):
+        # a repo analysed again replaces its previous rows
+        self._connection.execute(
+            "INSERT INTO repos (repo_id, status, error, total_file_count, total_seconds, resource_count, "
+            "connection_count) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (repo_id) DO UPDATE SET status = excluded.status, error = excluded.error, "
+            "total_file_count = excluded.total_file_count, total_seconds = excluded.total_seconds, "
+            "resource_count = excluded.resource_count, connection_count = excluded.connection_count",
+            (record.repo_id, record.status, record.error, record.total_file_count, record.timings.get("total"),
+             len(record.resources), len(record.connections)))
+
+        (repo,) = self._connection.execute("SELECT id FROM repos WHERE repo_id = ?", (record.repo_id,)).fetchone()
+
+        self._connection.execute("DELETE FROM resources WHERE repo = ?", (repo,))
+        self._connection.execute("DELETE FROM edges WHERE repo = ?", (repo,))
+
+        self._connection.executemany(
+            "INSERT INTO resources (repo, name, resource_class, cloud_resource_type) VALUES (?, ?, ?, ?)",
+            [(repo, x.name, x.resource_class, x.cloud_resource_type.value) for x in record.resources])
+        self._connection.executemany(
+            "INSERT INTO edges (repo, a, a_type, b, b_type, justification) VALUES (?, ?, ?, ?, ?, ?)",
+            [(repo, x.a, x.a_type.value, x.b, x.b_type.value, json.dumps(x.justification))
+             for x in record.connections])
+
+    def ingest(self, results_path: str = f"{ANALYTICS_FOLDER}/{RESULTS_FILE_NAME}") -> int:
+        # bulk loads the batch analyzer results, only the lines appended since the last ingestion are read
+        results_path = os.path.abspath(results_path)
+
+        # nothing analysed yet
+        if not os.path.exists(results_path):
+            return 0
+
+        row = self._connection.execute("SELECT offset FROM ingested WHERE path = ?", (results_path,)).fetchone()
+        offset = row[0] if row else 0
+
+        if os.path.getsize(results_path) < offset:
+            logger.warning(f"{results_path} shrank since the last ingestion, ingesting it from the start")
+            offset = 0
+
+        started = time.monotonic()
+        count = 0
+
+        with open(results_path, 'rb') as file:
+            file.seek(offset)
+            batch: list[RepoAnalysisRecord] = []
+
+            while True:
+                line = file.readline()
+
+                # a partially written last line is left for the next ingestion
+                if not line.endswith(b"\n"):
+                    break
+
+                if line.strip():
+                    try:
+                        batch.append(RepoAnalysisRecord.model_validate_json(line))
+                    except ValueError:
+                        logger.warning(f"Skipping unreadable record at byte {offset} of {results_path}")
+
+                offset += len(line)
+
+                if len(batch) >= INGEST_BATCH_SIZE:
+                    count += self._put_batch(results_path, batch, offset)
+                    batch = []
+
+            count += self._put_batch(results_path, batch, offset)
+
+        logger.info(f"Ingested {count} records from {results_path} in {time.monotonic() - started:.1f}s")
+
+        return count
+
+    def _put_batch(self, results_path: str, batch: list[RepoAnalysisRecord], offset: int) -> int:
+        # the records and the offset they end at are committed together
+        with self._connection:
+            for record in batch:
+                self._put_record(record)
+            self._connection.execute("INSERT OR REPLACE INTO ingested VALUES (?, ?)", (results_path, offset))
+
+        return len(batch)
+
+    def _get_repos_with_all(self, column: str, values: Iterable[str]) -> list[str]:
+        values = sorted(set(values))
+
+        # every repo has all of no values
+        if not values:
+            return [x[0] for x in self._connection.execute("SELECT repo_id FROM repos ORDER BY repo_id")]
+
+        placeholders = ", ".join("?" for _ in values)
+
+        rows = self._connection.execute(
+            f"SELECT repos.repo_id FROM resources JOIN repos ON repos.id = resources.repo "
+            f"WHERE resources.{column} IN ({placeholders}) "
+            f"GROUP BY resources.repo HAVING COUNT(DISTINCT resources.{column}) = ? "
+            f"ORDER BY repos.repo_id", (*values, len(values)))
+
+        return [x[0] for x in rows]
+
+    def get_repos_with_resource_types(self, cloud_resource_types: Iterable[str]) -> list[str]:
+        # repos declaring at least one resource of every given type
+        return self._get_repos_with_all("cloud_resource_type", cloud_resource_types)
+
+    def get_repos_with_resource_classes(self, resource_classes: Iterable[str]) -> list[str]:
+        # eg: filestorage_to_analytics.WORTHY_CLASSES
+        return self._get_repos_with_all("resource_class", resource_classes)
+
+    def get_repos_with_connection(self, a_type: str, b_type: Optional[str] = None) -> list[str]:
+        if b_type is None:
+            rows = self._connection.execute(
+                "SELECT DISTINCT repos.repo_id FROM edges JOIN repos ON repos.id = edges.repo "
+                "WHERE edges.a_type = ? ORDER BY repos.repo_id", (a_type,))
+        else:
+            rows = self._connection.execute(
+                "SELECT DISTINCT repos.repo_id FROM edges JOIN repos ON repos.id = edges.repo "
+                "WHERE edges.a_type = ? AND edges.b_type = ? ORDER BY repos.repo_id", (a_type, b_type))
+
+        return [x[0] for x in rows]
+
+    def get_connection_type_counts(self) -> dict[tuple[str, str], tuple[int, int]]:
+        # (a type, b type) -> (connection count, repo count)
+        rows = self._connection.execute(
+            "SELECT a_type, b_type, COUNT(*), COUNT(DISTINCT repo) FROM edges GROUP BY a_type, b_type")
+
+        return {(a, b): (count, repo_count) for a, b, count, repo_count in rows}
+
+    def get_resource_type_counts(self) -> dict[str, tuple[int, int]]:
+        # type -> (resource count, repo count)
+        rows = self._connection.execute(
+            "SELECT cloud_resource_type, COUNT(*), COUNT(DISTINCT repo) FROM resources GROUP BY cloud_resource_type")
+
+        return {x: (count, repo_count) for x, count, repo_count in rows}
+
+    def get_status_counts(self) -> dict[str, int]:
+        return dict(self._connection.execute("SELECT status, COUNT(*) FROM repos GROUP BY status"))
+
+    def close(self):
+        self._connection.close()
+
+
+def main():
+    store = AnalyticsStore()
+    store.ingest()
+    logger.info(f"Status counts: {store.get_status_counts()}")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
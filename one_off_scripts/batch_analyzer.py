@@ -0,0 +1,370 @@
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Iterable, Iterator, Union, TextIO
+
+import numpy as np
+from pydantic import BaseModel
+
+from one_off_scripts import OUTPUT_FOLDER, GRAPH_OUTPUT_FOLDER, GRAPH_OUTPUT_FORMAT, ANALYTICS_FOLDER
+from one_off_scripts.filestorage_to_analytics import analyze_repo, RepoAnalytics
+from terraform_analyzer import ui
+from terraform_analyzer.core import metrics
+from terraform_analyzer.core.profiling import Profiler, NOOP_PROFILER, PROFILE_ENABLED
+from terraform_analyzer.core.hcl import CloudResourceType, CLOUD_RESOURCE_TYPE_INDEX
+from terraform_analyzer.core.schema import schema_factory, GraphTf, ComponentTf, NodeTf
+from terraform_analyzer.core.schema.schema_stats import ConnectionTypeStats
+
+BATCH_MAX_WORKERS: Optional[int] = int(os.environ["BATCH_MAX_WORKERS"]) if "BATCH_MAX_WORKERS" in os.environ else None
+# repos to analyse, one author/project per line, every repo of the output folder when not set
+REPO_LIST: Optional[str] = os.environ.get("REPO_LIST", None)
+# failed repos are completed too, unless they should be retried
+RETRY_FAILED: bool = os.environ.get("RETRY_FAILED", "False").lower() == 'true'
+
+RESULTS_FILE_NAME = "results.jsonl"
+SUMMARY_FILE_NAME = "summary.json"
+# futures submitted per worker, enough to keep them busy without queueing the whole corpus
+IN_FLIGHT_PER_WORKER = 4
+# bytes read at a time when looking for the end of the last complete line
+TAIL_CHUNK_SIZE = 64 * 1024
+SLOWEST_REPO_COUNT = 10
+# each worker process exports its metrics to <prefix><pid>, series are told apart by their process label
+WORKER_METRICS_PREFIX = "batch_analyzer_"
+
+STATUS_OK = "ok"
+STATUS_NO_MAIN = "no_main"
+STATUS_MISSING_FILES = "missing_files"
+STATUS_FAILED = "failed"
+
+logger = logging.getLogger("batch_analyzer")
+# filestorage_to_analytics configures the root logger to WARNING
+logger.setLevel(logging.INFO)
+
+
+class ResourceRecord(BaseModel):
+    name: str
+    resource_class: str
+    cloud_resource_type: CloudResourceType
+
+
+class ConnectionRecord(BaseModel):
+    a: str
+    a_type: CloudResourceType
+    b: str
+    b_type: CloudResourceType
+    justification: list[str]
+
+
+class RepoAnalysisRecord(BaseModel):
+    repo_id: str
+    status: str
+    error: Optional[str] = None
+    # stage -> seconds
+    timings: dict[str, float] = {}
+    total_file_count: Optional[int] = None
+    resources: list[ResourceRecord] = []
+    connections: list[ConnectionRecord] = []
+
+    def get_connection_codes(self) -> np.ndarray:
+        return np.array([(CLOUD_RESOURCE_TYPE_INDEX[x.a_type], CLOUD_RESOURCE_TYPE_INDEX[x.b_type])
+                         for x in self.connections], dtype=np.int64).reshape(-1, 2)
+
+    def get_resource_codes(self) -> np.ndarray:
+        return np.array([CLOUD_RESOURCE_TYPE_INDEX[x.cloud_resource_type] for x in self.resources], dtype=np.int64)
+
+
+def _get_endpoint_name(component_or_node: Union[ComponentTf, NodeTf]) -> str:
+    if isinstance(component_or_node, ComponentTf):
+        return component_or_node.terraform_resource.get_qualified_name()
+
+    return f"node:{component_or_node.get_cloud_resource_type().value}"
+
+
+def to_record(repo_analytics: RepoAnalytics, graph: GraphTf) -> RepoAnalysisRecord:
+    resources = [ResourceRecord(name=x.get_qualified_name(),
+                                resource_class=x.__class__.__name__,
+                                cloud_resource_type=x.get_cloud_resource_type())
+                 for x in repo_analytics.terraform_resources]
+
+    connections = [ConnectionRecord(a=_get_endpoint_name(x.a),
+                                    a_type=x.a.get_cloud_resource_type(),
+                                    b=_get_endpoint_name(x.b),
+                                    b_type=x.b.get_cloud_resource_type(),
+                                    justification=sorted(x.justification))
+                   for x in graph.connections]
+
+    return RepoAnalysisRecord(repo_id=repo_analytics.repo_id,
+                              status=STATUS_OK,
+                              total_file_count=repo_analytics.total_file_count,
+                              resources=resources,
+                              connections=connections)
+
+
+def analyze(repo_id: str, profile: bool = PROFILE_ENABLED) -> RepoAnalysisRecord:
+    # runs in the worker processes, never raises so one bad repo does not take the batch down
+    profiler = Profiler(repo_id) if profile else NOOP_PROFILER
+
+    with profiler:
+        record = _analyze(repo_id, profiler)
+
+    # the parser stages are only known when profiling
+    record.timings.update(profiler.timings)
+
+    # metrics are kept per process, each worker rewrites its own summary as it goes
+    metrics.export(f"{WORKER_METRICS_PREFIX}{os.getpid()}")
+
+    return record
+
+
+def _analyze(repo_id: str, profiler: Profiler) -> RepoAnalysisRecord:
+    timings: dict[str, float] = {}
+    started = time.perf_counter()
+
+    try:
+        repo_analytics: Optional[RepoAnalytics] = analyze_repo(repo_id, profiler)
+        timings["analyze"] = time.perf_counter() - started
+
+        if repo_analytics is None:
+            record = RepoAnalysisRecord(repo_id=repo_id, status=STATUS_NO_MAIN)
+        else:
+            stage_started = time.perf_counter()
+            with profiler.stage("graph"):
+                graph: GraphTf = schema_factory.build_graph(repo_analytics.terraform_resources)
+            timings["graph"] = time.perf_counter() - stage_started
+
+            record = to_record(repo_analytics, graph)
+
+            if GRAPH_OUTPUT_FOLDER:
+                stage_started = time.perf_counter()
+                ui.render_graph(graph,
+                                f"{GRAPH_OUTPUT_FOLDER}/{repo_id}.{GRAPH_OUTPUT_FORMAT}",
+                                layout_cache_folder=f"{GRAPH_OUTPUT_FOLDER}/.layouts")
+                timings["render"] = time.perf_counter() - stage_started
+    except FileNotFoundError as e:
+        record = RepoAnalysisRecord(repo_id=repo_id,
+                                    status=STATUS_MISSING_FILES,
+                                    error=f"{type(e).__name__}: {os.path.basename(str(e.filename))}")
+    except Exception as e:
+        logger.error(f"Failed to analyze {repo_id}", exc_info=e)
+        record = RepoAnalysisRecord(repo_id=repo_id, status=STATUS_FAILED, error=f"{type(e).__name__}: {e}")
+
+    timings["total"] = time.perf_counter() - started
+    record.timings = timings
+
+    return record
+
+
+def read_records(results_path: str) -> Iterator[RepoAnalysisRecord]:
+    if not os.path.exists(results_path):
+        return
+
+    with open(results_path, 'r') as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield RepoAnalysisRecord.model_validate_json(line)
+            except ValueError:
+                # the last line of a killed run may be partially written
+                logger.warning(f"Skipping unreadable line {line_number} of {results_path}")
+
+
+def open_results(results_path: str) -> TextIO:
+    # append mode, the partial last line of a killed run is dropped first so the next record gets a line of its own
+    if os.path.exists(results_path):
+        with open(results_path, 'rb+') as file:
+            end = file.seek(0, os.SEEK_END)
+            size = end
+
+            while end > 0:
+                start = max(end - TAIL_CHUNK_SIZE, 0)
+                file.seek(start)
+                newline = file.read(end - start).rfind(b"\n")
+
+                if newline != -1:
+                    end = start + newline + 1
+                    break
+
+                end = start
+
+            if end != size:
+                logger.warning(f"Dropping the partial last line of {results_path} ({size - end} bytes)")
+                file.truncate(end)
+
+    return open(results_path, 'a')
+
+
+def get_completed(results_path: str, retry_failed: bool = RETRY_FAILED) -> set[str]:
+    completed: set[str] = set()
+
+    for record in read_records(results_path):
+        if retry_failed and record.status == STATUS_FAILED:
+            completed.discard(record.repo_id)
+        else:
+            completed.add(record.repo_id)
+
+    return completed
+
+
+def list_repos(output_folder: str = OUTPUT_FOLDER, repo_list: Optional[str] = REPO_LIST) -> list[str]:
+    if repo_list:
+        with open(repo_list, 'r') as file:
+            return [x.strip() for x in file if x.strip()]
+
+    repo_ids: list[str] = []
+
+    with os.scandir(output_folder) as authors:
+        for author in authors:
+            if not author.is_dir():
+                continue
+            with os.scandir(author.path) as projects:
+                repo_ids.extend(f"{author.name}/{x.name}" for x in projects if x.is_dir())
+
+    return sorted(repo_ids)
+
+
+def summarise(results_path: str) -> dict:
+    # the last record of a repo wins, so retried repos are counted once
+    records: dict[str, tuple[str, float, Optional[str]]] = {}
+    stats_by_repo: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+    for record in read_records(results_path):
+        records[record.repo_id] = (record.status, record.timings.get("total", 0.0), record.error)
+        if record.status == STATUS_OK:
+            stats_by_repo[record.repo_id] = (record.get_connection_codes(), record.get_resource_codes())
+        else:
+            stats_by_repo.pop(record.repo_id, None)
+
+    stats = ConnectionTypeStats()
+    for connection_codes, resource_codes in stats_by_repo.values():
+        stats.add_codes(connection_codes, resource_codes)
+
+    status_counts: dict[str, int] = {}
+    error_counts: dict[str, int] = {}
+    for status, _, error in records.values():
+        status_counts[status] = status_counts.get(status, 0) + 1
+        if error:
+            error_type = error.split(":", 1)[0]
+            error_counts[error_type] = error_counts.get(error_type, 0) + 1
+
+    times = np.array([x[1] for x in records.values()], dtype=np.float64)
+    slowest = sorted(records.items(), key=lambda x: x[1][1], reverse=True)[:SLOWEST_REPO_COUNT]
+
+    return {
+        "repo_count": len(records),
+        "status_counts": status_counts,
+        "error_counts": error_counts,
+        "seconds": {
+            "total": float(times.sum()),
+            "mean": float(times.mean()) if len(times) else 0.0,
+            "p50": float(np.percentile(times, 50)) if len(times) else 0.0,
+            "p95": float(np.percentile(times, 95)) if len(times) else 0.0,
+            "max": float(times.max()) if len(times) else 0.0,
+        },
+        "slowest": [{"repo_id": repo_id, "seconds": seconds, "status": status}
+                    for repo_id, (status, seconds, _) in slowest],
+        "connection_stats": stats.to_dict(),
+    }
+
+
+def run_batch(repo_ids: Iterable[str],
+              analytics_folder: str = ANALYTICS_FOLDER,
+              max_workers: Optional[int] = BATCH_MAX_WORKERS) -> dict:
+    os.makedirs(analytics_folder, exist_ok=True)
+    results_path = f"{analytics_folder}/{RESULTS_FILE_NAME}"
+
+    completed = get_completed(results_path)
+    # the workers of previous runs had other pids
+    metrics.remove_exports(WORKER_METRICS_PREFIX)
+    pending: list[str] = [x for x in dict.fromkeys(repo_ids) if x not in completed]
+    logger.info(f"Analysing {len(pending)} repos, {len(completed)} already completed")
+
+    max_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = max_workers * IN_FLIGHT_PER_WORKER
+    started = time.monotonic()
+    written = 0
+
+    with open_results(results_path) as results_file:
+
+        def write(record: RepoAnalysisRecord):
+            nonlocal written
+            results_file.write(record.model_dump_json() + "\n")
+            # flushed per repo, a crash loses at most the repos in flight
+            results_file.flush()
+            written += 1
+
+            if written % 100 == 0:
+                rate = written / (time.monotonic() - started) * 60
+                logger.info(f"Analysed {written}/{len(pending)} repos ({rate:.1f} repos/min)")
+
+        # repos leave the queues once submitted, a pool that breaks while they are submitted does not lose them
+        remaining: deque[str] = deque(pending)
+        # repos in flight when a worker died, run again one at a time to find the one that killed it
+        suspects: deque[str] = deque()
+
+        while remaining or suspects:
+            in_flight: dict[Future, str] = {}
+
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                try:
+                    while suspects:
+                        future = executor.submit(analyze, suspects[0])
+                        in_flight[future] = suspects.popleft()
+                        write(future.result())
+                        in_flight.pop(future)
+
+                    while True:
+                        while remaining and len(in_flight) < max_in_flight:
+                            future = executor.submit(analyze, remaining[0])
+                            in_flight[future] = remaining.popleft()
+
+                        if not in_flight:
+                            break
+
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            write(future.result())
+                            in_flight.pop(future)
+                except BrokenProcessPool as e:
+                    # a worker died (eg: out of memory), its repo can not be told apart from the others in flight
+                    unfinished: list[str] = []
+                    for future, repo_id in in_flight.items():
+                        if future.done() and future.exception() is None:
+                            write(future.result())
+                        else:
+                            unfinished.append(repo_id)
+
+                    if len(in_flight) > 1:
+                        logger.error(f"Worker pool broke with {len(in_flight)} repos in flight, restarting it and "
+                                     f"running {len(unfinished)} of them again one at a time", exc_info=e)
+                        suspects.extend(unfinished)
+                    else:
+                        for repo_id in unfinished:
+                            logger.error(f"{repo_id} killed its worker, restarting the pool", exc_info=e)
+                            write(RepoAnalysisRecord(repo_id=repo_id, status=STATUS_FAILED,
+                                                     error=f"{type(e).__name__}: worker process died"))
+
+    summary = summarise(results_path)
+
+    with open(f"{analytics_folder}/{SUMMARY_FILE_NAME}", 'w') as file:
+        json.dump(summary, file, indent=2)
+
+    logger.info(f"Finished, wrote {written} records in {time.monotonic() - started:.1f}s")
+    logger.info(f"Status counts: {summary['status_counts']} errors: {summary['error_counts']}")
+    logger.info(f"Seconds per repo: {summary['seconds']}")
+
+    return summary
+
+
+def main():
+    # the analytics store is loaded afterwards with python -m one_off_scripts.analytics_store, it parses the records
+    # of this module and can not be imported by it (the pipeline, importing both, ingests at the end of its runs)
+    run_batch(list_repos())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,20 @@
 import logging
 import os
-import subprocess
 import time
 from typing import Optional
 
 from pydantic import BaseModel
 
-from one_off_scripts import OUTPUT_FOLDER
+from one_off_scripts import OUTPUT_FOLDER, GRAPH_OUTPUT_FOLDER, GRAPH_OUTPUT_FORMAT
 from terraform_analyzer import LocalResource, ui
+from terraform_analyzer.core import repo_inventory
+from terraform_analyzer.core.profiling import Profiler, NOOP_PROFILER
+from terraform_analyzer.core.repo_inventory import RepoInventory
 from terraform_analyzer.core.hcl import hcl_project_parser
 from terraform_analyzer.core.hcl.hcl_obj import TerraformResource
 from terraform_analyzer.core.hcl.hcl_obj.hcl_resources import AwsLambda, AwsDynamoDb, AwsApiGatewayRestApi
 from terraform_analyzer.core.schema import schema_factory, GraphTf
+from terraform_analyzer.core.schema.schema_stats import ConnectionTypeStats
 
 logger = logging.getLogger("repo_tf_fetcher")
 logging.basicConfig(level=logging.WARNING)
@@ -20,7 +23,7 @@ logging.basicConfig(level=logging.WARNING)
 WORTHY_CLASSES: set[str] = set(x.__name__ for x in [AwsApiGatewayRestApi, AwsLambda, AwsDynamoDb])
 
 ERRORS = 0
-TOTAL_CONNECTIONS = 0
+CONNECTION_STATS = ConnectionTypeStats()
 
 
 class RepoAnalytics(BaseModel):
@@ -59,15 +62,6 @@ class RepoAnalytics(BaseModel):
 
 
 
-def _get_file_count(full_path: str) -> int:
-    cmd = f"find {full_path} | wc -l"
-    result = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, text=True)
-
-    file_count = int(result.stdout.removesuffix('\n'))
-
-    return file_count
-
-
 def _get_repo_id(path: str) -> str:
     repo_name = os.listdir(path)[0]
     author_name = os.path.basename(path)
@@ -75,32 +69,12 @@ def _get_repo_id(path: str) -> str:
     return f"{author_name}/{repo_name}"
 
 
-# noinspection PyUnboundLocalVariable
-def _get_root_main_path(project_path: str) -> Optional[str]:
-    cmd = f"find {project_path} | grep -i main.tf"
-    result = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, text=True)
-
-    mains: [str] = result.stdout.split('\n')
-
-    root_main: Optional[str] = None
-    min_level = 100
-    for main_tf in mains:
-        if not main_tf:
-            continue
-        level = main_tf.count('/')
-
-        if min_level > level:
-            min_level = level
-            root_main = main_tf
-
-    return root_main
-
-
-def analyze_repo(repo_id: str) -> Optional[RepoAnalytics]:
+def analyze_repo(repo_id: str, profiler: Profiler = NOOP_PROFILER) -> Optional[RepoAnalytics]:
     project_path = f"{OUTPUT_FOLDER}/{repo_id}"
-    file_count: int = _get_file_count(project_path)
+    # one walk of the repo gives the file count, the root main.tf and the folder listings of the parser
+    inventory: RepoInventory = repo_inventory.get_inventory(project_path)
 
-    root_main_path = _get_root_main_path(project_path)
+    root_main_path = inventory.get_root_main()
 
     if not root_main_path:
         # https://github.com/mbrydak/glowing-couscous/tree/main/task2/terraform/net
@@ -116,9 +90,9 @@ def analyze_repo(repo_id: str) -> Optional[RepoAnalytics]:
                                   name=name,
                                   is_directory=False)
 
-    component_list: list[TerraformResource] = hcl_project_parser.parse_project(main_resource)
+    component_list: list[TerraformResource] = hcl_project_parser.parse_project(main_resource, inventory, profiler)
 
-    return RepoAnalytics(total_file_count=file_count,
+    return RepoAnalytics(total_file_count=inventory.file_count,
                          repo_id=repo_id,
                          num_of_resources=len(component_list),
                          type_of_resources={x.__class__.__name__ for x in component_list},
@@ -146,10 +120,14 @@ def analyze_single_repo(repo_id: str) -> bool:
               f"res_types={repo_analytics.type_of_resources}\n\t"
               f"res_names={repo_analytics.get_res_names()}\n")
 
-        ui.show_graph(graph)
+        if GRAPH_OUTPUT_FOLDER:
+            ui.render_graph(graph,
+                            f"{GRAPH_OUTPUT_FOLDER}/{repo_id}.{GRAPH_OUTPUT_FORMAT}",
+                            layout_cache_folder=f"{GRAPH_OUTPUT_FOLDER}/.layouts")
+        else:
+            ui.show_graph(graph)
 
-        global TOTAL_CONNECTIONS
-        TOTAL_CONNECTIONS += len(connections)
+        CONNECTION_STATS.add_graph(graph)
         return True
 
     except FileNotFoundError as e:
@@ -201,7 +179,8 @@ def main():
                  f"count={count}\n" \
                  f"unskiped_repos={unskiped_repos}\n" \
                  f"skiped_repos={skiped_repos}\n" \
-                 f"total_connections_count={TOTAL_CONNECTIONS}\n" \
+                 f"total_connections_count={CONNECTION_STATS.get_total_connections()}\n" \
+                 f"connection_stats={CONNECTION_STATS}\n" \
                  f"Missing files:{ERRORS}\n######"
     print(output_str)
     # open("/home/duarte/Documents/Personal/Code/TerraformCSP/output.log", 'a').write(output_str)
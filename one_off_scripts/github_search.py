@@ -1,24 +1,41 @@
 import asyncio
 import logging
+import os
 from datetime import datetime, date, time, timedelta
-from typing import List, Coroutine, Optional
+from typing import List, Optional, Callable, Awaitable
 
 from beanie.odm.operators.update.general import Set
 from github.PaginatedList import PaginatedList
 from github.Repository import Repository
+from pymongo.errors import BulkWriteError
 
 from one_off_scripts import GithubConfig, GithubSearchResult, GithubSearchResultDay, DRY_RUN, initialize_db
 from terraform_analyzer.external import github_client
 
 CONFIG_NAME = "github_config"
 CURRENT_DATE = datetime(2024, 3, 1)
+EARLIEST_DATE = date(2008, 1, 1)
 DATE_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# the search API never returns more than 1000 results for a query, windows reaching it are split in two
+SEARCH_RESULT_CAP = 1000
+MIN_WINDOW = timedelta(seconds=1)
+# concurrent search queries, the rate limit scheduler keeps them within the search budget
+SEARCH_CONCURRENCY = int(os.environ.get("SEARCH_CONCURRENCY", "4"))
+# days harvested concurrently before the progress is saved
+SEARCH_PARALLEL_DAYS = int(os.environ.get("SEARCH_PARALLEL_DAYS", "8"))
+INSERT_BATCH_SIZE = 1000
+DUPLICATE_KEY_ERROR = 11000
 
 MONGO_DATABASE_NAME = "thesis"
 
 # logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger("github_search")
 
+# called with the results a search inserted, repos harvested before are left out
+OnInserted = Optional[Callable[[List[GithubSearchResult]], Awaitable[None]]]
+
 
 async def get_github_config() -> GithubConfig:
     result: GithubConfig = await GithubConfig.find_one(GithubConfig.config_name == CONFIG_NAME)
@@ -37,114 +54,161 @@ async def get_github_config() -> GithubConfig:
     return gc
 
 
-async def search_code(d: date, config: GithubConfig) -> int:
-    date_str = d.strftime(DATE_FORMAT)
+def _to_search_result(repo: Repository) -> GithubSearchResult:
+    return GithubSearchResult(
+        id=repo.full_name,
+        repo_name=repo.name,
+        star_gazers=repo.stargazers_count,
+        archived=repo.archived,
+        is_fork=repo.fork,
+        created_at=repo.created_at,
+        last_pushed_at=repo.pushed_at,
+        description=repo.description,
+        # the public raw_data completes the object first, one extra request per repo. Search items already
+        # carry the whole repository payload, so the attributes PyGithub was built from are stored as they are
+        all_attributes=repo._rawData
+    )
+
+
+def _fetch_window(start: datetime, end: datetime) -> tuple[int, Optional[List[GithubSearchResult]]]:
+    # blocking, runs in a worker thread. No results when the window has to be split
+    created_query = f"{start.strftime(DATETIME_FORMAT)}..{(end - MIN_WINDOW).strftime(DATETIME_FORMAT)}"
 
-    created_query = f"{date_str}..{date_str}"
-    # Print the list of repositories
     repositories: PaginatedList[Repository] = github_client.search_repositories(
         query="",
         language="HCL",
         created=created_query
     )
 
-    logger.info(f"\tFetching for date {date_str}, got {repositories.totalCount} results")
+    # get_page stores the total count of the response, totalCount only requests it again when it is 0
+    first_page: List[Repository] = repositories.get_page(0)
+    total_count = repositories.totalCount if first_page else 0
 
-    if not DRY_RUN:
-        await GithubSearchResultDay(day_date=date_str,
-                                    total_results=repositories.totalCount).create()
-
-    if repositories.totalCount >= 1000:
-        logger.error(f"Found a day '{date_str}' that had more than 1000 results")
-
-    results_count = 0
-    new_db_items: List[GithubSearchResult] = []
-    for repo in repositories:
-        results_count += 1
-        logger.info(f" {repo.created_at} - {repo.full_name}  {results_count}/{repositories.totalCount}")
-
-        result = GithubSearchResult(
-            id=repo.full_name,
-            repo_name=repo.name,
-            star_gazers=repo.stargazers_count,
-            archived=repo.archived,
-            is_fork=repo.fork,
-            created_at=repo.created_at,
-            last_pushed_at=repo.pushed_at,
-            description=repo.description,
-            all_attributes=repo.raw_data
-        )
-
-        new_db_items.append(result)
-
-        if results_count % 10 == 0:
-            if not DRY_RUN:
-                task1: Coroutine = GithubSearchResult.insert_many(new_db_items)
-                task2: Coroutine = config.inc({GithubConfig.total_results: len(new_db_items)})
-                await asyncio.gather(task1, task2)
-            new_db_items = []
-
-    if results_count != repositories.totalCount:
-        logger.error(f"Total count mismatch {repositories.totalCount}!={results_count}")
+    if total_count >= SEARCH_RESULT_CAP and end - start > MIN_WINDOW:
+        return total_count, None
 
-    return results_count
+    results = [_to_search_result(repo) for repo in first_page]
+    page = 1
+
+    while len(results) < min(total_count, SEARCH_RESULT_CAP):
+        repos: List[Repository] = repositories.get_page(page)
+
+        if not repos:
+            break
+
+        results.extend(_to_search_result(repo) for repo in repos)
+        page += 1
+
+    return total_count, results
+
+
+async def insert_results(results: List[GithubSearchResult], on_inserted: OnInserted = None) -> int:
+    inserted = 0
+
+    for i in range(0, len(results), INSERT_BATCH_SIZE):
+        batch = results[i:i + INSERT_BATCH_SIZE]
+        inserted_batch = batch
+
+        if not DRY_RUN:
+            try:
+                await GithubSearchResult.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # repos already harvested (eg: by an interrupted run) are expected, anything else is not
+                write_errors = e.details.get("writeErrors", [])
+                if any(x.get("code") != DUPLICATE_KEY_ERROR for x in write_errors):
+                    raise
+                failed = {x["index"] for x in write_errors}
+                inserted_batch = [x for j, x in enumerate(batch) if j not in failed]
+                logger.info(f"Skipped {len(write_errors)} already harvested repos")
+
+        inserted += len(inserted_batch)
+
+        if on_inserted is not None and inserted_batch:
+            await on_inserted(inserted_batch)
 
+    return inserted
 
-async def get_latest_result_day() -> Optional[GithubSearchResultDay]:
-    results = await GithubSearchResultDay.find() \
-        .sort(GithubSearchResultDay.day_date) \
-        .limit(1) \
-        .to_list()
-    return results[0] if results else None
 
+async def search_window(start: datetime, end: datetime, semaphore: asyncio.Semaphore,
+                        on_inserted: OnInserted = None) -> int:
+    async with semaphore:
+        total_count, results = await asyncio.to_thread(_fetch_window, start, end)
 
-async def cleanup_interrupted_day():
-    result: Optional[GithubSearchResultDay] = await get_latest_result_day()
+    if results is None:
+        middle = start + timedelta(seconds=(end - start).total_seconds() // 2)
+        logger.info(f"\tSplitting {start}..{end} with {total_count} results at {middle}")
 
-    if not result:
-        logger.warning("No days detected, assuming this is a fresh start")
-        return
+        counts = await asyncio.gather(search_window(start, middle, semaphore, on_inserted),
+                                      search_window(middle, end, semaphore, on_inserted))
+        return sum(counts)
 
-    latest_fully_processed_date: date = result.day_date + timedelta(days=1)
-    lasted_processed_datetime: datetime = datetime.combine(latest_fully_processed_date, time(0, 0, 0))
+    if total_count >= SEARCH_RESULT_CAP:
+        logger.error(f"Window {start}..{end} can't be split further and has {total_count} results")
+    elif len(results) != total_count:
+        logger.error(f"Total count mismatch for {start}..{end} {total_count}!={len(results)}")
 
-    logger.warning(f"Deleting all search results before date {lasted_processed_datetime}")
+    return await insert_results(results, on_inserted)
 
-    delete_results: list[GithubSearchResult] = await GithubSearchResult.find(
-        GithubSearchResult.created_at < lasted_processed_datetime).to_list()
 
-    logger.info(
-        f"Found {len(delete_results)} github search results that have created_at date < {lasted_processed_datetime}\n")
+async def search_day(d: date, semaphore: asyncio.Semaphore, on_inserted: OnInserted = None) -> int:
+    date_str = d.strftime(DATE_FORMAT)
+    start = datetime.combine(d, time(0, 0, 0))
+
+    results_count = await search_window(start, start + timedelta(days=1), semaphore, on_inserted)
+
+    logger.info(f"\tFetched date {date_str}, got {results_count} results")
 
     if not DRY_RUN:
-        for delete_result in delete_results:
-            logger.info(f"Deleting {delete_result.repo_name} created at {delete_result.created_at}")
-            await GithubSearchResult.delete(delete_result)
-        logger.info(f"Deleting github search result day {latest_fully_processed_date}")
-        await result.delete()
+        await GithubSearchResultDay(day_date=date_str,
+                                    total_results=results_count).create()
+
+    return results_count
 
 
-async def main():
-    await initialize_db()
+async def cleanup_interrupted_days(config: GithubConfig):
+    # days are saved in batches, anything older than the last saved day comes from an interrupted batch
+    cutoff: datetime = datetime.combine(config.last_date_queried, time(0, 0, 0))
+
+    logger.warning(f"Deleting all search results before date {cutoff}")
+
+    if not DRY_RUN:
+        await GithubSearchResult.find(GithubSearchResult.created_at < cutoff).delete()
+        await GithubSearchResultDay.find(GithubSearchResultDay.day_date < config.last_date_queried).delete()
+
+
+async def harvest(on_inserted: OnInserted = None, stop: Optional[asyncio.Event] = None):
+    # walks back in time from the last saved day, a set stop event ends it after the current batch of days
     config: GithubConfig = await get_github_config()
 
-    await cleanup_interrupted_day()
+    await cleanup_interrupted_days(config)
 
     total_results = config.total_results
 
     logger.info(f"current total results {config.total_results}")
 
     next_date: date = config.last_date_queried - timedelta(days=1)
+    semaphore = asyncio.Semaphore(SEARCH_CONCURRENCY)
 
     logger.info(f"Starting on date {next_date}")
 
-    while True:
-        total_results += await search_code(next_date, config)
+    while next_date >= EARLIEST_DATE and not (stop and stop.is_set()):
+        days: List[date] = [next_date - timedelta(days=i) for i in range(SEARCH_PARALLEL_DAYS)]
+
+        batch_results = sum(await asyncio.gather(*(search_day(d, semaphore, on_inserted) for d in days)))
+        total_results += batch_results
 
         if not DRY_RUN:
-            await config.update(Set({GithubConfig.last_date_queried: next_date}))
+            await config.update(Set({GithubConfig.last_date_queried: days[-1]}))
+            await config.inc({GithubConfig.total_results: batch_results})
+
+        logger.info(f"Finished {days[-1]}..{days[0]} with {batch_results} results, {total_results} in total")
 
-        next_date = config.last_date_queried - timedelta(days=1)
+        next_date = days[-1] - timedelta(days=1)
+
+
+async def main():
+    await initialize_db()
+    await harvest()
 
 
 if __name__ == '__main__':
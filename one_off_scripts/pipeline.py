@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Executor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, time as datetime_time
+from typing import Optional, Callable, Awaitable, Any, TextIO
+
+from beanie.odm.operators.update.general import Set
+
+from one_off_scripts import initialize_db, GithubSearchResult, GithubConfig, DRY_RUN, ANALYTICS_FOLDER, \
+    BulkUpdater, iterate_pages, PRIORITY_SORT, ID_SORT
+from one_off_scripts import github_search, repo_main_fetcher, repo_tf_fetcher, batch_analyzer
+from one_off_scripts.analytics_store import AnalyticsStore
+from one_off_scripts.batch_analyzer import RepoAnalysisRecord, STATUS_FAILED
+from terraform_analyzer.core import metrics
+from terraform_analyzer.external import rate_limit_scheduler
+
+# items waiting between two stages, a full queue makes the stage before it wait
+PIPELINE_QUEUE_SIZE: int = int(os.environ.get("PIPELINE_QUEUE_SIZE", "100"))
+# False only streams what is left in Mongo from previous runs
+PIPELINE_SEARCH: bool = os.environ.get("PIPELINE_SEARCH", "True").lower() == 'true'
+ANALYZE_WORKERS: int = batch_analyzer.BATCH_MAX_WORKERS or os.cpu_count() or 1
+# buffered status updates are written at least this often, even when the batch is not full
+PIPELINE_FLUSH_INTERVAL = 30
+STATS_LOG_INTERVAL = 60
+BACKLOG_PAGE_SIZE = 100
+
+logger = logging.getLogger("pipeline")
+logger.setLevel(logging.INFO)
+
+
+class Stage:
+    # worker tasks taking items from a bounded queue, whatever handle returns goes to the next stage
+
+    def __init__(self, name: str, workers: int, handle: Callable[[Any], Awaitable[Any]],
+                 next_stage: Optional["Stage"] = None):
+        self.name = name
+        self.workers = workers
+        self.handle = handle
+        self.next_stage = next_stage
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+        self.processed = 0
+        self.failed = 0
+        self._tasks: list[asyncio.Task] = []
+
+    async def put(self, item: Any):
+        await self.queue.put(item)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def close(self):
+        # every item put before is handled and forwarded before this returns
+        for _ in self._tasks:
+            await self.queue.put(None)
+        await asyncio.gather(*self._tasks)
+
+    async def _work(self):
+        while True:
+            item = await self.queue.get()
+
+            if item is None:
+                return
+
+            try:
+                result = await self.handle(item)
+                self.processed += 1
+            except Exception as e:
+                logger.error(f"Stage '{self.name}' failed on {item}", exc_info=e)
+                self.failed += 1
+                continue
+
+            if result is not None and self.next_stage is not None:
+                await self.next_stage.put(result)
+
+    def __str__(self) -> str:
+        return f"{self.name}(processed={self.processed} failed={self.failed} queued={self.queue.qsize()})"
+
+
+class Pipeline:
+    # search -> main.tf discovery -> download -> analysis, Mongo keeps the status of every repo and the
+    # analysis records go to the batch analyzer results file, so an interrupted run picks up where it was
+
+    def __init__(self, updater: BulkUpdater, results_file: TextIO,
+                 discover_executor: Executor, download_executor: Executor,
+                 new_analyze_executor: Callable[[], Executor]):
+        self.updater = updater
+        self.results_file = results_file
+        self.discover_executor = discover_executor
+        self.download_executor = download_executor
+        # a process pool breaks for good when one of its workers dies, it is replaced by a new one
+        self.new_analyze_executor = new_analyze_executor
+        self.analyze_executor = new_analyze_executor()
+        # the repos in flight on a broken pool run again there one at a time, to find the one that killed it
+        self.isolation_executor: Optional[Executor] = None
+        self.isolation_lock = asyncio.Lock()
+        self.stop = asyncio.Event()
+        self.started = time.monotonic()
+
+        self.analyze_stage = Stage("analyze", ANALYZE_WORKERS, self.analyze)
+        self.download_stage = Stage("download", repo_tf_fetcher.TF_FETCHER_WORKERS, self.download,
+                                    self.analyze_stage)
+        self.discover_stage = Stage("discover", repo_main_fetcher.DISCOVERY_CONCURRENCY, self.discover,
+                                    self.download_stage)
+        self.stages = [self.discover_stage, self.download_stage, self.analyze_stage]
+
+    async def _run_in(self, executor: Executor, function: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+
+    async def discover(self, result: GithubSearchResult) -> Optional[GithubSearchResult]:
+        # a failed discovery raises before the update, the repo keeps main_tf None and is retried by the next run
+        mains: list[str] = await self._run_in(self.discover_executor, repo_main_fetcher.fetch_repo_mains,
+                                              result.id, result.all_attributes.get("default_branch"))
+
+        if not DRY_RUN:
+            await self.updater.update(result.id, Set({GithubSearchResult.main_tf: mains}))
+
+        result.main_tf = mains
+
+        return result if mains else None
+
+    async def download(self, result: GithubSearchResult) -> Optional[str]:
+        # like discover, an infrastructure error raises before the update and the repo is retried by the next run
+        downloaded: bool = await self._run_in(self.download_executor, repo_tf_fetcher.download_repo, result)
+
+        if not DRY_RUN:
+            await self.updater.update(result.id, Set({GithubSearchResult.downloaded: downloaded}))
+
+        return result.id if downloaded else None
+
+    async def analyze(self, repo_id: str) -> None:
+        executor = self.analyze_executor
+
+        try:
+            record: RepoAnalysisRecord = await self._run_in(executor, batch_analyzer.analyze, repo_id)
+        except BrokenProcessPool as e:
+            # a worker died (eg: out of memory), every repo in flight on the pool fails with it
+            logger.warning(f"Analysis pool broke while analysing {repo_id}, running it again alone", exc_info=e)
+            self._replace_analyze_executor(executor)
+            record = await self._analyze_alone(repo_id)
+
+        self.results_file.write(record.model_dump_json() + "\n")
+        self.results_file.flush()
+
+    async def _analyze_alone(self, repo_id: str) -> RepoAnalysisRecord:
+        async with self.isolation_lock:
+            if self.isolation_executor is None:
+                self.isolation_executor = self.new_analyze_executor()
+            executor = self.isolation_executor
+
+            try:
+                return await self._run_in(executor, batch_analyzer.analyze, repo_id)
+            except BrokenProcessPool as e:
+                # nothing else was running on it, this repo killed the worker
+                logger.error(f"{repo_id} killed its analysis worker", exc_info=e)
+                self.isolation_executor = None
+                executor.shutdown(wait=False)
+                return RepoAnalysisRecord(repo_id=repo_id, status=STATUS_FAILED,
+                                          error=f"{type(e).__name__}: worker process died")
+
+    def _replace_analyze_executor(self, broken: Executor):
+        # every repo in flight on the broken pool ends up here, only the first one replaces it
+        if self.analyze_executor is not broken:
+            return
+
+        logger.warning("Restarting the analysis pool")
+        self.analyze_executor = self.new_analyze_executor()
+        broken.shutdown(wait=False)
+
+    def shutdown_analyze_executors(self):
+        for executor in (self.analyze_executor, self.isolation_executor):
+            if executor is not None:
+                executor.shutdown()
+
+    async def _feed_backlog(self, stage: Stage, query: dict, sort: list[tuple[str, int]],
+                            skip: Callable[[GithubSearchResult], bool] = lambda x: False,
+                            to_item: Callable[[GithubSearchResult], Any] = lambda x: x):
+        fed = 0
+
+        async for results in iterate_pages(GithubSearchResult, query, sort, BACKLOG_PAGE_SIZE):
+            for result in results:
+                if self.stop.is_set():
+                    return
+                if not skip(result):
+                    await stage.put(to_item(result))
+                    fed += 1
+
+        logger.info(f"Fed {fed} unfinished repos from previous runs to '{stage.name}'")
+
+    async def feed_backlog(self, cutoff: datetime, completed: set[str]):
+        # repos of the days harvested by previous runs, the search of this run only inserts older ones
+        harvested = {"created_at": {"$gte": cutoff}}
+
+        await self._feed_backlog(self.discover_stage, {"$and": [harvested, {"main_tf": None}]}, PRIORITY_SORT)
+        await self._feed_backlog(self.download_stage,
+                                 {"$and": [harvested, {"main_tf": {"$nin": [None, []]}}, {"downloaded": None}]},
+                                 ID_SORT)
+        await self._feed_backlog(self.analyze_stage, {"$and": [harvested, {"downloaded": True}]}, ID_SORT,
+                                 skip=lambda x: x.id in completed, to_item=lambda x: x.id)
+
+    async def feed_search(self, completed: set[str]):
+        async def on_inserted(results: list[GithubSearchResult]):
+            # the days an interrupted run did not finish are searched again, their analysed repos are inserted again
+            for result in results:
+                if result.id not in completed:
+                    await self.discover_stage.put(result)
+
+        await github_search.harvest(on_inserted, self.stop)
+
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(PIPELINE_FLUSH_INTERVAL)
+            await self.updater.flush()
+
+    async def report_stats(self):
+        while True:
+            await asyncio.sleep(STATS_LOG_INTERVAL)
+            self.log_stats()
+
+    def log_stats(self):
+        minutes = (time.monotonic() - self.started) / 60
+        rate = self.analyze_stage.processed / minutes if minutes > 0 else 0.0
+        logger.info(f"{' -> '.join(str(x) for x in self.stages)} analysed repos/min={rate:.1f}")
+
+    async def run(self, cutoff: datetime, completed: set[str]):
+        for stage in self.stages:
+            stage.start()
+
+        background = [asyncio.create_task(self.flush_periodically()), asyncio.create_task(self.report_stats())]
+
+        sources = [asyncio.create_task(self.feed_backlog(cutoff, completed))]
+        if PIPELINE_SEARCH:
+            sources.append(asyncio.create_task(self.feed_search(completed)))
+
+        try:
+            await asyncio.gather(*sources)
+        except BaseException:
+            self.stop.set()
+            raise
+        finally:
+            # a failed source leaves the others running, they must be done before the stages close
+            for task in sources:
+                task.cancel()
+            await asyncio.gather(*sources, return_exceptions=True)
+
+            # upstream first, so every item still queued reaches the end of the pipeline
+            for stage in self.stages:
+                await stage.close()
+
+            for task in background:
+                task.cancel()
+
+        self.log_stats()
+
+
+def new_analyze_executor() -> ProcessPoolExecutor:
+    # worker processes are spawned, forking a process running threads and an event loop is not safe
+    return ProcessPoolExecutor(max_workers=ANALYZE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+
+async def main():
+    await initialize_db()
+
+    config: GithubConfig = await github_search.get_github_config()
+    cutoff = datetime.combine(config.last_date_queried, datetime_time(0, 0, 0))
+
+    os.makedirs(ANALYTICS_FOLDER, exist_ok=True)
+    results_path = f"{ANALYTICS_FOLDER}/{batch_analyzer.RESULTS_FILE_NAME}"
+    completed = batch_analyzer.get_completed(results_path)
+    metrics.remove_exports(batch_analyzer.WORKER_METRICS_PREFIX)
+
+    loop = asyncio.get_running_loop()
+
+    with ThreadPoolExecutor(max_workers=repo_main_fetcher.DISCOVERY_CONCURRENCY,
+                            thread_name_prefix="discover") as discover_executor, \
+            ThreadPoolExecutor(max_workers=repo_tf_fetcher.TF_FETCHER_WORKERS,
+                               thread_name_prefix="download") as download_executor, \
+            batch_analyzer.open_results(results_path) as results_file:
+        async with BulkUpdater(GithubSearchResult) as updater:
+            pipeline = Pipeline(updater, results_file, discover_executor, download_executor, new_analyze_executor)
+
+            # first signal stops feeding new repos and lets the queued ones finish, the default handler is back after it
+            def request_stop(sig: signal.Signals):
+                logger.warning(f"Received {sig.name}, finishing the queued repos")
+                pipeline.stop.set()
+                loop.remove_signal_handler(sig)
+
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, request_stop, sig)
+
+            try:
+                await pipeline.run(cutoff, completed)
+            finally:
+                for sig in (signal.SIGINT, signal.SIGTERM):
+                    loop.remove_signal_handler(sig)
+                pipeline.shutdown_analyze_executors()
+
+    logger.info("Stopped" if pipeline.stop.is_set() else "Finished")
+
+    # the records of this run are queryable right away, only what was appended since the last ingestion is read
+    store = AnalyticsStore()
+    store.ingest(results_path)
+    store.close()
+
+    logger.info(f"Rate limit stats: {rate_limit_scheduler.stats}")
+    # the analysis metrics are exported by the worker processes, see batch_analyzer.analyze
+    metrics.export("pipeline")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
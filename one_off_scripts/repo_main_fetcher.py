@@ -1,15 +1,18 @@
 import asyncio
 import logging
-from typing import List, Union
+import os
+import posixpath
+from typing import List, Union, Optional
 
 from beanie.odm.operators.update.general import Set
-from github import Repository
+from github import Repository, UnknownObjectException
 from github.ContentFile import ContentFile
 from github.PaginatedList import PaginatedList
 
-from one_off_scripts import initialize_db, GithubSearchResult, DRY_RUN, MONGO_QUERY
-from terraform_analyzer.external import github_client
-from terraform_analyzer.external.github_manager import GithubFileType
+from one_off_scripts import initialize_db, GithubSearchResult, DRY_RUN, MONGO_QUERY, BulkUpdater, iterate_pages, \
+    PRIORITY_SORT
+from terraform_analyzer.external import github_client, rate_limit_scheduler
+from terraform_analyzer.external.github_manager import GithubFileType, GitTreeEntryType, fetch_tree_entries
 
 logger = logging.getLogger("repo_main_fetcher")
 # logging.basicConfig(level=logging.ERROR)
@@ -17,6 +20,16 @@ logger = logging.getLogger("repo_main_fetcher")
 FILE_SEARCH_NAME = "main.tf"
 PAGE_SIZE = 50
 
+DISCOVERY_MODE_TREE = "tree"
+DISCOVERY_MODE_SEARCH = "search"
+DISCOVERY_MODE_BFS = "bfs"
+# tree: one recursive tree listing per repo, search: code search (~10 requests/min), bfs: one request per folder
+DISCOVERY_MODE: str = os.environ.get("DISCOVERY_MODE", DISCOVERY_MODE_TREE).lower()
+DISCOVERY_CONCURRENCY: int = int(os.environ.get("DISCOVERY_CONCURRENCY", "8"))
+
+if DISCOVERY_MODE not in (DISCOVERY_MODE_TREE, DISCOVERY_MODE_SEARCH, DISCOVERY_MODE_BFS):
+    raise RuntimeError(f"Unknown DISCOVERY_MODE '{DISCOVERY_MODE}'")
+
 if not MONGO_QUERY:
     DEFAULT_QUERY = {'main_tf': {'$exists': False}}
     logger.warning(f"QUERY env not set, falling back to '{DEFAULT_QUERY}'")
@@ -29,8 +42,8 @@ def find_github_main_root_tf_bfs(repo_name: str) -> List[ContentFile]:
     repo: Repository
     try:
         repo = github_client.get_repo(repo_name)
-    except Exception as e:
-        logger.error(f"Failed to fetch {repo_name}", exc_info=e)
+    except UnknownObjectException:
+        logger.warning(f"Repo {repo_name} does not exist anymore")
         return []
 
     root_contents = repo.get_contents("/")
@@ -81,45 +94,82 @@ def find_github_main_root_tf(repo_name: str) -> List[ContentFile]:
     return mains
 
 
-def fetch_repo_mains(repo: str) -> [str]:
-    main_files: List[ContentFile] = find_github_main_root_tf(repo)
+def find_github_main_root_tf_tree(repo_name: str, tree_ish: str) -> Optional[List[str]]:
+    # None when the listing is truncated (very large repos), the caller has to walk the repo instead.
+    # Only a missing repo means no main.tf, any other failure is raised so nothing gets stored for the repo
+    logger.info(f"Listing the tree of '{repo_name}@{tree_ish}' for '{FILE_SEARCH_NAME}'")
+
+    try:
+        entries = fetch_tree_entries(repo_name, tree_ish)
+    except UnknownObjectException:
+        logger.warning(f"Repo {repo_name} does not exist anymore")
+        return []
+
+    if entries is None:
+        return None
+
+    # shallowest first, the root modules of a repo are usually the closest to its root
+    return sorted((path for path, entry in entries.items()
+                   if entry.type == GitTreeEntryType.BLOB and posixpath.basename(path) == FILE_SEARCH_NAME),
+                  key=lambda x: (x.count("/"), x))
+
 
-    logger.info(f"{repo}\t:extracted {len(main_files)} main.tf files")
+def fetch_repo_mains(repo: str, default_branch: Optional[str] = None) -> [str]:
+    main_paths: Optional[List[str]] = None
 
-    main_paths: [str] = []
-    for content_file in main_files:
-        main_paths.append(content_file.path)
+    if DISCOVERY_MODE == DISCOVERY_MODE_TREE:
+        main_paths = find_github_main_root_tf_tree(repo, default_branch or "HEAD")
+
+    if main_paths is None:
+        if DISCOVERY_MODE == DISCOVERY_MODE_SEARCH:
+            main_files: List[ContentFile] = find_github_main_root_tf(repo)
+        else:
+            main_files: List[ContentFile] = find_github_main_root_tf_bfs(repo)
+
+        main_paths = [content_file.path for content_file in main_files]
+
+    logger.info(f"{repo}\t:extracted {len(main_paths)} main.tf files")
 
     return main_paths
 
 
+async def fetch_result_mains(result: GithubSearchResult, semaphore: asyncio.Semaphore) -> Optional[List[str]]:
+    # None when the discovery failed, the repo is left as it is and picked up again by the next run
+    async with semaphore:
+        try:
+            return await asyncio.to_thread(fetch_repo_mains, result.id, result.all_attributes.get("default_branch"))
+        except Exception as e:
+            logger.error(f"Failed to discover the main files of {result.id}", exc_info=e)
+            return None
+
+
 async def main():
     await initialize_db()
 
-    index = 0
+    logger.info(f"Discovering '{FILE_SEARCH_NAME}' files with '{DISCOVERY_MODE}' mode")
+
+    semaphore = asyncio.Semaphore(DISCOVERY_CONCURRENCY)
+    processed = 0
 
-    while True:
-        # noinspection PyTypeChecker,PyUnresolvedReferences
-        results: [GithubSearchResult] = await GithubSearchResult.find(MONGO_QUERY) \
-            .sort(-GithubSearchResult.star_gazers, -GithubSearchResult.last_pushed_at, -GithubSearchResult.created_at) \
-            .skip(index) \
-            .limit(PAGE_SIZE) \
-            .to_list()
+    async with BulkUpdater(GithubSearchResult) as updater:
+        async for results in iterate_pages(GithubSearchResult, MONGO_QUERY, PRIORITY_SORT, PAGE_SIZE):
+            # the github calls are blocking, a page of repos is discovered concurrently in threads
+            all_mains = await asyncio.gather(*[fetch_result_mains(result, semaphore) for result in results])
 
-        for result in results:
-            logger.info(f"{result.id}")
+            for result, mains in zip(results, all_mains):
+                if mains is None:
+                    continue
 
-            mains = fetch_repo_mains(result.id)
+                if not DRY_RUN:
+                    await updater.update(result.id, Set({GithubSearchResult.main_tf: mains}))
 
-            if not DRY_RUN:
-                await result.update(Set({GithubSearchResult.main_tf: mains}))
+                logger.info(f"{result.id}:{mains}")
 
-            logger.info(f"{result.id}:{mains}")
+            processed += len(results)
+            logger.info(f"Processed {processed}")
 
-        if not results:
-            logger.info("Finished")
-            break
-        index += PAGE_SIZE
+    logger.info("Finished")
+    logger.info(f"Rate limit stats: {rate_limit_scheduler.stats}")
 
 
 if __name__ == '__main__':
@@ -1,15 +1,26 @@
 import asyncio
 import logging
 import os.path
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
 from beanie.odm.operators.update.general import Set, Unset
-from github import Repository, Branch
+import requests
+from github import Repository, Branch, UnknownObjectException
 
 import terraform_analyzer
-from one_off_scripts import initialize_db, GithubSearchResult, DRY_RUN, OUTPUT_FOLDER, MONGO_QUERY
-from terraform_analyzer.external import github_client
+from one_off_scripts import initialize_db, GithubSearchResult, DRY_RUN, OUTPUT_FOLDER, MONGO_QUERY, BulkUpdater, \
+    iterate_pages, ID_SORT
+from terraform_analyzer.core import metrics
+from terraform_analyzer.external import github_client, rate_limit_scheduler
 
 PAGE_SIZE = 50
+TF_FETCHER_WORKERS: int = int(os.environ.get("TF_FETCHER_WORKERS", "4"))
+# repos read ahead of the workers, the reader waits when it is full
+TF_FETCHER_QUEUE_SIZE: int = int(os.environ.get("TF_FETCHER_QUEUE_SIZE", str(TF_FETCHER_WORKERS * 2)))
+THROUGHPUT_LOG_INTERVAL = 60
 
 logger = logging.getLogger("repo_tf_fetcher")
 logging.basicConfig(level=logging.INFO)
@@ -53,7 +64,20 @@ def get_most_root_main_tf(main_tfs: [str]) -> str:
     return tmp[min_slash_count][0]
 
 
-async def fetch_repo(github_search_result: GithubSearchResult):
+def is_unusable_repo_error(ex: Exception) -> bool:
+    # the repo is gone or its content can't be followed, network errors, 5xx and rate limits are worth a retry
+    if isinstance(ex, UnknownObjectException):
+        return True
+    if isinstance(ex, requests.HTTPError):
+        return ex.response is not None and ex.response.status_code == 404
+
+    # raised by the crawler for content it can't resolve
+    return type(ex) is RuntimeError
+
+
+def download_repo(github_search_result: GithubSearchResult) -> bool:
+    # blocking, runs in the worker threads. False when the repo can't be used, infrastructure errors are raised
+    # so nothing is stored for the repo and the next run retries it
     logger.info(f"@fetch_repo {github_search_result.id}")
     author, repo_name = github_search_result.id.split('/')
 
@@ -61,9 +85,7 @@ async def fetch_repo(github_search_result: GithubSearchResult):
         root_main_tf_path: str = get_most_root_main_tf(github_search_result.main_tf)
     except AmbiguousRootMain as e:
         logger.error(f"Failed to download {github_search_result.id} due to {e.message}")
-        if not DRY_RUN:
-            await github_search_result.update(Set({GithubSearchResult.downloaded: False}))
-        return
+        return False
 
     tf_root_parent_folder_path = os.path.dirname(root_main_tf_path)
     tf_main_file_name = os.path.basename(root_main_tf_path)
@@ -77,14 +99,26 @@ async def fetch_repo(github_search_result: GithubSearchResult):
                                               tf_main_file_name,
                                               OUTPUT_FOLDER)
     except Exception as e:
+        if not is_unusable_repo_error(e):
+            raise
+
         logger.error(f"Failed to download {github_search_result.id}", exc_info=e)
+        return False
+
+    return True
+
+
+async def fetch_repo(github_search_result: GithubSearchResult, updater: BulkUpdater, executor: ThreadPoolExecutor):
+    loop = asyncio.get_running_loop()
 
-        if not DRY_RUN:
-            await github_search_result.update(Set({GithubSearchResult.downloaded: False}))
+    try:
+        downloaded: bool = await loop.run_in_executor(executor, download_repo, github_search_result)
+    except Exception as e:
+        logger.error(f"Failed to download {github_search_result.id}, leaving it for the next run", exc_info=e)
         return
 
     if not DRY_RUN:
-        await github_search_result.update(Set({GithubSearchResult.downloaded: True}))
+        await updater.update(github_search_result.id, Set({GithubSearchResult.downloaded: downloaded}))
 
 
 def fetch_hash(repo_id: str, default_branch: str) -> str:
@@ -96,27 +130,93 @@ def fetch_hash(repo_id: str, default_branch: str) -> str:
     return branch.commit.sha
 
 
+class PipelineStats:
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.read = 0
+        self.processed = 0
+
+    def get_repos_per_minute(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.processed / elapsed * 60 if elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return f"read={self.read} processed={self.processed} repos/min={self.get_repos_per_minute():.1f}"
+
+
+async def read_results(queue: asyncio.Queue, stop: asyncio.Event, stats: PipelineStats):
+    # downloading changes the `downloaded` field the default query filters on, keyset pages are not affected by it
+    async for results in iterate_pages(GithubSearchResult, MONGO_QUERY, ID_SORT, PAGE_SIZE):
+        for result in results:
+            if stop.is_set():
+                return
+            # blocks while the queue is full, so reading never runs far ahead of the downloads
+            await queue.put(result)
+            stats.read += 1
+
+
+async def download_worker(queue: asyncio.Queue, updater: BulkUpdater, executor: ThreadPoolExecutor,
+                          stats: PipelineStats):
+    while True:
+        result: Optional[GithubSearchResult] = await queue.get()
+
+        try:
+            if result is None:
+                return
+
+            await fetch_repo(result, updater, executor)
+            stats.processed += 1
+        finally:
+            queue.task_done()
+
+
+async def report_throughput(stats: PipelineStats):
+    while True:
+        await asyncio.sleep(THROUGHPUT_LOG_INTERVAL)
+        logger.info(f"Throughput: {stats}")
+
+
 async def main():
     await initialize_db()
 
-    index = 0
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    stats = PipelineStats()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=TF_FETCHER_QUEUE_SIZE)
 
-    while True:
-        logger.info(f"Processed {index}")
+    # first signal stops reading new repos and lets the queued ones finish, the default handler is back after it
+    def request_stop(sig: signal.Signals):
+        logger.warning(f"Received {sig.name}, finishing the queued downloads")
+        stop.set()
+        loop.remove_signal_handler(sig)
 
-        results = await GithubSearchResult.find(MONGO_QUERY) \
-            .skip(index) \
-            .limit(PAGE_SIZE) \
-            .to_list()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, request_stop, sig)
 
-        for result in results:
-            index += 1
-            logger.info(f"Processed {index}")
-            await fetch_repo(result)
+    reporter = asyncio.create_task(report_throughput(stats))
 
-        if not results:
-            logger.info("Finished")
-            break
+    try:
+        with ThreadPoolExecutor(max_workers=TF_FETCHER_WORKERS, thread_name_prefix="repo_tf_fetcher") as executor:
+            async with BulkUpdater(GithubSearchResult) as updater:
+                workers = [asyncio.create_task(download_worker(queue, updater, executor, stats))
+                           for _ in range(TF_FETCHER_WORKERS)]
+
+                try:
+                    await read_results(queue, stop, stats)
+                finally:
+                    for _ in workers:
+                        await queue.put(None)
+                    await asyncio.gather(*workers)
+    finally:
+        reporter.cancel()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+
+    logger.info("Stopped" if stop.is_set() else "Finished")
+    logger.info(f"Throughput: {stats}")
+    logger.info(f"Rate limit stats: {rate_limit_scheduler.stats}")
+    metrics.export("repo_tf_fetcher")
 
 
 async def reset_downloaded():
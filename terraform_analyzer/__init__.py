@@ -1,8 +1,9 @@
 import logging
 import os
 
-from terraform_analyzer.core import RemoteResource, GitHubReference, LocalResource, crawler
+from terraform_analyzer.core import RemoteResource, GitHubReference, LocalResource, crawler, metrics
 from terraform_analyzer.core.hcl import hcl_project_parser
+from terraform_analyzer.core.profiling import Profiler, NOOP_PROFILER, PROFILE_ENABLED
 from terraform_analyzer.core.hcl.hcl_obj import TerraformResource
 from terraform_analyzer.core.hcl.hcl_obj.hcl_resources import TerraformComputeResource
 
@@ -17,7 +18,8 @@ def download_terraform(author: str,
                        commit_hash: str,
                        path: str,
                        tf_main_file_name: str,
-                       output_folder: str):
+                       output_folder: str,
+                       resume: bool = False):
     root_tf_folder_name = os.path.basename(path)
     root_tf_folder_parent_path = os.path.dirname(path)
     rrr = RemoteResource(remote_reference=GitHubReference(author=author,
@@ -28,7 +30,7 @@ def download_terraform(author: str,
                          relative_path=(),
                          name=root_tf_folder_name)
 
-    crawler.crawl_download(rrr, output_folder)
+    crawler.crawl_download(rrr, output_folder, resume=resume)
 
 
 def run_terraform_analyzer(github_author: str,
@@ -36,21 +38,29 @@ def run_terraform_analyzer(github_author: str,
                            github_commit_hash: str,
                            tf_root_parent_folder_path: str,
                            tf_main_file_name: str = "main.tf",
-                           force_download: bool = False) -> [TerraformResource]:
+                           force_download: bool = False,
+                           resume: bool = False,
+                           profile: bool = PROFILE_ENABLED) -> [TerraformResource]:
+    # profile writes the stage timings, slow files and a capture when the run goes over PROFILE_BUDGET
+    profiler = Profiler(f"{github_author}_{github_project}") if profile else NOOP_PROFILER
 
-    # if force_download or not os.listdir(RESOURCE_OUTPUT_FOLDER):
-    download_terraform(author=github_author,
-                       project=github_project,
-                       commit_hash=github_commit_hash,
-                       path=tf_root_parent_folder_path,
-                       tf_main_file_name=tf_main_file_name,
-                       output_folder=RESOURCE_OUTPUT_FOLDER)
+    with profiler:
+        # if force_download or not os.listdir(RESOURCE_OUTPUT_FOLDER):
+        with profiler.stage("download"):
+            download_terraform(author=github_author,
+                               project=github_project,
+                               commit_hash=github_commit_hash,
+                               path=tf_root_parent_folder_path,
+                               tf_main_file_name=tf_main_file_name,
+                               output_folder=RESOURCE_OUTPUT_FOLDER,
+                               resume=resume)
 
-    main_resource = LocalResource(full_path=RESOURCE_OUTPUT_FOLDER,
-                                  name=tf_main_file_name,
-                                  is_directory=False)
+        main_resource = LocalResource(full_path=RESOURCE_OUTPUT_FOLDER,
+                                      name=tf_main_file_name,
+                                      is_directory=False)
 
-    component_list: list[TerraformResource] = hcl_project_parser.parse_project(main_resource)
+        component_list: list[TerraformResource] = hcl_project_parser.parse_project(main_resource,
+                                                                                   profiler=profiler)
 
     return component_list
 
@@ -68,5 +78,6 @@ if __name__ == '__main__':
     #                        github_project="terraform_modules",
     #                        github_commit_hash="917a22d76d6ff6ee865d1291eba71538165cde74",
     #                        tf_root_parent_folder_path="")
+    metrics.export("terraform_analyzer")
 
 # kumarkartikmk57/terraform_modules this blows when pa
\ No newline at end of file
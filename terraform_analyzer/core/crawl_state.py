@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from terraform_analyzer.core import RemoteResource, GitHubReference
+from terraform_analyzer.external import CACHE_FOLDER
+
+CRAWL_STATE_FOLDER = f"{CACHE_FOLDER}/crawls"
+CRAWL_CHECKPOINT_INTERVAL = float(os.environ.get("CRAWL_CHECKPOINT_INTERVAL", "5"))
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+
+REFERENCE_TYPE_GITHUB = "github"
+META_ROOT = "root"
+META_COMPLETE = "complete"
+# crawls that are not resumable keep their state in memory, nothing is left on disk
+IN_MEMORY = ":memory:"
+
+logger = logging.getLogger("crawl_state")
+
+
+def dump_remote_resource(rr: RemoteResource) -> str:
+    # the remote_reference field is declared as the base class, pydantic would drop the subclass fields
+    if not isinstance(rr.remote_reference, GitHubReference):
+        raise RuntimeError(f"I don't know how to store {type(rr.remote_reference)}")
+
+    return json.dumps({"reference_type": REFERENCE_TYPE_GITHUB,
+                       "remote_reference": rr.remote_reference.model_dump(),
+                       "is_directory": rr.is_directory,
+                       "relative_path": list(rr.relative_path),
+                       "name": rr.name}, sort_keys=True)
+
+
+def load_remote_resource(value: str) -> RemoteResource:
+    raw: dict = json.loads(value)
+
+    if raw["reference_type"] != REFERENCE_TYPE_GITHUB:
+        raise RuntimeError(f"Unsupported stored reference type {raw['reference_type']}")
+
+    return RemoteResource(remote_reference=GitHubReference(**raw["remote_reference"]),
+                          is_directory=raw["is_directory"],
+                          relative_path=tuple(raw["relative_path"]),
+                          name=raw["name"])
+
+
+def get_crawl_id(root_remote_resource: RemoteResource, output_folder_path: str) -> str:
+    key = f"{dump_remote_resource(root_remote_resource)}\n{os.path.abspath(output_folder_path)}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+class CrawlState:
+    # frontier and visited set of a crawl: every seen resource is stored, pending until it was downloaded
+    # and all of its dependencies made it into the frontier
+
+    def __init__(self, path: str, checkpoint_interval: float = CRAWL_CHECKPOINT_INTERVAL):
+        if path != IN_MEMORY:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS frontier ("
+                                 "resource TEXT PRIMARY KEY, "
+                                 "status TEXT NOT NULL)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS meta ("
+                                 "name TEXT PRIMARY KEY, "
+                                 "value TEXT)")
+        self._connection.commit()
+        self._last_checkpoint = time.monotonic()
+
+    def reset(self, root_remote_resource: RemoteResource):
+        self._connection.execute("DELETE FROM frontier")
+        self._connection.execute("DELETE FROM meta")
+        self._connection.execute("INSERT INTO meta VALUES (?, ?)",
+                                 (META_ROOT, dump_remote_resource(root_remote_resource)))
+        self.checkpoint(force=True)
+
+    def add_pending(self, rr: RemoteResource):
+        self._connection.execute("INSERT OR IGNORE INTO frontier VALUES (?, ?)",
+                                 (dump_remote_resource(rr), STATUS_PENDING))
+
+    def mark_done(self, rr: RemoteResource):
+        self._connection.execute("UPDATE frontier SET status = ? WHERE resource = ?",
+                                 (STATUS_DONE, dump_remote_resource(rr)))
+
+    def _get_resources(self, status: Optional[str] = None) -> list[RemoteResource]:
+        if status is None:
+            rows = self._connection.execute("SELECT resource FROM frontier")
+        else:
+            rows = self._connection.execute("SELECT resource FROM frontier WHERE status = ?", (status,))
+
+        return [load_remote_resource(x[0]) for x in rows]
+
+    def get_visited(self) -> list[RemoteResource]:
+        return self._get_resources()
+
+    def get_pending(self) -> list[RemoteResource]:
+        return self._get_resources(STATUS_PENDING)
+
+    def is_complete(self) -> bool:
+        return self._connection.execute("SELECT 1 FROM meta WHERE name = ?", (META_COMPLETE,)).fetchone() is not None
+
+    def mark_complete(self):
+        self._connection.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (META_COMPLETE, str(time.time())))
+        self.checkpoint(force=True)
+
+    def checkpoint(self, force: bool = False):
+        if force or time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self._connection.commit()
+            self._last_checkpoint = time.monotonic()
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+
+
+def get_crawl_state_path(root_remote_resource: RemoteResource, output_folder_path: str) -> str:
+    return f"{CRAWL_STATE_FOLDER}/{get_crawl_id(root_remote_resource, output_folder_path)}.sqlite"
+
+
+def open_crawl_state(root_remote_resource: RemoteResource, output_folder_path: str, resume: bool) -> CrawlState:
+    path = get_crawl_state_path(root_remote_resource, output_folder_path)
+
+    if not resume:
+        # a fresh crawl would reset it anyway, the state of an earlier resumable run is dropped
+        if os.path.exists(path):
+            os.remove(path)
+
+        state = CrawlState(IN_MEMORY)
+        state.reset(root_remote_resource)
+        return state
+
+    state = CrawlState(path)
+
+    if state.is_complete() or state.get_visited():
+        logger.info(f"Resuming crawl from {path}")
+    else:
+        state.reset(root_remote_resource)
+
+    return state
@@ -1,13 +1,26 @@
 import logging
-from typing import Set, List
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Set, List, Optional
 
 from terraform_analyzer.core import Resource, RemoteResource, GitHubReference, RemoteReference, \
-    remote_reference_resolution
+    remote_reference_resolution, crawl_state, module_cache, metrics, repo_inventory
+from terraform_analyzer.core.crawl_state import CrawlState
+from terraform_analyzer.core.module_cache import ModuleGraph, ModuleCacheEntry
 from terraform_analyzer.core.hcl import hcl_file_parser
+from terraform_analyzer.core.hcl.hcl_file_parser import ModuleDependency
 from terraform_analyzer.external import download_manager, github_manager, terraform_registry
 
+CRAWLER_MAX_WORKERS = int(os.environ.get("CRAWLER_MAX_WORKERS", "8"))
+
 logger = logging.getLogger("crawler")
 
+CRAWL_SECONDS = metrics.histogram("crawl_seconds", "Time to crawl a project with its dependencies")
+RESOURCES_CRAWLED = metrics.counter("resources_crawled_total", "Files and folders downloaded by the crawler")
+MODULE_CACHE_HITS = metrics.counter("module_cache_hits_total", "Remote modules materialised from the module cache")
+UNRESOLVED_MODULES = metrics.counter("unresolved_modules_total", "Module dependencies that could not be resolved")
+
 
 def grab_relevant_tf_files_from_root_folder(root_remote_resource: RemoteResource) -> set[RemoteResource]:
     if isinstance(root_remote_resource.remote_reference, GitHubReference):
@@ -20,65 +33,238 @@ def grab_relevant_tf_files_from_root_folder(root_remote_resource: RemoteResource
     pass
 
 
-def extract_dependency_reference(dependency: str, rr: RemoteReference, next_file: RemoteResource) -> RemoteResource:
+def is_local_dependency(dependency: ModuleDependency) -> bool:
+    return dependency.source.startswith(".")
+
+
+def is_registry_dependency(dependency: ModuleDependency) -> bool:
+    return not dependency.source.startswith((".", "git::", "http"))
+
+
+def _to_remote_resource(reference: RemoteReference) -> RemoteResource:
+    if isinstance(reference, GitHubReference):
+        return RemoteResource(remote_reference=reference,
+                              is_directory=True,
+                              relative_path=(),
+                              name="")
+
+    raise RuntimeError(f"I don't know how to handle {type(reference)}")
+
+
+def extract_dependency_reference(dependency: ModuleDependency,
+                                 rr: RemoteReference,
+                                 next_file: RemoteResource) -> RemoteResource:
     source_url: str
-    if dependency.startswith("."):
+    if is_local_dependency(dependency):
         # is local resource
         if isinstance(rr, GitHubReference):
-            return github_manager.dependency_builder(dependency, next_file, rr)
+            return github_manager.dependency_builder(dependency.source, next_file, rr)
         else:
             raise RuntimeError(f"I don't know how to download {type(rr)}")
-    elif dependency.startswith("git::") or dependency.startswith("http"):
-        source_url = dependency
+    elif not is_registry_dependency(dependency):
+        source_url = dependency.source
     else:
-        source_url = terraform_registry.get_source_code(dependency)
+        source_url = terraform_registry.get_source_code(dependency.source, dependency.version)
 
-    reference: RemoteReference = remote_reference_resolution.resolve(source_url)
+    return _to_remote_resource(remote_reference_resolution.resolve(source_url))
 
-    if isinstance(reference, GitHubReference):
-        return RemoteResource(remote_reference=reference,
-                              is_directory=True,
-                              relative_path=(),
-                              name="")
 
-    raise RuntimeError(f"I don't know how to handle {type(rr)}")
+def resolve_remote_dependencies(
+        dependencies: list[ModuleDependency]) -> dict[ModuleDependency, Optional[RemoteResource]]:
+    # registry modules first, then every git/github url (including the registry ones) in a single batch
+    registry_sources = terraform_registry.resolve_sources(filter(is_registry_dependency, dependencies))
 
+    source_urls: dict[ModuleDependency, Optional[str]] = {}
+    for dependency in dependencies:
+        if is_registry_dependency(dependency):
+            registry_source = registry_sources.get(dependency)
+            source_urls[dependency] = registry_source.source if registry_source else None
+        else:
+            source_urls[dependency] = dependency.source
 
-def crawl_download(root_remote_resource: RemoteResource, output_folder_path: str):
-    logger.info("Starting crawling")
+    references = remote_reference_resolution.resolve_many(filter(None, source_urls.values()))
 
-    relevant_root_tf_files = grab_relevant_tf_files_from_root_folder(root_remote_resource)
+    result: dict[ModuleDependency, Optional[RemoteResource]] = {}
+    for dependency, source_url in source_urls.items():
+        reference = references.get(source_url) if source_url else None
 
-    files_parsed: Set[RemoteResource] = set()
-    files_to_parse: Set[RemoteResource] = relevant_root_tf_files
+        try:
+            result[dependency] = _to_remote_resource(reference) if reference else None
+        except RuntimeError as e:
+            logger.warning("Skipping '%s': %s", dependency.source, e)
+            result[dependency] = None
 
-    while files_to_parse:
-        next_file: RemoteResource = files_to_parse.pop()
+    return result
 
-        if next_file in files_parsed:
-            logger.warning(f"'{next_file.name}' has already been processed")
+
+def _list_dependencies(resources: List[Resource]) -> list[tuple[ModuleDependency, RemoteReference]]:
+    # parsed on the calling thread, on the main thread a parse going over its timeout is interrupted by SIGALRM
+    result: list[tuple[ModuleDependency, RemoteReference]] = []
+
+    resource: Resource
+    for resource in resources:
+        dependencies: set[ModuleDependency] = hcl_file_parser.list_hcl_dependencies(resource)
+
+        if dependencies:
+            logger.info("Detected the following dependencies for %s '%s'", resource.local_resource.name, dependencies)
+        else:
+            logger.info("No dependencies detected for %s", resource.local_resource.name)
             continue
 
-        files_parsed.add(next_file)
+        rrr: RemoteReference = resource.remote_resource.remote_reference
+
+        result.extend((dependency, rrr) for dependency in dependencies)
+
+    return result
 
-        resources: List[Resource] = download_manager.download_file_or_folder(next_file,
-                                                                             output_folder_path)
 
-        resource: Resource
-        for resource in resources:
-            dependencies: set[str] = hcl_file_parser.list_hcl_dependencies(resource)
+def crawl_download(root_remote_resource: RemoteResource,
+                   output_folder_path: str,
+                   max_workers: int = CRAWLER_MAX_WORKERS,
+                   resume: bool = False):
+    logger.info("Starting crawling")
+    started = time.perf_counter()
+
+    state: CrawlState = crawl_state.open_crawl_state(root_remote_resource, output_folder_path, resume)
+
+    if state.is_complete():
+        logger.info("Crawl already finished, tf files stored at %s", output_folder_path)
+        state.close()
+        return
+
+    files_seen: Set[RemoteResource] = set(state.get_visited())
+    resumed_files: list[RemoteResource] = state.get_pending()
+
+    # download futures resolve into List[Resource], dependency futures into RemoteResource,
+    # remote batch futures into the RemoteResource of each registry/git dependency waiting on them
+    downloads: dict[Future, RemoteResource] = {}
+    dependencies: dict[Future, RemoteResource] = {}
+    remote_batches: dict[Future, list[tuple[ModuleDependency, RemoteResource]]] = {}
+    # a file stays pending in the crawl state until each of its dependencies reached the frontier
+    unresolved_children: dict[RemoteResource, int] = {}
+    module_graph = ModuleGraph(output_folder_path)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            def start_download(rr: RemoteResource):
+                downloads[executor.submit(download_manager.download_file_or_folder, rr, output_folder_path)] = rr
+
+            def submit_download(rr: RemoteResource):
+                if rr in files_seen:
+                    logger.warning("'%s' has already been processed", rr.name)
+                    return
+
+                files_seen.add(rr)
+                state.add_pending(rr)
+                start_download(rr)
+
+            def use_cached_module(rr: RemoteResource) -> bool:
+                # a module crawled by a previous run is materialised with its whole dependency closure
+                if rr in files_seen or not module_cache.is_module_root(rr):
+                    return False
+
+                entry: Optional[ModuleCacheEntry] = module_cache.get(rr)
+
+                if entry is None or not module_cache.materialise(entry, output_folder_path):
+                    return False
+
+                MODULE_CACHE_HITS.inc()
+                logger.info("Module cache hit for %s, skipping %d resources",
+                            "/".join(module_cache.get_module_key(rr)), len(entry.resources))
+
+                module_graph.add_cached(rr, entry)
+
+                for resource in entry.get_resources():
+                    if resource not in files_seen:
+                        files_seen.add(resource)
+                        state.add_pending(resource)
+                        state.mark_done(resource)
 
-            if dependencies:
-                logger.info(f"Detected the following dependencies for {resource.local_resource.name} '{dependencies}'")
+                return True
+
+            def child_resolved(parent: RemoteResource):
+                unresolved_children[parent] -= 1
+
+                if unresolved_children[parent] == 0:
+                    del unresolved_children[parent]
+                    state.mark_done(parent)
+
+            if files_seen:
+                logger.info("Resuming crawl, %d done and %d pending", len(files_seen) - len(resumed_files),
+                            len(resumed_files))
+                for rr in resumed_files:
+                    start_download(rr)
             else:
-                logger.info(f"No dependencies detected for {resource.local_resource.name}")
-                continue
+                for root_tf_file in grab_relevant_tf_files_from_root_folder(root_remote_resource):
+                    submit_download(root_tf_file)
+
+            while downloads or dependencies or remote_batches:
+                done, _ = wait(set(downloads) | set(dependencies) | set(remote_batches), return_when=FIRST_COMPLETED)
+
+                remote_dependencies: list[tuple[ModuleDependency, RemoteResource]] = []
+
+                for future in done:
+                    if future in remote_batches:
+                        resolved: dict[ModuleDependency, Optional[RemoteResource]] = future.result()
+
+                        for dependency, next_file in remote_batches.pop(future):
+                            child: Optional[RemoteResource] = resolved.get(dependency)
+
+                            if child is None:
+                                UNRESOLVED_MODULES.inc()
+                                logger.warning("Skipping unresolved module '%s' referenced from %s", dependency.source,
+                                               next_file)
+                                module_graph.add_unresolved(next_file)
+                            else:
+                                module_graph.add_edge(next_file, child)
+                                if not use_cached_module(child):
+                                    submit_download(child)
+
+                            child_resolved(next_file)
+                    elif future in dependencies:
+                        next_file: RemoteResource = dependencies.pop(future)
+                        child: RemoteResource = future.result()
+                        module_graph.add_edge(next_file, child)
+                        submit_download(child)
+                        child_resolved(next_file)
+                    else:
+                        next_file: RemoteResource = downloads.pop(future)
+                        resources: List[Resource] = future.result()
+                        RESOURCES_CRAWLED.inc()
+                        module_graph.add_download(next_file, resources)
+                        file_dependencies = _list_dependencies(resources)
+
+                        if not file_dependencies:
+                            state.mark_done(next_file)
+                            continue
+
+                        unresolved_children[next_file] = len(file_dependencies)
+
+                        for dependency, rrr in file_dependencies:
+                            if is_local_dependency(dependency):
+                                child_future = executor.submit(extract_dependency_reference, dependency, rrr, next_file)
+                                dependencies[child_future] = next_file
+                            else:
+                                remote_dependencies.append((dependency, next_file))
+
+                # every registry and git module found in this round is resolved concurrently in one batch
+                if remote_dependencies:
+                    unique_dependencies = list(dict.fromkeys(x[0] for x in remote_dependencies))
+                    batch = executor.submit(resolve_remote_dependencies, unique_dependencies)
+                    remote_batches[batch] = remote_dependencies
 
-            rrr: RemoteReference = resource.remote_resource.remote_reference
+                state.checkpoint()
 
-            for dependency in dependencies:
-                rr: RemoteResource = extract_dependency_reference(dependency, rrr, next_file)
+        module_graph.store_modules()
+        state.mark_complete()
+        CRAWL_SECONDS.observe(time.perf_counter() - started)
+    finally:
+        # files are only marked done once their dependencies are in the frontier, anything stored is safe to resume from
+        state.close()
 
-                files_to_parse.add(rr)
+        # even a failed crawl may have written files, the inventories of those project folders are outdated
+        for author, project in {(x.remote_reference.author, x.remote_reference.project) for x in files_seen
+                                if isinstance(x.remote_reference, GitHubReference)}:
+            repo_inventory.invalidate(f"{output_folder_path}/{author}/{project}")
 
     logger.info(f"Finish crawling successfully, tf files stored at {output_folder_path}")
@@ -108,3 +108,4 @@ class CloudResourceType(str, Enum):
 # TODO missing POD resource / apigateway / database
 
 CLOUD_RESOURCE_TYPE_VALUES: set[str] = {x.value for x in CloudResourceType}
+CLOUD_RESOURCE_TYPE_INDEX: dict[CloudResourceType, int] = {x: i for i, x in enumerate(CloudResourceType)}
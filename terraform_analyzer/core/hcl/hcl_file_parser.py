@@ -1,11 +1,12 @@
 import logging
-from typing import Set, Optional
+from typing import Set, Optional, NamedTuple
 
 import hcl2
 from lark import LarkError
 from pydantic import ValidationError
 
-from terraform_analyzer.core import Resource, LocalResource, utils
+from terraform_analyzer.core import Resource, LocalResource, utils, metrics
+from terraform_analyzer.core.profiling import Profiler, NOOP_PROFILER
 from terraform_analyzer.core.hcl import CLOUD_RESOURCE_TYPE_VALUES, TerraformSyntax, ModuleTf, ResourceTf, VariableTf
 from terraform_analyzer.core.hcl.timeout_utils import timeout
 
@@ -13,6 +14,7 @@ RESOURCE = "resource"
 MODULE = "module"
 DATA = "data"
 MODULE_SOURCE = "source"
+MODULE_VERSION = "version"
 VARIABLE = "variable"
 CONDITION = "condition"
 DYNAMIC = "dynamic"
@@ -21,9 +23,20 @@ TF_MAIN_FILE_NAME = "main.tf"
 
 logger = logging.getLogger("hcl_parser")
 
+FILES_PARSED = metrics.counter("tf_files_parsed_total", "HCL files parsed")
+PARSE_FAILURES = metrics.counter("tf_parse_failures_total", "HCL files hcl2 could not parse")
+PARSE_TIMEOUTS = metrics.counter("tf_parse_timeouts_total", "HCL files that timed out while parsing")
+PARSE_SECONDS = metrics.histogram("tf_parse_seconds", "Time to parse one HCL file")
 
-def hcl_dependencies(tf: dict) -> Set[str]:
-    dependencies: Set[str] = set()
+
+class ModuleDependency(NamedTuple):
+    source: str
+    # version constraint, only meaningful for registry modules
+    version: Optional[str] = None
+
+
+def hcl_dependencies(tf: dict) -> Set[ModuleDependency]:
+    dependencies: Set[ModuleDependency] = set()
 
     if MODULE in tf:
         modules: dict = tf[MODULE]
@@ -31,7 +44,8 @@ def hcl_dependencies(tf: dict) -> Set[str]:
         for module in modules:
             resources: dict
             for resource in module.values():
-                dependencies.add(resource[MODULE_SOURCE])
+                version = resource.get(MODULE_VERSION)
+                dependencies.add(ModuleDependency(resource[MODULE_SOURCE], str(version) if version else None))
 
     return dependencies
 
@@ -83,23 +97,31 @@ def load_with_timeout(local_resource: LocalResource) -> Optional[dict]:
         try:
             return hcl2.load(file)
         except (LarkError, UnicodeError) as e:
-            logger.warning(f"Failed to parse '{local_resource.get_full_path()}'")
-            logger.debug(f"Failed to parse '{local_resource.get_full_path()}'", exc_info=e)
+            PARSE_FAILURES.inc()
+            logger.warning("Failed to parse '%s'", local_resource.get_full_path())
+            logger.debug("Failed to parse '%s'", local_resource.get_full_path(), exc_info=e)
     return None
 
 
-def list_hcl_dependencies(resource: Resource) -> set[str]:
-    hcl_dict: Optional[dict] = None
+def _load(local_resource: LocalResource) -> Optional[dict]:
+    FILES_PARSED.inc()
 
     try:
-        hcl_dict = load_with_timeout(resource.local_resource)
+        with PARSE_SECONDS.time():
+            return load_with_timeout(local_resource)
     except TimeoutError:
-        logger.warning(f"Timed out while parsing {resource.local_resource.get_full_path()}")
+        PARSE_TIMEOUTS.inc()
+        logger.warning("Timed out while parsing %s", local_resource.get_full_path())
+        return None
+
+
+def list_hcl_dependencies(resource: Resource) -> set[ModuleDependency]:
+    hcl_dict: Optional[dict] = _load(resource.local_resource)
 
     if not hcl_dict:
         return set()
 
-    detected_dependencies: set[str] = hcl_dependencies(hcl_dict)
+    detected_dependencies: set[ModuleDependency] = hcl_dependencies(hcl_dict)
 
     return detected_dependencies
 
@@ -131,23 +153,25 @@ def _map_to_terraform_syntax(context: str, resource_name: str, properties: dict[
         else:
             raise RuntimeError(f"Not implemented {context}")
     except ValidationError:
-        logger.error(f"Failed to parse {resource_name} from '{properties}' over at {path}")
+        logger.error("Failed to parse %s from '%s' over at %s", resource_name, properties, path)
         return None
 
 
-def list_hcl_resources(resource: LocalResource) -> list[TerraformSyntax]:
-    hcl_dict: Optional[dict] = None
-
-    try:
-        hcl_dict = load_with_timeout(resource)
-    except TimeoutError:
-        logger.warning(f"Timed out while parsing {resource.get_full_path()}")
+def list_hcl_resources(resource: LocalResource, profiler: Profiler = NOOP_PROFILER) -> list[TerraformSyntax]:
+    with profiler.stage("parse.load"):
+        hcl_dict: Optional[dict] = _load(resource)
 
     if not hcl_dict:
         return []
 
-    relevant_resources: list = extract_relevant_resources_from_dict(hcl_dict, resource.get_full_path())
+    with profiler.stage("parse.extract"):
+        relevant_resources: list = extract_relevant_resources_from_dict(hcl_dict, resource.get_full_path())
+
+    with profiler.stage("parse.syntax"):
+        return _to_terraform_syntax(relevant_resources)
+
 
+def _to_terraform_syntax(relevant_resources: list) -> list[TerraformSyntax]:
     tf_syntax: list[TerraformSyntax] = []
 
     for rel_resource in relevant_resources:
@@ -176,6 +200,6 @@ def list_hcl_resources(resource: LocalResource) -> list[TerraformSyntax]:
                         tf_syntax.append(tmp)
 
             else:
-                logger.warning(f"Unexpected {context}")
+                logger.warning("Unexpected %s", context)
 
     return tf_syntax
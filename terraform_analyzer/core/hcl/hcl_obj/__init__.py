@@ -1,13 +1,46 @@
-from typing import Optional
+import functools
+import re
+from typing import Optional, NamedTuple
 
-from pydantic import BaseModel, Field, AliasChoices
+from pydantic import BaseModel, Field, AliasChoices, PrivateAttr
 
 from terraform_analyzer.core.hcl import CloudResourceType
 
+TF_VARIABLE_PATTERN = re.compile("\${((?:[^\.]*)\.(?:[^\.]*))(?:\.([^\.}]*))?.*}")
+
+
+class TerraformReference(NamedTuple):
+    # "<resource_type>.<name>" for interpolated references, the raw reference otherwise
+    address: str
+    resource_type: Optional[str] = None
+    name: Optional[str] = None
+    attribute: Optional[str] = None
+
+
+@functools.lru_cache(maxsize=65536)
+def parse_reference(reference: str) -> TerraformReference:
+    match = TF_VARIABLE_PATTERN.match(reference)
+
+    if not match:
+        return TerraformReference(address=reference)
+
+    address: str = match.group(1)
+    resource_type, name = address.split(".", 1)
+
+    return TerraformReference(address=address,
+                              resource_type=resource_type,
+                              name=name,
+                              attribute=match.group(2))
+
 
 class TerraformResource(BaseModel):
     terraform_resource_name: str
     name: Optional[str] = Field(validation_alias=AliasChoices("name", "function_name"), default=None)
+    _parsed_references: tuple[TerraformReference, ...] = PrivateAttr(default=())
+
+    def model_post_init(self, __context):
+        # subclasses overriding model_post_init must call super() last, once get_references is resolvable
+        self._parsed_references = tuple(parse_reference(reference) for reference in self.get_references())
 
     @staticmethod
     def get_cloud_resource_type() -> CloudResourceType:
@@ -38,3 +71,6 @@ class TerraformResource(BaseModel):
         if references is None:
             references = set()
         return set(filter(lambda x: x is not None, references))
+
+    def get_parsed_references(self) -> tuple[TerraformReference, ...]:
+        return self._parsed_references
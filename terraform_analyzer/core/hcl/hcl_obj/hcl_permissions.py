@@ -177,6 +177,7 @@ class AwsIamRole(TerraformPermission):
 
     def model_post_init(self, __context):
         self.assume_role_policy_processed = _handle_policy(self.assume_role_policy)
+        super().model_post_init(__context)
 
     @staticmethod
     def get_cloud_resource_type() -> CloudResourceType:
@@ -203,6 +204,7 @@ class AwsIamPolicy(TerraformPermission):
 
     def model_post_init(self, __context):
         self.policy_processed = _handle_policy(self.policy)
+        super().model_post_init(__context)
 
     @staticmethod
     def get_cloud_resource_type() -> CloudResourceType:
@@ -229,6 +231,7 @@ class AwsIamRolePolicyAttachment(TerraformPermission):
 
     def model_post_init(self, __context):
         self.policy_processed = _handle_policy(self.policy_arn)
+        super().model_post_init(__context)
 
     @staticmethod
     def get_cloud_resource_type() -> CloudResourceType:
@@ -31,6 +31,8 @@ class AwsLambda(TerraformComputeResource):
                 if VARIABLES in item and type(item[VARIABLES]) is dict:
                     self.env_variables.update(item[VARIABLES])
 
+        super().model_post_init(__context)
+
     def get_identifiers(self, identifiers=None) -> set[str]:
         if identifiers is None:
             identifiers = set()
@@ -1,8 +1,11 @@
 import logging
 import os
-from typing import Any
+import time
+from typing import Any, Optional
 
 from terraform_analyzer.core import LocalResource, utils
+from terraform_analyzer.core.profiling import Profiler, NOOP_PROFILER
+from terraform_analyzer.core.repo_inventory import RepoInventory
 from terraform_analyzer.core.hcl import hcl_file_parser, hcl_resolver, TerraformSyntax, ModuleTf
 from terraform_analyzer.core.hcl.hcl_obj import TerraformResource
 
@@ -26,7 +29,17 @@ def _list_local_resource(path: str) -> [LocalResource]:
     return tmp
 
 
-def parse_project(main: LocalResource) -> list[TerraformResource]:
+def parse_project(main: LocalResource,
+                  inventory: Optional[RepoInventory] = None,
+                  profiler: Profiler = NOOP_PROFILER) -> list[TerraformResource]:
+    # the profiler only records stages and slow files here, capturing is up to whoever entered it
+    with profiler.stage("parse"):
+        hcl_resources = _parse_files(main, inventory, profiler)
+
+    return hcl_resolver.resolve(hcl_resources, profiler)
+
+
+def _parse_files(main: LocalResource, inventory: Optional[RepoInventory], profiler: Profiler) -> list[TerraformSyntax]:
     main_folder = main.get_parent_folder()
 
     resources_path_parsed: set[str] = set()
@@ -38,14 +51,19 @@ def parse_project(main: LocalResource) -> list[TerraformResource]:
         next_folder = folders_to_parse.pop()
 
         logger.debug(f"Parsing {next_folder.get_full_path()}")
-        folder_content: list[LocalResource] = _list_local_resource(next_folder.get_full_path())
+        folder_content: Optional[list[LocalResource]] = inventory.list_folder(next_folder.get_full_path()) \
+            if inventory is not None else None
+        if folder_content is None:
+            folder_content = _list_local_resource(next_folder.get_full_path())
 
         resources_path_parsed.add(next_folder.get_full_path())
         files_to_parse = [lr for lr in folder_content if not lr.is_directory]
 
         local_res: LocalResource
         for local_res in files_to_parse:
-            detected_res: list[TerraformSyntax] = hcl_file_parser.list_hcl_resources(local_res)
+            started = time.perf_counter()
+            detected_res: list[TerraformSyntax] = hcl_file_parser.list_hcl_resources(local_res, profiler)
+            profiler.record_file(local_res.get_full_path(), time.perf_counter() - started)
 
             res: dict[str, Any]
 
@@ -66,4 +84,4 @@ def parse_project(main: LocalResource) -> list[TerraformResource]:
 
     logger.info(f"Finish crawling successfully tf project at {main_folder.full_path}")
 
-    return hcl_resolver.resolve(hcl_resources)
+    return hcl_resources
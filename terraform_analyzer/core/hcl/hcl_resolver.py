@@ -1,11 +1,13 @@
 # resolves the variables
 import logging
 import re
+import time
 from typing import Optional, Union, List, Type
 
 from pydantic import ValidationError
 
-from terraform_analyzer.core import utils
+from terraform_analyzer.core import utils, metrics
+from terraform_analyzer.core.profiling import Profiler, NOOP_PROFILER
 from terraform_analyzer.core.hcl import TerraformSyntax, VariableTf, ModuleTf, ResourceTf
 from terraform_analyzer.core.hcl.hcl_obj import TerraformResource
 from terraform_analyzer.core.hcl.hcl_obj.hcl_events import ALL_TERRAFORM_EVENTS
@@ -24,6 +26,10 @@ ALL_TERRAFORM: dict[str, Type[TerraformResource]] = ALL_TERRAFORM_RESOURCES | \
 
 logger = logging.getLogger("hcl_resolver")
 
+RESOLVE_SECONDS = metrics.histogram("resolve_seconds", "Time to resolve the parsed syntax of a project")
+RESOURCES_RESOLVED = metrics.counter("resources_resolved_total", "Terraform resources resolved")
+RESOLVE_FAILURES = metrics.counter("resolve_failures_total", "Terraform resources that failed validation")
+
 
 def _resolve_str(value: str, variables: dict[str, Union[str, int]]) -> str:
     detected_vars = VAR_NAME_PATTERN.findall(value)
@@ -103,8 +109,10 @@ def resolve_module(modules: list[dict[str, dict[str, any]]], path: str) -> list[
 
 def map_resource_tf_to_terraform_resource(resource_tf: ResourceTf,
                                           context_variable: List[VariableTf],
-                                          module_variable: List[ModuleTf]) -> Optional[TerraformResource]:
+                                          module_variable: List[ModuleTf],
+                                          profiler: Profiler = NOOP_PROFILER) -> Optional[TerraformResource]:
     resource_type = resource_tf.resource_type
+    started = time.perf_counter()
 
     fields = resource_tf.model_dump(include=resource_tf.model_fields)
     extras = resource_tf.model_extra
@@ -123,21 +131,36 @@ def map_resource_tf_to_terraform_resource(resource_tf: ResourceTf,
                 # module variables should override local variables
                 variables[key] = value
 
-    resolved_fields = _resolve_any(fields, variables)
+    with profiler.stage("resolve.values"):
+        resolved_fields = _resolve_any(fields, variables)
 
     if resource_type in ALL_TERRAFORM:
         clz = ALL_TERRAFORM[resource_type]
         try:
-            return clz(**resolved_fields)
+            with profiler.stage("resolve.build"):
+                return clz(**resolved_fields)
         except ValidationError as e:
-            logger.error(f"Failed to parse {resource_type} from '{resolved_fields}': {str(e)}")
+            RESOLVE_FAILURES.inc(resource_type=resource_type)
+            logger.error("Failed to parse %s from '%s': %s", resource_type, resolved_fields, e)
             return None
+        finally:
+            profiler.record_resource(f"{resource_type}.{resource_tf.terraform_resource_name}",
+                                     time.perf_counter() - started, resolved_fields)
     else:
         raise RuntimeError(
             f"Unable to resolve '{resource_type}', please create a terraform permission or resource class")
 
 
-def resolve(tf_syntax: List[TerraformSyntax]) -> list[TerraformResource]:
+def resolve(tf_syntax: List[TerraformSyntax], profiler: Profiler = NOOP_PROFILER) -> list[TerraformResource]:
+    with RESOLVE_SECONDS.time(), profiler.stage("resolve"):
+        result = _resolve(tf_syntax, profiler)
+
+    RESOURCES_RESOLVED.inc(len(result))
+
+    return result
+
+
+def _resolve(tf_syntax: List[TerraformSyntax], profiler: Profiler) -> list[TerraformResource]:
     result: [TerraformResource] = []
 
     # noinspection PyTypeChecker
@@ -165,7 +188,7 @@ def resolve(tf_syntax: List[TerraformSyntax]) -> list[TerraformResource]:
 
         param_res: ResourceTf
         for param_res in parameterized_resources:
-            tmp = map_resource_tf_to_terraform_resource(param_res, context_variables, [module])
+            tmp = map_resource_tf_to_terraform_resource(param_res, context_variables, [module], profiler)
             if tmp:
                 result.append(tmp)
 
@@ -177,7 +200,7 @@ def resolve(tf_syntax: List[TerraformSyntax]) -> list[TerraformResource]:
         context_modules: list[ModuleTf] = list(filter(lambda x: x.source in context, modules))
         context_variables: list[VariableTf] = list(filter(lambda x: context in x.path_context, variables))
 
-        tmp = map_resource_tf_to_terraform_resource(resource, context_variables, context_modules)
+        tmp = map_resource_tf_to_terraform_resource(resource, context_variables, context_modules, profiler)
         if tmp:
             result.append(tmp)
 
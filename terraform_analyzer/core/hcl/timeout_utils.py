@@ -1,22 +1,53 @@
 import functools
 import signal
+import threading
+
+
+def _call_with_alarm(func, seconds, args, kwargs):
+    def handle_timeout(signum, frame):
+        raise TimeoutError()
+
+    previous_handler = signal.signal(signal.SIGALRM, handle_timeout)
+    signal.alarm(seconds)
+
+    try:
+        return func(*args, **kwargs)
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def _call_in_thread(func, seconds, args, kwargs):
+    # python can't interrupt a thread, a call going over the timeout is abandoned and finishes in the background
+    outcome: dict = {}
+
+    def run():
+        try:
+            outcome["result"] = func(*args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+
+    worker = threading.Thread(target=run, name=f"timeout_{func.__name__}", daemon=True)
+    worker.start()
+    worker.join(seconds)
+
+    if worker.is_alive():
+        raise TimeoutError()
+    if "error" in outcome:
+        raise outcome["error"]
+
+    return outcome["result"]
 
 
 def timeout(seconds=5, default=None):
+    # signal handlers can only be set on the main thread, any other thread falls back to a watchdog thread
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            def handle_timeout(signum, frame):
-                raise TimeoutError()
-
-            signal.signal(signal.SIGALRM, handle_timeout)
-            signal.alarm(seconds)
-
-            result = func(*args, **kwargs)
-
-            signal.alarm(0)
+            if threading.current_thread() is threading.main_thread():
+                return _call_with_alarm(func, seconds, args, kwargs)
 
-            return result
+            return _call_in_thread(func, seconds, args, kwargs)
 
         return wrapper
 
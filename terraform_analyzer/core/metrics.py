@@ -0,0 +1,267 @@
+import glob
+import json
+import math
+import os
+import threading
+import time
+from typing import Optional, Union
+
+METRICS_ENABLED: bool = os.environ.get("METRICS", "False").lower() == 'true'
+# folder the run summaries are written into, nothing is written when not set
+METRICS_OUTPUT: Optional[str] = os.environ.get("METRICS_OUTPUT", None)
+
+METRIC_PREFIX = "terraform_analyzer_"
+# seconds
+LATENCY_BUCKETS: tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# items (eg: resources of a graph)
+SIZE_BUCKETS: tuple[float, ...] = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+LabelKey = tuple[tuple[str, str], ...]
+# added to every exported series, processes exporting the same metrics (eg: pool workers) stay apart
+PROCESS_LABEL = "process"
+
+
+def _get_label_key(labels: dict[str, str]) -> LabelKey:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(label_key: LabelKey, extra: Optional[tuple[str, str]] = None) -> str:
+    pairs = list(label_key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if math.isinf(bound) else repr(float(bound))
+
+
+class Counter:
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = _get_label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(_get_label_key(labels), 0)
+
+    def to_prometheus(self, const_labels: LabelKey = ()) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            lines.extend(f"{self.name}{_format_labels(const_labels + k)} {v}" for k, v in sorted(self._values.items()))
+        return lines
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"type": "counter",
+                    "values": [{"labels": dict(k), "value": v} for k, v in sorted(self._values.items())]}
+
+
+class _HistogramValue:
+
+    def __init__(self, bucket_count: int):
+        self.bucket_counts = [0] * bucket_count
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+class _Timer:
+
+    def __init__(self, histogram: "Histogram", labels: dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Histogram:
+
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets)) + (math.inf,)
+        self._values: dict[LabelKey, _HistogramValue] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = _get_label_key(labels)
+        with self._lock:
+            histogram_value = self._values.get(key)
+            if histogram_value is None:
+                histogram_value = self._values[key] = _HistogramValue(len(self.buckets))
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram_value.bucket_counts[i] += 1
+                    break
+
+            histogram_value.count += 1
+            histogram_value.sum += value
+            histogram_value.max = max(histogram_value.max, value)
+
+    def time(self, **labels: str) -> _Timer:
+        return _Timer(self, labels)
+
+    def get_count(self, **labels: str) -> int:
+        histogram_value = self._values.get(_get_label_key(labels))
+        return histogram_value.count if histogram_value else 0
+
+    def to_prometheus(self, const_labels: LabelKey = ()) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+
+        with self._lock:
+            for key, histogram_value in sorted(self._values.items()):
+                key = const_labels + key
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, histogram_value.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_bound(bound)))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {histogram_value.sum}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {histogram_value.count}")
+
+        return lines
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"type": "histogram",
+                    "buckets": [_format_bound(x) for x in self.buckets],
+                    "values": [{"labels": dict(k),
+                                "count": v.count,
+                                "sum": v.sum,
+                                "mean": v.sum / v.count if v.count else 0.0,
+                                "max": v.max,
+                                "bucket_counts": v.bucket_counts} for k, v in sorted(self._values.items())]}
+
+
+class _NoopTimer:
+
+    def __enter__(self) -> "_NoopTimer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+class NoopMetric:
+    # handed out when metrics are disabled, every call is a no-op
+
+    def inc(self, amount: float = 1, **labels: str):
+        pass
+
+    def observe(self, value: float, **labels: str):
+        pass
+
+    def time(self, **labels: str) -> _NoopTimer:
+        return _NOOP_TIMER
+
+
+_NOOP_METRIC = NoopMetric()
+
+Metric = Union[Counter, Histogram]
+
+
+class MetricsRegistry:
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self.started = time.time()
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name: str, factory) -> Union[Metric, NoopMetric]:
+        if not self.enabled:
+            return _NOOP_METRIC
+
+        name = f"{METRIC_PREFIX}{name}"
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = factory(name)
+            return self._metrics[name]
+
+    def counter(self, name: str, description: str) -> Union[Counter, NoopMetric]:
+        return self._get_or_create(name, lambda x: Counter(x, description))
+
+    def histogram(self, name: str, description: str,
+                  buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Union[Histogram, NoopMetric]:
+        return self._get_or_create(name, lambda x: Histogram(x, description, buckets))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(f"{METRIC_PREFIX}{name}")
+
+    def get_const_labels(self) -> LabelKey:
+        return ((PROCESS_LABEL, str(os.getpid())),)
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        const_labels = self.get_const_labels()
+        return "\n".join(line for _, metric in metrics for line in metric.to_prometheus(const_labels)) + "\n"
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        return {"labels": dict(self.get_const_labels()),
+                "started": self.started,
+                "finished": time.time(),
+                "metrics": {name: metric.to_dict() for name, metric in metrics}}
+
+    def export(self, run_name: str, output_folder: Optional[str] = METRICS_OUTPUT) -> Optional[str]:
+        # writes <run_name>.prom (prometheus text format) and <run_name>.json, returns the path prefix
+        if not self.enabled or not output_folder:
+            return None
+
+        os.makedirs(output_folder, exist_ok=True)
+        prefix = f"{output_folder}/{run_name}"
+
+        for path, content in ((f"{prefix}.prom", self.to_prometheus()),
+                              (f"{prefix}.json", json.dumps(self.to_dict(), indent=2))):
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+
+        return prefix
+
+
+registry = MetricsRegistry()
+
+
+def counter(name: str, description: str) -> Union[Counter, NoopMetric]:
+    return registry.counter(name, description)
+
+
+def histogram(name: str, description: str,
+              buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Union[Histogram, NoopMetric]:
+    return registry.histogram(name, description, buckets)
+
+
+def export(run_name: str, output_folder: Optional[str] = METRICS_OUTPUT) -> Optional[str]:
+    return registry.export(run_name, output_folder)
+
+
+def remove_exports(run_name_prefix: str, output_folder: Optional[str] = METRICS_OUTPUT):
+    # exports named after something that changes between runs (eg: a worker pid) are never overwritten,
+    # the run starting removes the ones of the previous runs
+    if not output_folder:
+        return
+
+    for path in glob.glob(f"{glob.escape(output_folder)}/{glob.escape(run_name_prefix)}*"):
+        if path.endswith((".prom", ".json")):
+            os.remove(path)
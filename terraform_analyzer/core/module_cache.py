@@ -0,0 +1,164 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Optional, Iterable
+
+from pydantic import BaseModel
+
+from terraform_analyzer.core import RemoteResource, GitHubReference, Resource
+from terraform_analyzer.core.crawl_state import dump_remote_resource, load_remote_resource
+from terraform_analyzer.external import CACHE_FOLDER, blob_store
+
+MODULE_CACHE_FOLDER = f"{CACHE_FOLDER}/modules"
+GITHUB_HOST = "github.com"
+
+logger = logging.getLogger("module_cache")
+
+
+class ModuleCacheEntry(BaseModel):
+    # every resource crawled from the module (itself included), stored with crawl_state.dump_remote_resource
+    resources: list[str]
+    # stored resource -> (path relative to the crawl output folder, blob sha) of each downloaded file
+    files: dict[str, list[tuple[str, str]]]
+
+    def get_resources(self) -> list[RemoteResource]:
+        return [load_remote_resource(x) for x in self.resources]
+
+
+def is_module_root(rr: RemoteResource) -> bool:
+    # remote dependencies are crawled from the root of their module, see crawler._to_remote_resource
+    return isinstance(rr.remote_reference, GitHubReference) and rr.is_directory and not rr.relative_path and not rr.name
+
+
+def get_module_key(rr: RemoteResource) -> tuple[str, str, str, str, str]:
+    ghr: GitHubReference = rr.remote_reference
+    return GITHUB_HOST, ghr.author.lower(), ghr.project.lower(), ghr.commit_hash.lower(), ghr.path.strip("/")
+
+
+def _get_entry_path(rr: RemoteResource) -> str:
+    (host, author, project, commit_hash, subpath) = get_module_key(rr)
+    subpath_key = hashlib.sha1(subpath.encode()).hexdigest()
+    return f"{MODULE_CACHE_FOLDER}/{host}/{author}/{project}/{commit_hash}/{subpath_key}.json"
+
+
+def get(rr: RemoteResource) -> Optional[ModuleCacheEntry]:
+    path = _get_entry_path(rr)
+
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, 'r') as file:
+            return ModuleCacheEntry.model_validate_json(file.read())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable module cache entry {path}", exc_info=e)
+        return None
+
+
+def put(rr: RemoteResource, entry: ModuleCacheEntry):
+    path = _get_entry_path(rr)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as file:
+        file.write(entry.model_dump_json())
+    os.replace(tmp_path, path)
+
+
+def materialise(entry: ModuleCacheEntry, output_folder_path: str) -> bool:
+    files = [x for stored_files in entry.files.values() for x in stored_files]
+
+    # the blob store may have been cleaned since the entry was written
+    if not all(blob_store.has_blob(sha) for _, sha in files):
+        return False
+
+    for relative_path, sha in files:
+        blob_store.materialise(sha, f"{output_folder_path}/{relative_path}")
+
+    return True
+
+
+class ModuleGraph:
+    # what a crawl went through, enough to write the module cache entry of every module it fully crawled
+
+    def __init__(self, output_folder_path: str):
+        self.output_folder_path = output_folder_path
+        self.edges: dict[RemoteResource, set[RemoteResource]] = {}
+        self.files: dict[RemoteResource, list[tuple[str, str]]] = {}
+        # resources materialised from a cache entry, their own entries are already stored
+        self.cached: set[RemoteResource] = set()
+        # resources with a dependency that could not be resolved, maybe transiently, never stored as part of a module
+        self.incomplete: set[RemoteResource] = set()
+
+    def add_download(self, rr: RemoteResource, resources: Iterable[Resource]):
+        self.edges.setdefault(rr, set())
+        self.files[rr] = [(os.path.relpath(x.local_resource.full_path, self.output_folder_path),
+                           self._get_blob_sha(x.local_resource.full_path)) for x in resources]
+
+    def add_edge(self, parent: RemoteResource, child: RemoteResource):
+        self.edges.setdefault(parent, set()).add(child)
+
+    def add_unresolved(self, parent: RemoteResource):
+        self.incomplete.add(parent)
+
+    def add_cached(self, rr: RemoteResource, entry: ModuleCacheEntry):
+        for resource, stored in zip(entry.get_resources(), entry.resources):
+            self.cached.add(resource)
+            self.edges.setdefault(resource, set())
+            self.files[resource] = [tuple(x) for x in entry.files.get(stored, [])]
+            if resource != rr:
+                self.add_edge(rr, resource)
+
+    @staticmethod
+    def _get_blob_sha(file_path: str) -> str:
+        with open(file_path, 'rb') as file:
+            return blob_store.put_blob(file.read())
+
+    def get_closure(self, rr: RemoteResource) -> Optional[list[RemoteResource]]:
+        # None when part of the closure was not crawled in this run (eg: resumed crawls) or is missing a dependency
+        closure: list[RemoteResource] = []
+        seen: set[RemoteResource] = {rr}
+        stack: list[RemoteResource] = [rr]
+
+        while stack:
+            current = stack.pop()
+
+            if current not in self.files or current in self.incomplete:
+                return None
+
+            closure.append(current)
+
+            for child in self.edges.get(current, ()):
+                if child not in seen:
+                    seen.add(child)
+                    stack.append(child)
+
+        return closure
+
+    def build_entry(self, rr: RemoteResource) -> Optional[ModuleCacheEntry]:
+        closure = self.get_closure(rr)
+
+        if closure is None:
+            return None
+
+        stored = [dump_remote_resource(x) for x in closure]
+
+        return ModuleCacheEntry(resources=stored, files={s: self.files[x] for x, s in zip(closure, stored)})
+
+    def store_modules(self) -> int:
+        stored = 0
+
+        for rr in self.edges:
+            if not is_module_root(rr) or rr in self.cached:
+                continue
+
+            entry = self.build_entry(rr)
+
+            if entry is not None:
+                put(rr, entry)
+                stored += 1
+
+        logger.info(f"Stored {stored} modules in the module cache")
+
+        return stored
@@ -0,0 +1,253 @@
+import cProfile
+import heapq
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Optional, Callable, Any
+
+from pydantic import BaseModel
+
+from terraform_analyzer.external import CACHE_FOLDER
+
+PROFILE_ENABLED: bool = os.environ.get("PROFILE", "False").lower() == 'true'
+PROFILE_MODE_SAMPLE = "sample"
+PROFILE_MODE_CPROFILE = "cprofile"
+PROFILE_MODE_OFF = "off"
+# sample: stack samples of the profiled thread, cheap enough to run on every repo
+# cprofile: every call is traced, exact counts but several times slower
+PROFILE_MODE: str = os.environ.get("PROFILE_MODE", PROFILE_MODE_SAMPLE)
+# seconds, runs taking longer than this get their report and capture written
+PROFILE_BUDGET: float = float(os.environ.get("PROFILE_BUDGET", "60"))
+PROFILE_OUTPUT: str = os.environ.get("PROFILE_OUTPUT", f"{CACHE_FOLDER}/profiles")
+SLOW_LOG_SIZE: int = int(os.environ.get("SLOW_LOG_SIZE", "20"))
+# seconds between two stack samples
+SAMPLE_INTERVAL = 0.005
+
+logger = logging.getLogger("profiling")
+
+
+class SlowLogEntry(BaseModel):
+    name: str
+    seconds: float
+    # bytes for files, characters of the resolved fields for resources
+    size: int
+
+
+class SlowLog:
+    # the slowest entries seen, the size is only computed for the ones kept
+
+    def __init__(self, size: int = SLOW_LOG_SIZE):
+        self.size = size
+        self._heap: list[tuple[float, int, SlowLogEntry]] = []
+        self._counter = 0
+
+    def add(self, name: str, seconds: float, get_size: Callable[[], int]):
+        if len(self._heap) >= self.size and seconds <= self._heap[0][0]:
+            return
+
+        self._counter += 1
+        item = (seconds, self._counter, SlowLogEntry(name=name, seconds=seconds, size=get_size()))
+
+        if len(self._heap) >= self.size:
+            heapq.heapreplace(self._heap, item)
+        else:
+            heapq.heappush(self._heap, item)
+
+    def get_entries(self) -> list[SlowLogEntry]:
+        return [x[2] for x in sorted(self._heap, reverse=True)]
+
+
+class StackSampler:
+    # samples the stack of one thread from a background thread, the output is the collapsed stack
+    # format of flamegraph.pl (also read by speedscope)
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack: list[str] = []
+
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+
+            if stack:
+                key = ";".join(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="stack_sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def dump(self, path: str):
+        with open(path, 'w') as file:
+            for stack, count in sorted(self.samples.items(), key=lambda x: x[1], reverse=True):
+                file.write(f"{stack} {count}\n")
+
+
+class _StageTimer:
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self) -> "_StageTimer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.add_timing(self.name, time.perf_counter() - self.started)
+
+
+class Profiler:
+    # stages nest by name ("parse" includes "parse.load"), the capture only covers the thread that
+    # entered the profiler (eg: the parsing, not the download threads of the crawler)
+
+    def __init__(self,
+                 name: str,
+                 budget: float = PROFILE_BUDGET,
+                 mode: str = PROFILE_MODE,
+                 output_folder: Optional[str] = PROFILE_OUTPUT,
+                 slow_log_size: int = SLOW_LOG_SIZE):
+        if mode not in (PROFILE_MODE_SAMPLE, PROFILE_MODE_CPROFILE, PROFILE_MODE_OFF):
+            raise RuntimeError(f"Unknown profile mode '{mode}'")
+
+        self.name = name
+        self.budget = budget
+        self.mode = mode
+        self.output_folder = output_folder
+        self.enabled = True
+
+        # stage -> seconds
+        self.timings: dict[str, float] = {}
+        # stage -> times it was entered
+        self.calls: dict[str, int] = {}
+        self.slow_files = SlowLog(slow_log_size)
+        self.slow_resources = SlowLog(slow_log_size)
+        self.elapsed = 0.0
+
+        self._started = 0.0
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[StackSampler] = None
+
+    def stage(self, name: str) -> _StageTimer:
+        return _StageTimer(self, name)
+
+    def add_timing(self, name: str, seconds: float):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def record_file(self, path: str, seconds: float):
+        self.slow_files.add(path, seconds, lambda: os.path.getsize(path) if os.path.exists(path) else 0)
+
+    def record_resource(self, name: str, seconds: float, fields: Any):
+        self.slow_resources.add(name, seconds, lambda: len(repr(fields)))
+
+    def __enter__(self) -> "Profiler":
+        if self.mode == PROFILE_MODE_CPROFILE:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        elif self.mode == PROFILE_MODE_SAMPLE:
+            self._sampler = StackSampler(threading.get_ident())
+            self._sampler.start()
+
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self._started
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+
+        if self.elapsed > self.budget:
+            path = self.export()
+            logger.warning("%s took %.1fs (budget %.1fs), profile written to %s", self.name, self.elapsed,
+                           self.budget, path)
+        else:
+            logger.debug("%s took %.1fs: %s", self.name, self.elapsed, self.timings)
+
+    def get_report(self) -> dict:
+        return {"name": self.name,
+                "elapsed": self.elapsed,
+                "budget": self.budget,
+                "stages": {k: {"seconds": v, "calls": self.calls[k]} for k, v in sorted(self.timings.items())},
+                "slow_files": [x.model_dump() for x in self.slow_files.get_entries()],
+                "slow_resources": [x.model_dump() for x in self.slow_resources.get_entries()]}
+
+    def export(self) -> Optional[str]:
+        # <name>.json with the stages and slow logs, plus <name>.pstats or <name>.collapsed, returns the path prefix
+        if not self.output_folder:
+            return None
+
+        os.makedirs(self.output_folder, exist_ok=True)
+        prefix = f"{self.output_folder}/{self.name.replace('/', '_')}"
+
+        with open(f"{prefix}.json", 'w') as file:
+            json.dump(self.get_report(), file, indent=2)
+
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(f"{prefix}.pstats")
+        if self._sampler is not None:
+            self._sampler.dump(f"{prefix}.collapsed")
+
+        return prefix
+
+
+class _NoopStageTimer:
+
+    def __enter__(self) -> "_NoopStageTimer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+_NOOP_STAGE_TIMER = _NoopStageTimer()
+
+
+class NoopProfiler(Profiler):
+    # default of the instrumented functions, every call is a no-op
+
+    def __init__(self):
+        super().__init__("noop", mode=PROFILE_MODE_OFF, output_folder=None)
+        self.enabled = False
+
+    def stage(self, name: str) -> _NoopStageTimer:
+        return _NOOP_STAGE_TIMER
+
+    def add_timing(self, name: str, seconds: float):
+        pass
+
+    def record_file(self, path: str, seconds: float):
+        pass
+
+    def record_resource(self, name: str, seconds: float, fields: Any):
+        pass
+
+    def __enter__(self) -> "NoopProfiler":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NOOP_PROFILER = NoopProfiler()
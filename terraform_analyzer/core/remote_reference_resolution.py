@@ -1,4 +1,8 @@
+import logging
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
 
 from terraform_analyzer.core import RemoteReference, GitHubReference, RepoReference
 from terraform_analyzer.external import github_manager
@@ -8,6 +12,9 @@ GITHUB_URL = "github.com"
 
 GIT_GITHUB_REGEX = re.compile('github\.com\/([^\/]*)\/([^\/]*)\.git(?:\/\/([^\?]*))?\?(?:.*)ref=([^&\n]*)&?')
 SHA_REGEX = re.compile('^[A-Fa-f0-9]{40}$')
+RESOLUTION_MAX_WORKERS = int(os.environ.get("RESOLUTION_MAX_WORKERS", "8"))
+
+logger = logging.getLogger("remote_reference_resolution")
 
 
 def parse_git(git_url: str) -> RepoReference:
@@ -37,3 +44,18 @@ def resolve(url: str) -> RemoteReference:
         return parse_github(url)
 
     raise RuntimeError(f"Unable to resolve reference for '{url}'")
+
+
+def resolve_many(urls: Iterable[str], max_workers: int = RESOLUTION_MAX_WORKERS) -> dict[str, Optional[RemoteReference]]:
+    # failed references map to None, one bad module must not stop the others
+    unique = list(dict.fromkeys(urls))
+
+    def resolve_or_none(url: str) -> Optional[RemoteReference]:
+        try:
+            return resolve(url)
+        except Exception as e:
+            logger.warning(f"Unable to resolve reference for '{url}': {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(unique, executor.map(resolve_or_none, unique)))
@@ -0,0 +1,137 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Optional
+
+from pydantic import BaseModel
+
+from terraform_analyzer.core import LocalResource
+from terraform_analyzer.external import CACHE_FOLDER
+
+INVENTORY_CACHE_FOLDER = f"{CACHE_FOLDER}/inventories"
+TF_EXTENSION = ".tf"
+MAIN_TF_NAME = "main.tf"
+
+logger = logging.getLogger("repo_inventory")
+
+
+class RepoInventory(BaseModel):
+    root: str
+    # every entry below the root, the root included (same as `find root | wc -l`)
+    file_count: int
+    # folder path relative to the root ("" for the root) -> entry name -> is a directory
+    folders: dict[str, dict[str, bool]]
+    # folder path relative to the root -> names of its .tf files
+    tf_files: dict[str, list[str]]
+    # relative paths of the main.tf files, shallowest first
+    main_candidates: list[str]
+    # mtime of the root when it was walked, see get_inventory
+    root_mtime_ns: int
+
+    def get_root_main(self) -> Optional[str]:
+        return f"{self.root}/{self.main_candidates[0]}" if self.main_candidates else None
+
+    def _get_relative_path(self, path: str) -> Optional[str]:
+        relative_path = os.path.relpath(os.path.abspath(path), self.root)
+
+        if relative_path == ".":
+            return ""
+        elif relative_path == ".." or relative_path.startswith("../"):
+            return None
+
+        return relative_path
+
+    def list_folder(self, path: str) -> Optional[list[LocalResource]]:
+        # None when the folder is not part of the inventory (outside of the root, missing, symlinked)
+        relative_path = self._get_relative_path(path)
+
+        if relative_path is None or relative_path not in self.folders:
+            return None
+
+        full_path = os.path.abspath(path)
+
+        return [LocalResource(full_path=f"{full_path}/{name}", name=name, is_directory=is_dir)
+                for name, is_dir in self.folders[relative_path].items()]
+
+
+def walk(root: str) -> RepoInventory:
+    root = os.path.abspath(root)
+
+    file_count = 1
+    folders: dict[str, dict[str, bool]] = {}
+    tf_files: dict[str, list[str]] = {}
+    main_candidates: list[str] = []
+
+    stack: list[str] = [""]
+
+    while stack:
+        relative_folder = stack.pop()
+        entries: dict[str, bool] = {}
+
+        with os.scandir(f"{root}/{relative_folder}" if relative_folder else root) as iterator:
+            for entry in iterator:
+                relative_path = f"{relative_folder}/{entry.name}" if relative_folder else entry.name
+                file_count += 1
+
+                try:
+                    entries[entry.name] = entry.is_dir()
+                except OSError:
+                    entries[entry.name] = False
+
+                # symlinked folders are listed but not walked, like find does
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(relative_path)
+                elif not entries[entry.name]:
+                    if entry.name.endswith(TF_EXTENSION):
+                        tf_files.setdefault(relative_folder, []).append(entry.name)
+                    if entry.name.lower() == MAIN_TF_NAME:
+                        main_candidates.append(relative_path)
+
+        folders[relative_folder] = entries
+
+    return RepoInventory(root=root,
+                         file_count=file_count,
+                         folders=folders,
+                         tf_files=tf_files,
+                         main_candidates=sorted(main_candidates, key=lambda x: (x.count("/"), x)),
+                         root_mtime_ns=os.stat(root).st_mtime_ns)
+
+
+def _get_cache_path(root: str) -> str:
+    return f"{INVENTORY_CACHE_FOLDER}/{hashlib.sha1(root.encode()).hexdigest()}.json"
+
+
+def invalidate(root: str):
+    # the crawler calls it for every project folder it downloaded into
+    try:
+        os.remove(_get_cache_path(os.path.abspath(root)))
+    except FileNotFoundError:
+        pass
+
+
+def get_inventory(root: str, use_cache: bool = True) -> RepoInventory:
+    # a cached inventory is reused while the root folder keeps its mtime. Changes deeper in the tree are not
+    # noticed, the crawler invalidates the folders it downloads into (use_cache=False for any other writer)
+    root = os.path.abspath(root)
+    cache_path = _get_cache_path(root)
+
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r') as file:
+                inventory = RepoInventory.model_validate_json(file.read())
+
+            if inventory.root_mtime_ns == os.stat(root).st_mtime_ns:
+                return inventory
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable inventory {cache_path}", exc_info=e)
+
+    inventory = walk(root)
+
+    os.makedirs(INVENTORY_CACHE_FOLDER, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as file:
+        file.write(inventory.model_dump_json())
+    os.replace(tmp_path, cache_path)
+
+    return inventory
@@ -1,9 +1,11 @@
-from typing import Union
+import itertools
+from typing import Union, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 
 from terraform_analyzer import TerraformResource
 from terraform_analyzer.core.hcl import CloudResourceType
+from terraform_analyzer.core.schema.schema_query import GraphIndex, GraphQuery, MAX_INDEX_COMPONENTS
 
 NODE_TYPES = {
     CloudResourceType.AWS_LAMBDA: "Lambda",
@@ -22,6 +24,9 @@ class FrozenModel(BaseModel):
 class ComponentTf(FrozenModel):
     terraform_resource: TerraformResource
 
+    def get_cloud_resource_type(self) -> CloudResourceType:
+        return self.terraform_resource.get_cloud_resource_type()
+
     def __hash__(self) -> int:
         return hash(self.terraform_resource.get_qualified_name())
 
@@ -34,6 +39,9 @@ class NodeTf(BaseModel):
     def model_post_init(self, __context):
         self.name = NODE_TYPES.get(self.cloud_resource_type, "")
 
+    def get_cloud_resource_type(self) -> CloudResourceType:
+        return self.cloud_resource_type
+
     def __hash__(self) -> int:
         return hash(self.cloud_resource_type)
 
@@ -47,14 +55,174 @@ class ConnectionTf(FrozenModel):
 class GraphTf(BaseModel):
     nodes: set[NodeTf]
     connections: list[ConnectionTf]
+    # ordered components and, at the same position, the connections they originate
+    _components: list[ComponentTf] = PrivateAttr(default_factory=list)
+    _component_connections: list[list[ConnectionTf]] = PrivateAttr(default_factory=list)
+    _nodes_by_type: dict[CloudResourceType, NodeTf] = PrivateAttr(default_factory=dict)
+    # identifier -> components/nodes known by it, reference address -> components referencing it
+    _identifier_index: dict[str, list[Union[ComponentTf, NodeTf]]] = PrivateAttr(default_factory=dict)
+    _reference_index: dict[str, list[ComponentTf]] = PrivateAttr(default_factory=dict)
+    _query_index: Optional[GraphIndex] = PrivateAttr(default=None)
+
+    def _index_identifier(self, identifier: str, component_or_node: Union[ComponentTf, NodeTf]):
+        indexed = self._identifier_index.get(identifier, [])
+        assert not any(isinstance(x, NodeTf) for x in indexed)
+
+        if isinstance(component_or_node, NodeTf):
+            assert not indexed
+            self._identifier_index[identifier] = [component_or_node]
+        else:
+            self._identifier_index[identifier] = indexed + [component_or_node]
+
+    def _unindex_identifier(self, identifier: str, component_or_node: Union[ComponentTf, NodeTf]):
+        indexed = [x for x in self._identifier_index.get(identifier, []) if x is not component_or_node]
+
+        if indexed:
+            self._identifier_index[identifier] = indexed
+        else:
+            self._identifier_index.pop(identifier, None)
+
+    def _infer_component_connections(self, component: ComponentTf) -> list[ConnectionTf]:
+        result: list[ConnectionTf] = []
+
+        for reference in component.terraform_resource.get_parsed_references():
+            parsed_ref = reference.address
+
+            other_components_or_nodes = self._identifier_index.get(parsed_ref, [])
+            for other_component_or_node in other_components_or_nodes:
+                if component == other_component_or_node:
+                    continue
+
+                result.append(ConnectionTf(a=component,
+                                           b=other_component_or_node,
+                                           justification={parsed_ref}))
+
+        return result
+
+    def _update_connections(self, affected_identifiers: set[str], new_components: list[ComponentTf]):
+        affected: set[int] = {id(x) for x in new_components}
+
+        for identifier in affected_identifiers:
+            affected.update(id(x) for x in self._reference_index.get(identifier, []))
+
+        for i, component in enumerate(self._components):
+            if id(component) in affected:
+                self._component_connections[i] = self._infer_component_connections(component)
+
+        self.connections = list(itertools.chain.from_iterable(self._component_connections))
+        self._query_index = None
+
+    def _refresh_node(self, cloud_resource_type: CloudResourceType) -> set[str]:
+        # returns the identifiers that appeared or disappeared with the node
+        components = {x for x in self._components if x.get_cloud_resource_type() == cloud_resource_type}
+        node: Optional[NodeTf] = self._nodes_by_type.get(cloud_resource_type)
+        identifier = cloud_resource_type.get_service_permission_identifier()
+
+        if node is not None and components:
+            node.components = components
+            return set()
+        elif node is not None:
+            self.nodes.discard(node)
+            del self._nodes_by_type[cloud_resource_type]
+            if identifier:
+                self._unindex_identifier(identifier, node)
+        elif components:
+            node = NodeTf(cloud_resource_type=cloud_resource_type,
+                          components=components)
+            self.nodes.add(node)
+            self._nodes_by_type[cloud_resource_type] = node
+            if identifier:
+                self._index_identifier(identifier, node)
+
+        return {identifier} if identifier else set()
+
+    def index_components(self, components: list[ComponentTf]):
+        # full build, expects self.nodes to already hold the nodes of the given components
+        self._components = list(components)
+        self._nodes_by_type = {node.cloud_resource_type: node for node in self.nodes}
+        self._identifier_index = {}
+        self._reference_index = {}
+
+        for component in self._components:
+            for identifier in component.terraform_resource.get_identifiers():
+                self._index_identifier(identifier, component)
+            for reference in component.terraform_resource.get_parsed_references():
+                self._reference_index.setdefault(reference.address, []).append(component)
+
+        for node in self.nodes:
+            identifier = node.cloud_resource_type.get_service_permission_identifier()
+            if identifier:
+                self._index_identifier(identifier, node)
+
+        self._component_connections = [self._infer_component_connections(x) for x in self._components]
+        self.connections = list(itertools.chain.from_iterable(self._component_connections))
+        self._query_index = None
+
+    def add_resources(self, terraform_resources: list[TerraformResource]) -> list[ComponentTf]:
+        new_components: list[ComponentTf] = [ComponentTf(terraform_resource=x) for x in terraform_resources]
+        affected_identifiers: set[str] = set()
+
+        for component in new_components:
+            self._components.append(component)
+            self._component_connections.append([])
+
+            for identifier in component.terraform_resource.get_identifiers():
+                self._index_identifier(identifier, component)
+                affected_identifiers.add(identifier)
+            for reference in component.terraform_resource.get_parsed_references():
+                self._reference_index.setdefault(reference.address, []).append(component)
+
+        for cloud_resource_type in {x.get_cloud_resource_type() for x in new_components}:
+            if cloud_resource_type in self._nodes_by_type:
+                self._nodes_by_type[cloud_resource_type].components.update(
+                    x for x in new_components if x.get_cloud_resource_type() == cloud_resource_type)
+            else:
+                affected_identifiers.update(self._refresh_node(cloud_resource_type))
+
+        self._update_connections(affected_identifiers, new_components)
+
+        return new_components
+
+    def remove_resources(self, terraform_resources: list[TerraformResource]) -> list[ComponentTf]:
+        removed_components: list[ComponentTf] = []
+        affected_identifiers: set[str] = set()
+
+        for terraform_resource in terraform_resources:
+            component = ComponentTf(terraform_resource=terraform_resource)
+            position = next((i for i, x in enumerate(self._components) if x == component), None)
+
+            if position is None:
+                continue
+
+            component = self._components.pop(position)
+            self._component_connections.pop(position)
+            removed_components.append(component)
+
+            for identifier in component.terraform_resource.get_identifiers():
+                self._unindex_identifier(identifier, component)
+                affected_identifiers.add(identifier)
+            for reference in component.terraform_resource.get_parsed_references():
+                referencing = [x for x in self._reference_index.get(reference.address, []) if x is not component]
+                if referencing:
+                    self._reference_index[reference.address] = referencing
+                else:
+                    self._reference_index.pop(reference.address, None)
+
+        for cloud_resource_type in {x.get_cloud_resource_type() for x in removed_components}:
+            affected_identifiers.update(self._refresh_node(cloud_resource_type))
+
+        self._update_connections(affected_identifiers, [])
+
+        return removed_components
+
+    def get_components(self) -> list[ComponentTf]:
+        return list(self._components)
 
     def get_connections_types_str(self) -> set[str]:
         conns: set[str] = set()
         conn: ConnectionTf
         for conn in self.connections:
-            conns.add(
-                f"{conn.a.terraform_resource.get_cloud_resource_type()}->"
-                f"{conn.b.terraform_resource.get_cloud_resource_type()}")
+            conns.add(f"{conn.a.get_cloud_resource_type()}->{conn.b.get_cloud_resource_type()}")
         return conns
 
     def get_connections_str(self) -> set[str]:
@@ -84,9 +252,28 @@ class GraphTf(BaseModel):
 
         return connected
 
+    def _get_indexed_components(self) -> Union[list[ComponentTf], set[ComponentTf]]:
+        return self._components if self._components else self.get_all_components()
+
+    def get_query_index(self) -> GraphIndex:
+        # raises for graphs over MAX_INDEX_COMPONENTS
+        if self._query_index is None:
+            self._query_index = GraphIndex(self._get_indexed_components(), self.connections)
+        return self._query_index
+
+    def query(self, queries: list[GraphQuery]) -> list[list[tuple[ComponentTf, ...]]]:
+        return self.get_query_index().run(queries)
+
     def get_transitive_connected(self, component: ComponentTf,
                                  filter_by: set[CloudResourceType] = None) -> list[ComponentTf]:
+        if self._query_index is None and len(self._get_indexed_components()) > MAX_INDEX_COMPONENTS:
+            return self._walk_transitive_connected(component, filter_by)
+
+        return self.get_query_index().transitive_connected(component, filter_by)
 
+    def _walk_transitive_connected(self, component: ComponentTf,
+                                   filter_by: set[CloudResourceType] = None) -> list[ComponentTf]:
+        # breadth first walk of graphs too large to index, same results without the NxN matrices
         visited_nodes: set[str] = {component.terraform_resource.get_qualified_name()}
 
         connections: list[ComponentTf] = []
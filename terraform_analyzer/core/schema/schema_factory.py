@@ -1,49 +1,12 @@
-import re
-from typing import Union
-
 from terraform_analyzer import TerraformResource
+from terraform_analyzer.core import metrics
 from terraform_analyzer.core.hcl import CloudResourceType
-from terraform_analyzer.core.schema import GraphTf, NodeTf, ComponentTf, ConnectionTf
-
-TF_VARIABLE_PATTERN = re.compile("\${((?:[^\.]*)\.(?:[^\.]*)).*}")
-
-
-def _parse_reference(reference: str) -> str:
-    match = TF_VARIABLE_PATTERN.match(reference)
-    return match.group(1) if match else reference
-
-
-def _infer_connections(components: list[ComponentTf], nodes: set[NodeTf]) -> list[ConnectionTf]:
-    result: list[ConnectionTf] = []
-    c_n_identifier: dict[str, list[Union[ComponentTf, NodeTf]]] = {}
-
-    for comp in components:
-        identifiers = comp.terraform_resource.get_identifiers()
-        for identifier in identifiers:
-            c_n_identifier[identifier] = c_n_identifier.get(identifier, []) + [comp]
+from terraform_analyzer.core.schema import GraphTf, NodeTf, ComponentTf
 
-    for node in nodes:
-        identifier = node.cloud_resource_type.get_service_permission_identifier()
-        if identifier:
-            assert identifier not in c_n_identifier
-            c_n_identifier[identifier] = [node]
-
-    for component in components:
-        references = component.terraform_resource.get_references()
-
-        for reference in references:
-            parsed_ref = _parse_reference(reference)
-
-            other_components_or_nodes = c_n_identifier.get(parsed_ref, [])
-            for other_component_or_node in other_components_or_nodes:
-                if component == other_component_or_node:
-                    continue
-
-                result.append(ConnectionTf(a=component,
-                                           b=other_component_or_node,
-                                           justification={parsed_ref}))
-
-    return result
+BUILD_GRAPH_SECONDS = metrics.histogram("build_graph_seconds", "Time to build the graph of a project")
+GRAPH_COMPONENTS = metrics.histogram("graph_components", "Components per graph", metrics.SIZE_BUCKETS)
+GRAPH_NODES = metrics.histogram("graph_nodes", "Nodes per graph", metrics.SIZE_BUCKETS)
+GRAPH_CONNECTIONS = metrics.histogram("graph_connections", "Connections per graph", metrics.SIZE_BUCKETS)
 
 
 def _get_nodes(comps: list[ComponentTf]) -> set[NodeTf]:
@@ -73,10 +36,16 @@ def _get_components(terraform_resources: list[TerraformResource]) -> list[Compon
 
 
 def build_graph(terraform_resources: list[TerraformResource]) -> GraphTf:
-    components: list[ComponentTf] = _get_components(terraform_resources)
+    with BUILD_GRAPH_SECONDS.time():
+        components: list[ComponentTf] = _get_components(terraform_resources)
+
+        nodes: set[NodeTf] = _get_nodes(components)
 
-    nodes: set[NodeTf] = _get_nodes(components)
+        graph = GraphTf(nodes=nodes, connections=[])
+        graph.index_components(components)
 
-    connections: list[ConnectionTf] = _infer_connections(components, nodes)
+    GRAPH_COMPONENTS.observe(len(components))
+    GRAPH_NODES.observe(len(nodes))
+    GRAPH_CONNECTIONS.observe(len(graph.connections))
 
-    return GraphTf(nodes=nodes, connections=connections)
+    return graph
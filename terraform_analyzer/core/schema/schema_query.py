@@ -0,0 +1,194 @@
+# kept free of terraform_analyzer.core.schema imports so GraphTf can build and cache the index itself
+from typing import Optional, Union, Iterable, Any
+
+import numpy as np
+from pydantic import BaseModel
+
+from terraform_analyzer.core.hcl import CloudResourceType, CLOUD_RESOURCE_TYPE_INDEX
+
+# the adjacency is a dense NxN matrix (16MB at the limit) and every reach step multiplies it,
+# larger graphs are not indexed (GraphTf walks them instead)
+MAX_INDEX_COMPONENTS = 4096
+
+
+class FrozenQuery(BaseModel):
+    class Config:
+        frozen = True
+
+
+class ReachabilityQuery(FrozenQuery):
+    # components of type source that reach a component of the targets types,
+    # only going through components of the through types (any non target type when None)
+    source: CloudResourceType
+    targets: frozenset[CloudResourceType]
+    through: Optional[frozenset[CloudResourceType]] = None
+
+
+class PathQuery(FrozenQuery):
+    # eg: (AWS_LAMBDA, AWS_API_GATEWAY_REST_API, AWS_DYNAMO_DB), every hop is a reachability step
+    pattern: tuple[CloudResourceType, ...]
+    through: Optional[frozenset[CloudResourceType]] = None
+
+
+class NeighbourhoodQuery(FrozenQuery):
+    source: CloudResourceType
+    k: int = 1
+    types: Optional[frozenset[CloudResourceType]] = None
+
+
+GraphQuery = Union[ReachabilityQuery, PathQuery, NeighbourhoodQuery]
+
+
+class GraphIndex:
+
+    def __init__(self, components: Iterable[Any], connections: Iterable[Any]):
+        # components are deduplicated by qualified name, connections to nodes are ignored
+        self.components: list[Any] = []
+        self.positions: dict[str, int] = {}
+
+        for component in components:
+            name = component.terraform_resource.get_qualified_name()
+            if name not in self.positions:
+                self.positions[name] = len(self.components)
+                self.components.append(component)
+
+        size = len(self.components)
+
+        if size > MAX_INDEX_COMPONENTS:
+            raise RuntimeError(f"{size} components are too many for a query index (max {MAX_INDEX_COMPONENTS})")
+
+        self.types: np.ndarray = np.fromiter(
+            (CLOUD_RESOURCE_TYPE_INDEX[x.get_cloud_resource_type()] for x in self.components),
+            dtype=np.int64,
+            count=size)
+        self.adjacency: np.ndarray = np.zeros((size, size), dtype=bool)
+
+        for conn in connections:
+            a = self.get_position(conn.a)
+            b = self.get_position(conn.b)
+
+            if a is not None and b is not None:
+                self.adjacency[a, b] = True
+                self.adjacency[b, a] = True
+
+        np.fill_diagonal(self.adjacency, False)
+
+        self._reach_cache: dict[tuple, np.ndarray] = {}
+
+    def get_position(self, component_or_node: Any) -> Optional[int]:
+        if not hasattr(component_or_node, "terraform_resource"):
+            return None
+        return self.positions.get(component_or_node.terraform_resource.get_qualified_name())
+
+    def type_mask(self, types: Optional[Iterable[CloudResourceType]]) -> np.ndarray:
+        if types is None:
+            return np.ones(len(self.components), dtype=bool)
+        return np.isin(self.types, [CLOUD_RESOURCE_TYPE_INDEX[x] for x in types])
+
+    def reach(self, sources: np.ndarray, targets: np.ndarray, through: np.ndarray) -> np.ndarray:
+        # reached[i, j] -> component j is reachable from sources[i], expansion stops at targets
+        rows = np.arange(len(sources))
+
+        visited = np.zeros((len(sources), len(self.components)), dtype=bool)
+        visited[rows, sources] = True
+        reached = np.zeros_like(visited)
+
+        frontier = self.adjacency[sources] & ~visited
+
+        while frontier.any():
+            visited |= frontier
+            reached |= frontier & targets
+            frontier = ((frontier & through & ~targets) @ self.adjacency) & ~visited
+
+        return reached
+
+    def neighbourhood(self, sources: np.ndarray, k: int) -> np.ndarray:
+        rows = np.arange(len(sources))
+
+        visited = np.zeros((len(sources), len(self.components)), dtype=bool)
+        visited[rows, sources] = True
+        frontier = visited.copy()
+
+        for _ in range(k):
+            frontier = (frontier @ self.adjacency) & ~visited
+            if not frontier.any():
+                break
+            visited |= frontier
+
+        visited[rows, sources] = False
+
+        return visited
+
+    def _get_sources(self, source: CloudResourceType) -> np.ndarray:
+        return np.nonzero(self.types == CLOUD_RESOURCE_TYPE_INDEX[source])[0]
+
+    def _reach_types(self,
+                     source: CloudResourceType,
+                     targets: frozenset[CloudResourceType],
+                     through: Optional[frozenset[CloudResourceType]]) -> np.ndarray:
+        key = (source, targets, through)
+
+        if key not in self._reach_cache:
+            targets_mask = self.type_mask(targets)
+            through_mask = ~targets_mask if through is None else self.type_mask(through)
+
+            self._reach_cache[key] = self.reach(self._get_sources(source), targets_mask, through_mask)
+
+        return self._reach_cache[key]
+
+    def _run_reachability(self, query: ReachabilityQuery) -> list[tuple[Any, ...]]:
+        sources = self._get_sources(query.source)
+        reached = self._reach_types(query.source, query.targets, query.through)
+
+        return [(self.components[sources[i]], self.components[j]) for i, j in zip(*np.nonzero(reached))]
+
+    def _run_path(self, query: PathQuery) -> list[tuple[Any, ...]]:
+        if not query.pattern:
+            return []
+
+        paths: list[tuple[int, ...]] = [(x,) for x in self._get_sources(query.pattern[0])]
+
+        for source, target in zip(query.pattern, query.pattern[1:]):
+            sources = self._get_sources(source)
+            reached = self._reach_types(source, frozenset({target}), query.through)
+
+            next_paths: list[tuple[int, ...]] = []
+            for path in paths:
+                row = np.searchsorted(sources, path[-1])
+                next_paths.extend(path + (j,) for j in np.nonzero(reached[row])[0] if j not in path)
+            paths = next_paths
+
+        return [tuple(self.components[x] for x in path) for path in paths]
+
+    def _run_neighbourhood(self, query: NeighbourhoodQuery) -> list[tuple[Any, ...]]:
+        sources = self._get_sources(query.source)
+        reached = self.neighbourhood(sources, query.k) & self.type_mask(query.types)
+
+        return [(self.components[sources[i]], self.components[j]) for i, j in zip(*np.nonzero(reached))]
+
+    def run(self, queries: list[GraphQuery]) -> list[list[tuple[Any, ...]]]:
+        # queries of the same batch share the reachability matrices they have in common
+        results: list[list[tuple[Any, ...]]] = []
+
+        for query in queries:
+            if isinstance(query, ReachabilityQuery):
+                results.append(self._run_reachability(query))
+            elif isinstance(query, PathQuery):
+                results.append(self._run_path(query))
+            elif isinstance(query, NeighbourhoodQuery):
+                results.append(self._run_neighbourhood(query))
+            else:
+                raise RuntimeError(f"Unsupported query {type(query)}")
+
+        return results
+
+    def transitive_connected(self, component: Any, filter_by: Optional[set[CloudResourceType]] = None) -> list[Any]:
+        position = self.get_position(component)
+
+        if position is None:
+            return []
+
+        targets = self.type_mask(filter_by)
+        reached = self.reach(np.array([position]), targets, np.ones(len(self.components), dtype=bool))
+
+        return [self.components[x] for x in np.nonzero(reached[0])[0]]
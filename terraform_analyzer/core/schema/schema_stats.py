@@ -0,0 +1,155 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Callable, Optional, Any
+
+import numpy as np
+
+from terraform_analyzer.core.hcl import CloudResourceType, CLOUD_RESOURCE_TYPE_INDEX
+from terraform_analyzer.core.schema import GraphTf
+
+CLOUD_RESOURCE_TYPES: list[CloudResourceType] = list(CLOUD_RESOURCE_TYPE_INDEX)
+TYPE_COUNT = len(CLOUD_RESOURCE_TYPES)
+
+DEFAULT_CHUNK_SIZE = 256
+
+logger = logging.getLogger("schema_stats")
+
+
+def encode_connections(graph: GraphTf) -> np.ndarray:
+    # one row per connection with the type codes of both ends
+    codes = np.empty((len(graph.connections), 2), dtype=np.int64)
+
+    for i, conn in enumerate(graph.connections):
+        codes[i, 0] = CLOUD_RESOURCE_TYPE_INDEX[conn.a.get_cloud_resource_type()]
+        codes[i, 1] = CLOUD_RESOURCE_TYPE_INDEX[conn.b.get_cloud_resource_type()]
+
+    return codes
+
+
+def encode_resource_types(graph: GraphTf) -> np.ndarray:
+    return np.fromiter((CLOUD_RESOURCE_TYPE_INDEX[c.get_cloud_resource_type()] for c in graph.get_all_components()),
+                       dtype=np.int64)
+
+
+class ConnectionTypeStats:
+
+    def __init__(self):
+        self.repo_count = 0
+        # connection_counts[a, b] -> number of a->b connections across all repos
+        self.connection_counts = np.zeros((TYPE_COUNT, TYPE_COUNT), dtype=np.int64)
+        # repo_connection_counts[a, b] -> number of repos with at least one a->b connection
+        self.repo_connection_counts = np.zeros((TYPE_COUNT, TYPE_COUNT), dtype=np.int64)
+        # co_occurrence[a, b] -> number of repos declaring both a and b resources
+        self.co_occurrence = np.zeros((TYPE_COUNT, TYPE_COUNT), dtype=np.int64)
+        self.resource_counts = np.zeros(TYPE_COUNT, dtype=np.int64)
+        self.repo_resource_counts = np.zeros(TYPE_COUNT, dtype=np.int64)
+
+    def add_graph(self, graph: GraphTf) -> 'ConnectionTypeStats':
+        return self.add_codes(encode_connections(graph), encode_resource_types(graph))
+
+    def add_codes(self, connection_codes: np.ndarray, resource_codes: np.ndarray) -> 'ConnectionTypeStats':
+        connection_codes = np.asarray(connection_codes, dtype=np.int64).reshape(-1, 2)
+        resource_codes = np.asarray(resource_codes, dtype=np.int64)
+
+        self.repo_count += 1
+
+        flat_connections = connection_codes[:, 0] * TYPE_COUNT + connection_codes[:, 1]
+        self.connection_counts += np.bincount(flat_connections,
+                                              minlength=TYPE_COUNT * TYPE_COUNT).reshape(TYPE_COUNT, TYPE_COUNT)
+        self.repo_connection_counts.flat[np.unique(flat_connections)] += 1
+
+        self.resource_counts += np.bincount(resource_codes, minlength=TYPE_COUNT)
+
+        present = np.zeros(TYPE_COUNT, dtype=np.int64)
+        present[resource_codes] = 1
+        self.repo_resource_counts += present
+        self.co_occurrence += np.outer(present, present)
+
+        return self
+
+    def merge(self, other: 'ConnectionTypeStats') -> 'ConnectionTypeStats':
+        self.repo_count += other.repo_count
+        self.connection_counts += other.connection_counts
+        self.repo_connection_counts += other.repo_connection_counts
+        self.co_occurrence += other.co_occurrence
+        self.resource_counts += other.resource_counts
+        self.repo_resource_counts += other.repo_resource_counts
+        return self
+
+    def get_total_connections(self) -> int:
+        return int(self.connection_counts.sum())
+
+    def get_connection_histogram(self,
+                                 per_repo: bool = False) -> dict[tuple[CloudResourceType, CloudResourceType], int]:
+        matrix = self.repo_connection_counts if per_repo else self.connection_counts
+
+        return {(CLOUD_RESOURCE_TYPES[a], CLOUD_RESOURCE_TYPES[b]): int(matrix[a, b])
+                for a, b in zip(*np.nonzero(matrix))}
+
+    def get_resource_histogram(self, per_repo: bool = False) -> dict[CloudResourceType, int]:
+        counts = self.repo_resource_counts if per_repo else self.resource_counts
+
+        return {CLOUD_RESOURCE_TYPES[i]: int(counts[i]) for i in np.nonzero(counts)[0]}
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "types": [x.value for x in CLOUD_RESOURCE_TYPES],
+            "repo_count": self.repo_count,
+            "connection_counts": self.connection_counts.tolist(),
+            "repo_connection_counts": self.repo_connection_counts.tolist(),
+            "co_occurrence": self.co_occurrence.tolist(),
+            "resource_counts": self.resource_counts.tolist(),
+            "repo_resource_counts": self.repo_resource_counts.tolist()
+        }
+
+    def __str__(self) -> str:
+        connection_types: dict[str, int] = {f"{a.value}->{b.value}": count
+                                            for (a, b), count in self.get_connection_histogram().items()}
+
+        return f"repo_count={self.repo_count} " \
+               f"total_connections={self.get_total_connections()} " \
+               f"connection_types={connection_types}"
+
+
+def aggregate(graphs: Iterable[GraphTf]) -> ConnectionTypeStats:
+    stats = ConnectionTypeStats()
+
+    for graph in graphs:
+        stats.add_graph(graph)
+
+    return stats
+
+
+def _aggregate_chunk(graph_loader: Callable[[Any], Optional[GraphTf]], items: list[Any]) -> ConnectionTypeStats:
+    stats = ConnectionTypeStats()
+
+    for item in items:
+        try:
+            graph = graph_loader(item)
+        except Exception as e:
+            logger.error(f"Failed to load graph for {item}", exc_info=e)
+            continue
+
+        if graph is not None:
+            stats.add_graph(graph)
+
+    return stats
+
+
+def aggregate_parallel(items: Iterable[Any],
+                       graph_loader: Callable[[Any], Optional[GraphTf]],
+                       max_workers: Optional[int] = None,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE) -> ConnectionTypeStats:
+    # graph_loader runs inside the worker processes, so it has to be a picklable module level function
+    stats = ConnectionTypeStats()
+
+    items = list(items)
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_aggregate_chunk, graph_loader, chunk) for chunk in chunks]
+
+        for future in futures:
+            stats.merge(future.result())
+
+    return stats
@@ -1,18 +1,47 @@
 import logging
 import os
+from functools import partial
 
 import requests
 from github import Auth
 from github import Github
+from urllib3 import Retry
+
+from terraform_analyzer.external.github_transport import build_adapter, mount_adapter, install_github_adapter
+from terraform_analyzer.external.http_cache import HttpCache, DEFAULT_MAX_SIZE
+from terraform_analyzer.external.rate_limiter import RateLimitScheduler
 
 GITHUB_ACCESS_TOKEN: str = os.environ.get('ACCESS_TOKEN')
+# comma separated, requests rotate across all of them (ACCESS_TOKEN included)
+GITHUB_ACCESS_TOKENS: list[str] = list(dict.fromkeys(
+    x.strip() for x in os.environ.get('ACCESS_TOKENS', '').split(',') + [GITHUB_ACCESS_TOKEN or ''] if x.strip()))
+CACHE_FOLDER: str = os.environ.get('CACHE_FOLDER', os.path.expanduser("~/.cache/terraform_analyzer"))
+HTTP_CACHE_ENABLED: bool = os.environ.get('HTTP_CACHE', "True").lower() == 'true'
+HTTP_CACHE_MAX_SIZE: int = int(os.environ.get('HTTP_CACHE_MAX_SIZE', str(DEFAULT_MAX_SIZE)))
+# "contents" fetches every file through the contents API, "archive" downloads one tarball per repo@commit
+FETCH_MODE_CONTENTS = "contents"
+FETCH_MODE_ARCHIVE = "archive"
+FETCH_MODE: str = os.environ.get("FETCH_MODE", FETCH_MODE_CONTENTS)
+# max page size of the github API, fewer requests for every paginated list (eg: 10 instead of 34 for a full search)
+GITHUB_PER_PAGE = 100
+# server errors only, rate limited responses (403/429) are left to the scheduler
+GITHUB_RETRY = Retry(total=5, backoff_factor=1, status_forcelist=(500, 502, 503, 504), raise_on_status=False)
 logger = logging.getLogger("external/__init__")
 
+http_cache = HttpCache(f"{CACHE_FOLDER}/http", HTTP_CACHE_MAX_SIZE)
+rate_limit_scheduler = RateLimitScheduler(GITHUB_ACCESS_TOKENS)
+
+adapter_builder = partial(build_adapter, http_cache if HTTP_CACHE_ENABLED else None, rate_limit_scheduler)
+
 request_session = requests.Session()
+mount_adapter(request_session, adapter_builder())
+install_github_adapter(adapter_builder)
 
-if GITHUB_ACCESS_TOKEN:
-    auth = Auth.Token(GITHUB_ACCESS_TOKEN)
-    github_client = Github(auth=auth)
+if GITHUB_ACCESS_TOKENS:
+    # the scheduler picks the token of every request, this one only makes PyGithub behave as authenticated
+    auth = Auth.Token(GITHUB_ACCESS_TOKENS[0])
+    github_client = Github(auth=auth, per_page=GITHUB_PER_PAGE, retry=GITHUB_RETRY)
+    logger.info(f"Rotating requests across {len(GITHUB_ACCESS_TOKENS)} github token(s)")
 else:
-    github_client = Github()
+    github_client = Github(per_page=GITHUB_PER_PAGE, retry=GITHUB_RETRY)
     logger.info("No github auth provided, making requests in anonymous way (may get rate limited)")
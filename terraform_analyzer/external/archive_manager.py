@@ -0,0 +1,112 @@
+import logging
+import os
+import posixpath
+import tarfile
+import threading
+from collections import OrderedDict
+
+from terraform_analyzer.core import RemoteResource, GitHubReference
+from terraform_analyzer.external import request_session, blob_store
+from terraform_analyzer.external.git_tree import GitTreeEntryType, GitTreeEntry, RepoTreeIndex, normalize_path
+
+GITHUB_ARCHIVE_URL = os.environ.get("GITHUB_ARCHIVE_URL", "https://codeload.github.com")
+MAX_CACHED_ARCHIVES = 8
+TF_SUFFIX = ".tf"
+
+logger = logging.getLogger("archive_manager")
+
+
+class RepoArchive:
+
+    def __init__(self, files: dict[str, bytes], tree_index: RepoTreeIndex):
+        # normalized repo path -> content, only .tf files are kept
+        self.files = files
+        # every file and folder of the repo, .tf blobs carry their git sha (the others an empty one)
+        self.tree_index = tree_index
+
+    def get_file(self, path: str) -> bytes:
+        path = normalize_path(path)
+
+        if path not in self.files:
+            raise RuntimeError(f"'{path}' does not exist in archive")
+
+        return self.files[path]
+
+
+_ARCHIVES: OrderedDict[tuple[str, str, str], RepoArchive] = OrderedDict()
+_ARCHIVE_LOCKS: dict[tuple[str, str, str], threading.Lock] = {}
+_LOCK = threading.Lock()
+
+
+def _download_archive(ghr: GitHubReference) -> RepoArchive:
+    url = f"{GITHUB_ARCHIVE_URL}/{ghr.author}/{ghr.project}/tar.gz/{ghr.commit_hash}"
+    logger.info(f"Downloading archive '{url}'")
+
+    files: dict[str, bytes] = {}
+    entries: dict[str, GitTreeEntry] = {}
+
+    with request_session.get(url, stream=True) as response:
+        response.raise_for_status()
+
+        with tarfile.open(fileobj=response.raw, mode="r|gz") as tar:
+            member: tarfile.TarInfo
+            for member in tar:
+                # every entry lives under a "<project>-<sha>/" folder
+                path = normalize_path(member.name.split("/", 1)[1]) if "/" in member.name else ""
+
+                if not path:
+                    continue
+
+                if member.isdir():
+                    entries[path] = GitTreeEntry(type=GitTreeEntryType.TREE, sha="")
+                elif member.isfile() and path.endswith(TF_SUFFIX):
+                    files[path] = tar.extractfile(member).read()
+                    entries[path] = GitTreeEntry(type=GitTreeEntryType.BLOB, sha=blob_store.git_blob_sha(files[path]))
+                else:
+                    entries[path] = GitTreeEntry(type=GitTreeEntryType.BLOB, sha="")
+
+    # archives usually list their folders, but nothing requires it
+    for path in list(entries):
+        parent = posixpath.dirname(path)
+        while parent and parent not in entries:
+            entries[parent] = GitTreeEntry(type=GitTreeEntryType.TREE, sha="")
+            parent = posixpath.dirname(parent)
+
+    logger.info(f"Extracted {len(files)} tf files from '{url}'")
+
+    return RepoArchive(files, RepoTreeIndex(entries=entries))
+
+
+def get_archive(ghr: GitHubReference) -> RepoArchive:
+    key = (ghr.author, ghr.project, ghr.commit_hash)
+
+    with _LOCK:
+        if key in _ARCHIVES:
+            _ARCHIVES.move_to_end(key)
+            return _ARCHIVES[key]
+        key_lock = _ARCHIVE_LOCKS.setdefault(key, threading.Lock())
+
+    # a single download per repo@commit even when several crawler threads ask for it
+    with key_lock:
+        with _LOCK:
+            if key in _ARCHIVES:
+                return _ARCHIVES[key]
+
+        try:
+            archive = _download_archive(ghr)
+        except Exception:
+            with _LOCK:
+                _ARCHIVE_LOCKS.pop(key, None)
+            raise
+
+        with _LOCK:
+            _ARCHIVES[key] = archive
+            while len(_ARCHIVES) > MAX_CACHED_ARCHIVES:
+                _ARCHIVES.popitem(last=False)
+            _ARCHIVE_LOCKS.pop(key, None)
+
+    return archive
+
+
+def get_file_content(rr: RemoteResource, ghr: GitHubReference) -> bytes:
+    return get_archive(ghr).get_file(rr.get_remote_abs_path_with_name())
@@ -0,0 +1,85 @@
+import hashlib
+import logging
+import os
+import shutil
+import stat
+import threading
+
+from terraform_analyzer.external import CACHE_FOLDER
+
+BLOB_STORE_FOLDER = f"{CACHE_FOLDER}/blobs"
+# output files are hardlinks to the read-only blobs by default: they can not be edited in place (write a new
+# file and rename it over instead) and a chmod on one of them changes the blob too. False copies every blob
+# into a regular writable file instead, at the cost of the disk space the links save
+BLOB_STORE_LINKS: bool = os.environ.get("BLOB_STORE_LINKS", "True").lower() == 'true'
+
+logger = logging.getLogger("blob_store")
+
+
+def git_blob_sha(content: bytes) -> str:
+    # same hash git uses for blobs, so it matches the shas of tree listings and the contents API
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def get_blob_path(sha: str) -> str:
+    return f"{BLOB_STORE_FOLDER}/{sha[:2]}/{sha[2:]}"
+
+
+def has_blob(sha: str) -> bool:
+    return os.path.exists(get_blob_path(sha))
+
+
+def _tmp_path(path: str) -> str:
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def put_blob(content: bytes) -> str:
+    sha = git_blob_sha(content)
+    blob_path = get_blob_path(sha)
+
+    if os.path.exists(blob_path):
+        return sha
+
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+
+    tmp_path = _tmp_path(blob_path)
+    with open(tmp_path, 'wb') as file:
+        file.write(content)
+    # blobs are shared through hardlinks, make sure nobody writes through one of them
+    os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    os.replace(tmp_path, blob_path)
+
+    return sha
+
+
+def put_file(file_path: str, expected_sha: str) -> bool:
+    with open(file_path, 'rb') as file:
+        content = file.read()
+
+    if git_blob_sha(content) != expected_sha:
+        return False
+
+    put_blob(content)
+    return True
+
+
+def materialise(sha: str, file_path: str, link: bool = BLOB_STORE_LINKS):
+    blob_path = get_blob_path(sha)
+
+    # a link left by a previous run is replaced by a copy when links are off
+    if link and os.path.exists(file_path) and os.path.samefile(blob_path, file_path):
+        return
+
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    tmp_path = _tmp_path(file_path)
+    if link:
+        try:
+            os.link(blob_path, tmp_path)
+        except OSError:
+            # eg: output folder on a different device than the blob store
+            shutil.copyfile(blob_path, tmp_path)
+    else:
+        # copyfile leaves the permissions of the blob behind, the copy is writable
+        shutil.copyfile(blob_path, tmp_path)
+    os.replace(tmp_path, file_path)
@@ -1,17 +1,22 @@
 import itertools
 import logging
 import os
-from typing import List
+from typing import List, Optional
 
 from github import Repository, ContentFile
 
-from terraform_analyzer.core import Resource, RemoteResource, GitHubReference, LocalResource
-from terraform_analyzer.external import github_manager, github_client
+from terraform_analyzer.core import Resource, RemoteResource, GitHubReference, LocalResource, metrics
+from terraform_analyzer.external import github_manager, github_client, archive_manager, blob_store, FETCH_MODE, \
+    FETCH_MODE_ARCHIVE
 
 GITHUB_RESOURCE = "github"
 
 logger = logging.getLogger("download_manager")
 
+FILES_DOWNLOADED = metrics.counter("files_downloaded_total", "Files written to the output folder, by where they came from")
+BYTES_DOWNLOADED = metrics.counter("bytes_downloaded_total", "File bytes fetched from github")
+FETCH_SECONDS = metrics.histogram("file_fetch_seconds", "Time to fetch the content of one file from github")
+
 
 def _is_relevant_file_to_download_in_folder(remote_resource: RemoteResource) -> bool:
     return not remote_resource.is_directory and remote_resource.name.endswith(".tf")
@@ -31,7 +36,7 @@ def download_file_or_folder(remote_resource: RemoteResource, output_path: str) -
 
 
 def download_folder(remote_resource: RemoteResource, output_path: str) -> List[Resource]:
-    logging.info(f"Visiting folder '{remote_resource.get_remote_abs_path_with_name()}'")
+    logging.info("Visiting folder '%s'", remote_resource.get_remote_abs_path_with_name())
 
     if isinstance(remote_resource.remote_reference, GitHubReference):
         github_r: GitHubReference = remote_resource.remote_reference
@@ -65,17 +70,33 @@ def download_github_file(rr: RemoteResource, github_r: GitHubReference, output_p
 
     local_file_path = f"{output_path}/{github_r.author}/{github_r.project}/{rr.get_remote_abs_path_with_name()}"
 
-    logging.info(f"Downloading file '{repo_file_ref}' into '{local_file_path}'")
-
-    if os.path.exists(local_file_path):
-        logger.info(f"Skipping download of {rr.get_remote_abs_path_with_name()} since it already exists")
+    logging.info("Downloading file '%s' into '%s'", repo_file_ref, local_file_path)
 
-    repo: Repository = github_client.get_repo(f"{github_r.author}/{github_r.project}")
-    content_file: ContentFile = repo.get_contents(rr.get_remote_abs_path_with_name(), github_r.commit_hash)
+    path_with_name = rr.get_remote_abs_path_with_name()
+    blob_sha: Optional[str] = github_manager.get_blob_sha(path_with_name, github_r)
 
-    os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
+    if blob_sha and not blob_store.has_blob(blob_sha) and os.path.exists(local_file_path):
+        # files downloaded before the blob store existed are adopted when their content matches
+        blob_store.put_file(local_file_path, blob_sha)
 
-    open(local_file_path, 'wb').write(content_file.decoded_content)
+    if blob_sha and blob_store.has_blob(blob_sha):
+        logger.info("Skipping download of %s since blob %s already exists", path_with_name, blob_sha)
+        FILES_DOWNLOADED.inc(source="blob_store")
+    else:
+        content: bytes
+        with FETCH_SECONDS.time(mode=FETCH_MODE):
+            if FETCH_MODE == FETCH_MODE_ARCHIVE:
+                content = archive_manager.get_file_content(rr, github_r)
+            else:
+                repo: Repository = github_client.get_repo(f"{github_r.author}/{github_r.project}")
+                content_file: ContentFile = repo.get_contents(path_with_name, github_r.commit_hash)
+                content = content_file.decoded_content
+
+        FILES_DOWNLOADED.inc(source=FETCH_MODE)
+        BYTES_DOWNLOADED.inc(len(content))
+        blob_sha = blob_store.put_blob(content)
+
+    blob_store.materialise(blob_sha, local_file_path)
 
     return Resource(remote_resource=rr,
                     local_resource=LocalResource(full_path=local_file_path,
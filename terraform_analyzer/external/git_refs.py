@@ -0,0 +1,151 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional, NamedTuple
+
+from github import GithubException
+from github.GitObject import GitObject
+from github.Repository import Repository
+
+from terraform_analyzer.external import github_client, CACHE_FOLDER
+
+GIT_REF_CACHE_PATH = f"{CACHE_FOLDER}/git_refs.sqlite"
+# tags and commits are pinned, branches move
+GIT_REF_BRANCH_TTL = int(os.environ.get("GIT_REF_BRANCH_TTL", str(6 * 3600)))
+
+REF_KIND_TAG = "tag"
+REF_KIND_BRANCH = "branch"
+REF_KIND_COMMIT = "commit"
+
+GIT_OBJECT_TAG = "tag"
+ABBREVIATED_SHA_REGEX = re.compile('^[A-Fa-f0-9]{7,40}$')
+
+logger = logging.getLogger("git_refs")
+
+
+class ResolvedRef(NamedTuple):
+    commit_hash: str
+    kind: str
+
+
+def _peel(repo: Repository, git_object: GitObject) -> str:
+    # annotated tags point to a tag object, which points to the commit (or to yet another tag)
+    while git_object.type == GIT_OBJECT_TAG:
+        git_object = repo.get_git_tag(git_object.sha).object
+
+    return git_object.sha
+
+
+def fetch_ref(repo_id: str, ref: str) -> ResolvedRef:
+    repo: Repository = github_client.get_repo(repo_id, lazy=True)
+
+    # module refs are mostly tags, a single matching-refs call instead of paging through every tag
+    for git_ref in repo.get_git_matching_refs(f"tags/{ref}"):
+        if git_ref.ref == f"refs/tags/{ref}":
+            return ResolvedRef(_peel(repo, git_ref.object), REF_KIND_TAG)
+
+    # branches, full and abbreviated shas
+    try:
+        commit_hash = repo.get_commit(ref).sha
+    except GithubException as e:
+        raise RuntimeError(f"Failed to track tag or branch name '{ref}' in {repo_id}") from e
+
+    kind = REF_KIND_COMMIT if ABBREVIATED_SHA_REGEX.match(ref) and commit_hash.startswith(ref.lower()) \
+        else REF_KIND_BRANCH
+
+    return ResolvedRef(commit_hash, kind)
+
+
+class GitRefCache:
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS git_refs ("
+                                 "repo TEXT NOT NULL, "
+                                 "ref TEXT NOT NULL, "
+                                 "commit_hash TEXT NOT NULL, "
+                                 "kind TEXT NOT NULL, "
+                                 "resolved_at REAL NOT NULL, "
+                                 "PRIMARY KEY (repo, ref))")
+        self._connection.commit()
+
+    def get(self, repo_id: str, ref: str) -> Optional[ResolvedRef]:
+        with self._lock:
+            row = self._connection.execute("SELECT commit_hash, kind, resolved_at FROM git_refs "
+                                           "WHERE repo = ? AND ref = ?", (repo_id, ref)).fetchone()
+
+        if row is None:
+            return None
+
+        (commit_hash, kind, resolved_at) = row
+
+        if kind == REF_KIND_BRANCH and time.time() - resolved_at >= GIT_REF_BRANCH_TTL:
+            return None
+
+        return ResolvedRef(commit_hash, kind)
+
+    def put(self, repo_id: str, ref: str, resolved_ref: ResolvedRef):
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO git_refs VALUES (?, ?, ?, ?, ?)",
+                                     (repo_id, ref, resolved_ref.commit_hash, resolved_ref.kind, time.time()))
+            self._connection.commit()
+
+
+_CACHE: Optional[GitRefCache] = None
+_CACHE_LOCK = threading.Lock()
+# key -> (lock, threads holding or waiting on it), removed once the last of them is done
+_KEY_LOCKS: dict[tuple[str, str], tuple[threading.Lock, int]] = {}
+
+
+def get_cache() -> GitRefCache:
+    global _CACHE
+
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = GitRefCache(GIT_REF_CACHE_PATH)
+        return _CACHE
+
+
+def _acquire_key_lock(key: tuple[str, str]) -> threading.Lock:
+    with _CACHE_LOCK:
+        (key_lock, users) = _KEY_LOCKS.get(key, (threading.Lock(), 0))
+        _KEY_LOCKS[key] = (key_lock, users + 1)
+
+    key_lock.acquire()
+    return key_lock
+
+
+def _release_key_lock(key: tuple[str, str]):
+    with _CACHE_LOCK:
+        (key_lock, users) = _KEY_LOCKS[key]
+        if users > 1:
+            _KEY_LOCKS[key] = (key_lock, users - 1)
+        else:
+            del _KEY_LOCKS[key]
+
+    key_lock.release()
+
+
+def resolve_ref(repo_id: str, ref: str) -> ResolvedRef:
+    # github repo names are case insensitive
+    key = (repo_id.lower(), ref)
+    cache = get_cache()
+
+    _acquire_key_lock(key)
+    try:
+        resolved_ref = cache.get(*key)
+
+        if resolved_ref is None:
+            resolved_ref = fetch_ref(repo_id, ref)
+            cache.put(*key, resolved_ref)
+            logger.info(f"Resolved {repo_id}@{ref} ({resolved_ref.kind}) to {resolved_ref.commit_hash}")
+    finally:
+        _release_key_lock(key)
+
+    return resolved_ref
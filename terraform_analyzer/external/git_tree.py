@@ -0,0 +1,59 @@
+import posixpath
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel, PrivateAttr
+
+
+class GitTreeEntryType(str, Enum):
+    BLOB = 'blob'
+    TREE = 'tree'
+    COMMIT = 'commit'
+
+
+class GitTreeEntry(BaseModel):
+    type: GitTreeEntryType
+    sha: str
+
+
+def normalize_path(path: str) -> str:
+    normalized = posixpath.normpath(path).strip("/")
+    return "" if normalized == "." else normalized
+
+
+class RepoTreeIndex(BaseModel):
+    # normalized repo path -> entry, built from a single recursive tree listing or a repo archive
+    entries: dict[str, GitTreeEntry]
+    _children: dict[str, list[str]] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context):
+        self._children = {"": []}
+        for path, entry in self.entries.items():
+            parent, name = posixpath.split(path)
+            self._children.setdefault(parent, []).append(name)
+            if entry.type == GitTreeEntryType.TREE:
+                self._children.setdefault(path, [])
+
+    def get_entry(self, path: str) -> Optional[GitTreeEntry]:
+        path = normalize_path(path)
+        if not path:
+            return GitTreeEntry(type=GitTreeEntryType.TREE, sha="")
+        return self.entries.get(path)
+
+    def is_directory(self, path: str) -> bool:
+        entry = self.get_entry(path)
+        if entry is None:
+            raise RuntimeError(f"'{path}' does not exist")
+        return entry.type == GitTreeEntryType.TREE
+
+    def list_folder(self, path: str) -> dict[str, bool]:
+        # mimics the contents API: a folder lists its children, a file lists itself
+        path = normalize_path(path)
+
+        if path in self._children:
+            return {name: self.entries[posixpath.join(path, name)].type == GitTreeEntryType.TREE
+                    for name in self._children[path]}
+        elif path in self.entries:
+            return {posixpath.basename(path): False}
+
+        raise RuntimeError(f"'{path}' does not exist")
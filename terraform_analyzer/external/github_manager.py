@@ -1,16 +1,26 @@
+import json
 import logging
+import os
 import re
+import threading
+from collections import OrderedDict
 from enum import Enum
 from typing import List, Optional, Union
 
 from github import Repository, Branch
 from github.ContentFile import ContentFile
+from github.GitTree import GitTree
 from pydantic import BaseModel
 
 from terraform_analyzer.core import RemoteResource, GitHubReference, utils
-from terraform_analyzer.external import github_client
+from terraform_analyzer.external import github_client, CACHE_FOLDER, git_refs, archive_manager, FETCH_MODE, \
+    FETCH_MODE_ARCHIVE
+from terraform_analyzer.external.git_tree import GitTreeEntryType, GitTreeEntry, RepoTreeIndex
 
 DOT_COM_REGEX = r".*?\.com\/"
+TREE_INDEX_FOLDER = f"{CACHE_FOLDER}/trees"
+# a recursive tree can hold tens of thousands of entries, only the recent ones stay in memory
+MAX_CACHED_TREE_INDEXES = 32
 
 logger = logging.getLogger("github_manager")
 
@@ -36,6 +46,92 @@ class GithubResourceResponse(BaseModel):
     type: GithubFileType
 
 
+_TREE_INDEXES: OrderedDict[tuple[str, str, str], Optional[RepoTreeIndex]] = OrderedDict()
+_TREE_INDEX_LOCKS: dict[tuple[str, str, str], threading.Lock] = {}
+_TREE_LOCK = threading.Lock()
+
+
+def fetch_tree_entries(repo_id: str, tree_ish: str) -> Optional[dict[str, GitTreeEntry]]:
+    repo: Repository = github_client.get_repo(repo_id, lazy=True)
+    git_tree: GitTree = repo.get_git_tree(tree_ish, recursive=True)
+
+    if git_tree.raw_data.get("truncated"):
+        logger.warning(f"Recursive tree listing of {repo_id}@{tree_ish} is truncated")
+        return None
+
+    return {element.path: GitTreeEntry(type=element.type, sha=element.sha) for element in git_tree.tree}
+
+
+def _load_tree_index(ghr: GitHubReference) -> Optional[RepoTreeIndex]:
+    tree_index_path = f"{TREE_INDEX_FOLDER}/{ghr.author}/{ghr.project}/{ghr.commit_hash}.json"
+    # marks a commit whose listing is truncated, those repos always go through the contents API
+    truncated_path = f"{TREE_INDEX_FOLDER}/{ghr.author}/{ghr.project}/{ghr.commit_hash}.truncated"
+
+    if os.path.exists(tree_index_path):
+        with open(tree_index_path, 'r') as file:
+            return RepoTreeIndex(entries=json.load(file))
+    elif os.path.exists(truncated_path):
+        return None
+
+    logger.info(f"Fetching recursive tree of {ghr.author}/{ghr.project}@{ghr.commit_hash}")
+    entries = fetch_tree_entries(f"{ghr.author}/{ghr.project}", ghr.commit_hash)
+
+    # a commit tree never changes, so it is safe to keep it (or its truncation) forever
+    os.makedirs(os.path.dirname(tree_index_path), exist_ok=True)
+
+    if entries is None:
+        open(truncated_path, 'w').close()
+        return None
+
+    tmp_path = f"{tree_index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump({path: entry.model_dump(mode="json") for path, entry in entries.items()}, file)
+    os.replace(tmp_path, tree_index_path)
+
+    return RepoTreeIndex(entries=entries)
+
+
+def get_tree_index(ghr: GitHubReference) -> Optional[RepoTreeIndex]:
+    if FETCH_MODE == FETCH_MODE_ARCHIVE:
+        # the archive is downloaded anyway, its listing answers every tree question without api calls
+        return archive_manager.get_archive(ghr).tree_index
+
+    key = (ghr.author, ghr.project, ghr.commit_hash)
+
+    with _TREE_LOCK:
+        if key in _TREE_INDEXES:
+            _TREE_INDEXES.move_to_end(key)
+            return _TREE_INDEXES[key]
+        key_lock = _TREE_INDEX_LOCKS.setdefault(key, threading.Lock())
+
+    with key_lock:
+        with _TREE_LOCK:
+            if key in _TREE_INDEXES:
+                return _TREE_INDEXES[key]
+
+        try:
+            tree_index = _load_tree_index(ghr)
+        except Exception:
+            with _TREE_LOCK:
+                _TREE_INDEX_LOCKS.pop(key, None)
+            raise
+
+        with _TREE_LOCK:
+            _TREE_INDEXES[key] = tree_index
+            while len(_TREE_INDEXES) > MAX_CACHED_TREE_INDEXES:
+                _TREE_INDEXES.popitem(last=False)
+            _TREE_INDEX_LOCKS.pop(key, None)
+
+    return tree_index
+
+
+def get_blob_sha(resource_path: str, ghr: GitHubReference) -> Optional[str]:
+    tree_index: Optional[RepoTreeIndex] = get_tree_index(ghr)
+    entry: Optional[GitTreeEntry] = tree_index.get_entry(resource_path) if tree_index is not None else None
+
+    return entry.sha if entry is not None and entry.type == GitTreeEntryType.BLOB else None
+
+
 def _map_github_folder_response_to_remote_resource(github_folder_response: GithubResourceResponse,
                                                    parent_resource: RemoteResource) -> RemoteResource:
     relative_path: tuple[str, ...] = parent_resource.relative_path + (parent_resource.name,)
@@ -57,19 +153,7 @@ def _map_github_content_file_to_remote_resource(github_content: ContentFile,
 
 
 def get_branch_or_tag_commit_hash(repo_id: str, branch_or_tag_name: str) -> Optional[str]:
-    repo: Repository = github_client.get_repo(repo_id)
-
-    try:
-        branch: Branch = repo.get_branch(branch_or_tag_name)
-        return branch.commit.sha
-    except:
-        pass
-
-    for tag in repo.get_tags():
-        if tag.name == branch_or_tag_name:
-            return tag.commit.sha
-
-    raise RuntimeError(f"Failed to track tag or branch name '{branch_or_tag_name}' in {repo_id}")
+    return git_refs.resolve_ref(repo_id, branch_or_tag_name).commit_hash
 
 
 def repo_project_extract(github_project_url: str) -> GitHubReference:
@@ -105,6 +189,18 @@ def _repo_extract(resource_full_url_path: str) -> GithubContextResource:
 
 def list_files_in_remote_folder(remote_resource: RemoteResource, git_proj: GitHubReference) -> List[RemoteResource]:
     path_with_name: str = remote_resource.get_remote_abs_path_with_name()
+
+    tree_index: Optional[RepoTreeIndex] = get_tree_index(git_proj)
+
+    if tree_index is not None:
+        relative_path: tuple[str, ...] = remote_resource.relative_path + (remote_resource.name,)
+
+        return [RemoteResource(remote_reference=remote_resource.remote_reference,
+                               is_directory=is_directory,
+                               relative_path=relative_path,
+                               name=name)
+                for name, is_directory in tree_index.list_folder(path_with_name).items()]
+
     logger.info(f"Fetching '{remote_resource}'")
 
     repo: Repository = github_client.get_repo(f"{git_proj.author}/{git_proj.project}")
@@ -120,6 +216,11 @@ def list_files_in_remote_folder(remote_resource: RemoteResource, git_proj: GitHu
 
 
 def is_resource_link_type_a_dir(resource_path: str, ghr: GitHubReference) -> bool:
+    tree_index: Optional[RepoTreeIndex] = get_tree_index(ghr)
+
+    if tree_index is not None:
+        return tree_index.is_directory(resource_path)
+
     repo: Repository = github_client.get_repo(f"{ghr.author}/{ghr.project}")
     contents: Union[list[ContentFile], ContentFile] = repo.get_contents(resource_path, ghr.commit_hash)
 
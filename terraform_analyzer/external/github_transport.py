@@ -0,0 +1,88 @@
+# kept free of terraform_analyzer.external imports, the package __init__ wires the clients with it
+import threading
+from typing import Optional, Callable
+
+import requests
+from github.Requester import HTTPSRequestsConnectionClass, HTTPRequestsConnectionClass, Requester
+from requests.adapters import HTTPAdapter
+from urllib3 import Retry
+
+from terraform_analyzer.external.http_cache import HttpCache, CachingHTTPAdapter
+from terraform_analyzer.external.rate_limiter import RateLimitScheduler, RateLimitedHTTPAdapter
+
+
+class CachingRateLimitedHTTPAdapter(CachingHTTPAdapter, RateLimitedHTTPAdapter):
+    # cache hits and streamed requests are decided first, only real requests go through the scheduler
+    pass
+
+
+def build_adapter(cache: Optional[HttpCache], scheduler: Optional[RateLimitScheduler], **kwargs) -> HTTPAdapter:
+    if cache and scheduler:
+        return CachingRateLimitedHTTPAdapter(cache, scheduler=scheduler, **kwargs)
+    elif cache:
+        return CachingHTTPAdapter(cache, **kwargs)
+    elif scheduler:
+        return RateLimitedHTTPAdapter(scheduler, **kwargs)
+
+    return HTTPAdapter(**kwargs)
+
+
+# answered by the scheduler (token rotation / waiting for the reset), never by a urllib3 retry
+RATE_LIMIT_STATUSES = frozenset({403, 429})
+
+
+def without_rate_limit_retries(retry):
+    # PyGithub's GithubRetry retries 403, that would sleep inside urllib3 before the scheduler sees the response.
+    # A plain Retry is rebuilt since GithubRetry always adds 403 back to its status list.
+    if isinstance(retry, Retry) and retry.status_forcelist and RATE_LIMIT_STATUSES & set(retry.status_forcelist):
+        return Retry(total=retry.total, connect=retry.connect, read=retry.read, redirect=retry.redirect,
+                     status=retry.status, other=retry.other, allowed_methods=retry.allowed_methods,
+                     status_forcelist=frozenset(retry.status_forcelist) - RATE_LIMIT_STATUSES,
+                     backoff_factor=retry.backoff_factor, backoff_max=retry.backoff_max,
+                     raise_on_redirect=retry.raise_on_redirect, raise_on_status=retry.raise_on_status,
+                     respect_retry_after_header=retry.respect_retry_after_header)
+    return retry
+
+
+def mount_adapter(session: requests.Session, adapter: HTTPAdapter):
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def install_github_adapter(adapter_builder: Callable[..., HTTPAdapter]):
+    # PyGithub opens its own requests sessions, these connection classes mount our adapter on them.
+    # One adapter is shared by every connection so the urllib3 pools survive the per request connections.
+    # Has to run before the Github client creates its requester.
+    adapters: dict[tuple, HTTPAdapter] = {}
+    lock = threading.Lock()
+
+    def get_adapter(retry, pool_size) -> HTTPAdapter:
+        retry = without_rate_limit_retries(retry)
+        key = (repr(retry), pool_size)
+        with lock:
+            if key not in adapters:
+                adapters[key] = adapter_builder(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+            return adapters[key]
+
+    class SharedAdapterHTTPSConnection(HTTPSRequestsConnectionClass):
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.adapter = get_adapter(self.retry, self.pool_size)
+            self.session.mount("https://", self.adapter)
+
+        def close(self):
+            # closing the session would close the shared adapter pools
+            pass
+
+    class SharedAdapterHTTPConnection(HTTPRequestsConnectionClass):
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.adapter = get_adapter(self.retry, self.pool_size)
+            self.session.mount("http://", self.adapter)
+
+        def close(self):
+            pass
+
+    Requester.injectConnectionClasses(SharedAdapterHTTPConnection, SharedAdapterHTTPSConnection)
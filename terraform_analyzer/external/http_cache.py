@@ -0,0 +1,263 @@
+# kept free of terraform_analyzer.external imports, the package __init__ mounts it through github_transport
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from typing import Optional, Any
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+# a full commit sha in the path (git trees/blobs, codeload, registry redirects) or as the ref of a contents call
+IMMUTABLE_URL_PATTERN = re.compile(r"(?:/|[?&]ref=)[0-9a-f]{40}(?:[/?&#]|$)")
+
+# request headers the response depends on, everything else (eg: Authorization) is left out of the key
+VARY_HEADERS = ("Accept",)
+
+logger = logging.getLogger("http_cache")
+
+
+class HttpCacheEntry:
+
+    def __init__(self, url: str, status_code: int, reason: str, headers: dict[str, str], immutable: bool):
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.immutable = immutable
+
+    def get_validators(self) -> dict[str, str]:
+        headers = CaseInsensitiveDict(self.headers)
+        validators: dict[str, str] = {}
+
+        if "ETag" in headers:
+            validators["If-None-Match"] = headers["ETag"]
+        if "Last-Modified" in headers:
+            validators["If-Modified-Since"] = headers["Last-Modified"]
+
+        return validators
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "url": self.url,
+            "status_code": self.status_code,
+            "reason": self.reason,
+            "headers": self.headers,
+            "immutable": self.immutable
+        }
+
+    @staticmethod
+    def from_dict(value: dict[str, Any]) -> 'HttpCacheEntry':
+        return HttpCacheEntry(value["url"], value["status_code"], value["reason"], value["headers"], value["immutable"])
+
+
+class HttpCacheStats:
+
+    def __init__(self):
+        # hits -> served without a request, revalidations -> served after a 304
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def get_hit_rate(self) -> float:
+        total = self.hits + self.revalidations + self.misses
+        return (self.hits + self.revalidations) / total if total else 0.0
+
+    def __str__(self) -> str:
+        return f"hits={self.hits} revalidations={self.revalidations} misses={self.misses} " \
+               f"stores={self.stores} evictions={self.evictions} hit_rate={self.get_hit_rate():.2%}"
+
+
+class HttpCache:
+
+    def __init__(self, folder: str, max_size: int = DEFAULT_MAX_SIZE):
+        self.folder = folder
+        self.max_size = max_size
+        self.stats = HttpCacheStats()
+
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    @staticmethod
+    def get_key(request: requests.PreparedRequest) -> str:
+        vary = "\n".join(f"{x}:{request.headers.get(x, '')}" for x in VARY_HEADERS)
+        return hashlib.sha256(f"{request.method} {request.url}\n{vary}".encode()).hexdigest()
+
+    @staticmethod
+    def is_immutable(url: str) -> bool:
+        return IMMUTABLE_URL_PATTERN.search(url) is not None
+
+    def _get_paths(self, key: str) -> tuple[str, str]:
+        base = f"{self.folder}/{key[:2]}/{key[2:]}"
+        return f"{base}.json", f"{base}.body"
+
+    @staticmethod
+    def _tmp_path(path: str) -> str:
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def _write(self, path: str, content: bytes):
+        tmp_path = self._tmp_path(path)
+        with open(tmp_path, 'wb') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+
+    def _iter_bodies(self):
+        if not os.path.isdir(self.folder):
+            return
+
+        for prefix in os.scandir(self.folder):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if entry.name.endswith(".body"):
+                    yield entry
+
+    def get_size(self) -> int:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(x.stat().st_size for x in self._iter_bodies())
+            return self._size
+
+    def count(self, stat: str):
+        with self._lock:
+            setattr(self.stats, stat, getattr(self.stats, stat) + 1)
+
+    def get(self, key: str) -> Optional[tuple[HttpCacheEntry, bytes]]:
+        meta_path, body_path = self._get_paths(key)
+
+        try:
+            with open(meta_path, 'r') as file:
+                entry = HttpCacheEntry.from_dict(json.load(file))
+            with open(body_path, 'rb') as file:
+                content = file.read()
+            # the body access time drives the eviction order
+            os.utime(body_path)
+        except (OSError, ValueError, KeyError):
+            return None
+
+        return entry, content
+
+    def put(self, key: str, entry: HttpCacheEntry, content: Optional[bytes] = None):
+        meta_path, body_path = self._get_paths(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+
+        # the body is written first, a meta file is never left pointing to a missing body
+        if content is not None:
+            previous_size = os.path.getsize(body_path) if os.path.exists(body_path) else 0
+            self._write(body_path, content)
+            self.count("stores")
+            with self._lock:
+                if self._size is not None:
+                    self._size += len(content) - previous_size
+
+        self._write(meta_path, json.dumps(entry.to_dict()).encode())
+
+        if content is not None and self.get_size() > self.max_size:
+            self.evict()
+
+    def evict(self):
+        # least recently used first, down to 90% of max_size to avoid evicting on every store
+        bodies = sorted(self._iter_bodies(), key=lambda x: x.stat().st_mtime)
+        size = self.get_size()
+        target = self.max_size * 0.9
+
+        for body in bodies:
+            if size <= target:
+                break
+
+            body_size = body.stat().st_size
+            try:
+                os.remove(body.path[:-len(".body")] + ".json")
+                os.remove(body.path)
+            except OSError:
+                continue
+
+            size -= body_size
+            self.count("evictions")
+
+        with self._lock:
+            self._size = size
+
+        logger.info(f"Evicted http cache down to {size} bytes")
+
+    def clear(self):
+        for body in list(self._iter_bodies()):
+            for path in (body.path, body.path[:-len(".body")] + ".json"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        with self._lock:
+            self._size = 0
+
+
+class CachingHTTPAdapter(HTTPAdapter):
+
+    def __init__(self, cache: HttpCache, *args, **kwargs):
+        self.cache = cache
+        super().__init__(*args, **kwargs)
+
+    def _build_cached_response(self,
+                               request: requests.PreparedRequest,
+                               entry: HttpCacheEntry,
+                               content: bytes) -> requests.Response:
+        response = requests.Response()
+        response.status_code = entry.status_code
+        response.reason = entry.reason
+        response.headers = CaseInsensitiveDict(entry.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response._content = content
+        response.from_cache = True
+        return response
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, *args, **kwargs) -> requests.Response:
+        # streamed bodies (eg: archives) are not buffered in memory, they are never cached
+        if request.method != "GET" or stream:
+            return super().send(request, stream, *args, **kwargs)
+
+        key = self.cache.get_key(request)
+        cached = self.cache.get(key)
+
+        if cached is not None:
+            entry, content = cached
+
+            if entry.immutable:
+                self.cache.count("hits")
+                return self._build_cached_response(request, entry, content)
+
+            request.headers.update(entry.get_validators())
+
+        response = super().send(request, stream, *args, **kwargs)
+
+        if cached is not None and response.status_code == 304:
+            self.cache.count("revalidations")
+            # 304s carry fresh rate limit and validator headers
+            entry.headers.update({k: v for k, v in response.headers.items() if k.lower() != "content-length"})
+            self.cache.put(key, entry)
+            response.close()
+            return self._build_cached_response(request, entry, content)
+
+        self.cache.count("misses")
+
+        if response.status_code == 200:
+            immutable = self.cache.is_immutable(request.url)
+            entry = HttpCacheEntry(request.url, response.status_code, response.reason,
+                                   dict(response.headers), immutable)
+
+            if immutable or entry.get_validators():
+                # content-encoding is already undone by urllib3, the stored body is the decoded one
+                entry.headers.pop("Content-Encoding", None)
+                entry.headers.pop("Content-Length", None)
+                self.cache.put(key, entry, response.content)
+
+        return response
@@ -0,0 +1,213 @@
+import logging
+import threading
+import time
+from typing import Optional, NamedTuple, Mapping
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from terraform_analyzer.core import metrics
+
+GITHUB_API_HOSTS = {"api.github.com"}
+
+CATEGORY_CORE = "core"
+CATEGORY_SEARCH = "search"
+CATEGORY_CODE_SEARCH = "code_search"
+CATEGORY_GRAPHQL = "graphql"
+
+# (limit, window in seconds) until the first response tells the real values
+DEFAULT_LIMITS: dict[str, tuple[int, int]] = {
+    CATEGORY_CORE: (5000, 3600),
+    CATEGORY_SEARCH: (30, 60),
+    CATEGORY_CODE_SEARCH: (10, 60),
+    CATEGORY_GRAPHQL: (5000, 3600),
+}
+ANONYMOUS_LIMITS: dict[str, tuple[int, int]] = {
+    CATEGORY_CORE: (60, 3600),
+    CATEGORY_SEARCH: (10, 60),
+    CATEGORY_CODE_SEARCH: (10, 60),
+    CATEGORY_GRAPHQL: (0, 3600),
+}
+
+# github clocks and ours are not perfectly in sync
+RESET_MARGIN = 1.0
+MAX_RATE_LIMITED_RETRIES = 3
+
+logger = logging.getLogger("rate_limiter")
+
+API_REQUESTS = metrics.counter("github_requests_total", "Requests sent to the github api, by category and status code")
+API_SECONDS = metrics.histogram("github_request_seconds", "Github api response time, rate limit waits excluded")
+
+
+def get_category(url: str) -> str:
+    path = urlparse(url).path
+
+    if path.startswith("/search/code"):
+        return CATEGORY_CODE_SEARCH
+    elif path.startswith("/search/"):
+        return CATEGORY_SEARCH
+    elif path.startswith("/graphql"):
+        return CATEGORY_GRAPHQL
+
+    return CATEGORY_CORE
+
+
+class RateLimitBucket:
+
+    def __init__(self, limit: int, window: int):
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset = time.time() + window
+        self.in_flight = 0
+
+    def refresh(self, now: float):
+        if now >= self.reset + RESET_MARGIN:
+            self.remaining = self.limit
+            self.reset = now + self.window
+
+
+class RateLimitLease(NamedTuple):
+    token: Optional[str]
+    category: str
+
+
+class RateLimitStats:
+
+    def __init__(self):
+        self.requests: dict[str, int] = {}
+        self.rate_limited: dict[str, int] = {}
+        self.waits: dict[str, int] = {}
+        self.wait_seconds: dict[str, float] = {}
+
+    def get_total_wait_seconds(self) -> float:
+        return sum(self.wait_seconds.values())
+
+    def __str__(self) -> str:
+        wait_seconds = {k: round(v, 2) for k, v in self.wait_seconds.items()}
+
+        return f"requests={self.requests} rate_limited={self.rate_limited} " \
+               f"waits={self.waits} wait_seconds={wait_seconds}"
+
+
+class RateLimitScheduler:
+
+    def __init__(self, tokens: list[Optional[str]]):
+        # None stands for anonymous requests
+        self.tokens: list[Optional[str]] = tokens if tokens else [None]
+        self.stats = RateLimitStats()
+
+        self._condition = threading.Condition()
+        self._buckets: dict[tuple[Optional[str], str], RateLimitBucket] = {}
+
+    def _get_bucket(self, token: Optional[str], category: str) -> RateLimitBucket:
+        key = (token, category)
+
+        if key not in self._buckets:
+            limits = DEFAULT_LIMITS if token else ANONYMOUS_LIMITS
+            self._buckets[key] = RateLimitBucket(*limits.get(category, limits[CATEGORY_CORE]))
+
+        return self._buckets[key]
+
+    def acquire(self, category: str) -> RateLimitLease:
+        with self._condition:
+            while True:
+                now = time.time()
+                buckets = [(token, self._get_bucket(token, category)) for token in self.tokens]
+
+                for _, bucket in buckets:
+                    bucket.refresh(now)
+
+                available = [x for x in buckets if x[1].remaining > 0]
+
+                if available:
+                    # the token with the most budget left, so the load spreads across the pool
+                    token, bucket = max(available, key=lambda x: x[1].remaining)
+                    bucket.remaining -= 1
+                    bucket.in_flight += 1
+                    self.stats.requests[category] = self.stats.requests.get(category, 0) + 1
+                    return RateLimitLease(token, category)
+
+                wait_until = min(x[1].reset for x in buckets) + RESET_MARGIN
+                logger.info(f"Every token is out of '{category}' budget, waiting {wait_until - now:.1f}s")
+
+                self._condition.wait(timeout=max(wait_until - now, 0))
+
+                waited = time.time() - now
+                self.stats.waits[category] = self.stats.waits.get(category, 0) + 1
+                self.stats.wait_seconds[category] = self.stats.wait_seconds.get(category, 0.0) + waited
+
+    def release(self, lease: RateLimitLease, status_code: Optional[int], headers: Mapping[str, str]) -> bool:
+        # syncs the bucket with the response, True when the request was rejected by the rate limit
+        with self._condition:
+            bucket = self._get_bucket(lease.token, lease.category)
+            bucket.in_flight -= 1
+
+            # github names the bucket that was charged, it wins over the url based guess
+            resource = headers.get("X-RateLimit-Resource")
+            if resource and resource != lease.category:
+                bucket = self._get_bucket(lease.token, resource)
+
+            now = time.time()
+
+            if "X-RateLimit-Limit" in headers:
+                bucket.limit = int(headers["X-RateLimit-Limit"])
+            if "X-RateLimit-Reset" in headers:
+                bucket.reset = float(headers["X-RateLimit-Reset"])
+            if "X-RateLimit-Remaining" in headers:
+                # requests still in flight are not counted by github yet
+                bucket.remaining = max(int(headers["X-RateLimit-Remaining"]) - bucket.in_flight, 0)
+
+            rate_limited = status_code == 429 or (status_code == 403 and (
+                    headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in headers))
+
+            if rate_limited:
+                bucket.remaining = 0
+                if "Retry-After" in headers:
+                    bucket.reset = max(bucket.reset, now + float(headers["Retry-After"]))
+                self.stats.rate_limited[lease.category] = self.stats.rate_limited.get(lease.category, 0) + 1
+
+            self._condition.notify_all()
+
+        return rate_limited
+
+    def get_remaining(self) -> dict[tuple[Optional[str], str], int]:
+        with self._condition:
+            return {k: v.remaining for k, v in self._buckets.items()}
+
+
+class RateLimitedHTTPAdapter(HTTPAdapter):
+
+    def __init__(self, scheduler: RateLimitScheduler, *args, **kwargs):
+        self.scheduler = scheduler
+        super().__init__(*args, **kwargs)
+
+    def send(self, request: requests.PreparedRequest, *args, **kwargs) -> requests.Response:
+        if urlparse(request.url).hostname not in GITHUB_API_HOSTS:
+            return super().send(request, *args, **kwargs)
+
+        category = get_category(request.url)
+
+        for attempt in range(MAX_RATE_LIMITED_RETRIES + 1):
+            lease = self.scheduler.acquire(category)
+
+            if lease.token:
+                request.headers["Authorization"] = f"token {lease.token}"
+
+            try:
+                with API_SECONDS.time(category=category):
+                    response = super().send(request, *args, **kwargs)
+            except Exception:
+                API_REQUESTS.inc(category=category, status="error")
+                self.scheduler.release(lease, None, {})
+                raise
+
+            API_REQUESTS.inc(category=category, status=str(response.status_code))
+
+            if not self.scheduler.release(lease, response.status_code, response.headers) \
+                    or attempt == MAX_RATE_LIMITED_RETRIES:
+                return response
+
+            logger.warning(f"Rate limited on '{category}' ({response.status_code}), rescheduling {request.url}")
+            response.close()
@@ -1,11 +1,31 @@
 import logging
-from typing import List
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, NamedTuple, Iterable
 
+import requests
 from pydantic import BaseModel, TypeAdapter
 
-from terraform_analyzer.external import request_session
+from terraform_analyzer.external import request_session, CACHE_FOLDER
 
-TERRAFORM_REGISTRY_MODULES_URL = "https://registry.terraform.io/v1/modules"
+TERRAFORM_REGISTRY_HOST = "registry.terraform.io"
+TERRAFORM_REGISTRY_MODULES_URL = f"https://{TERRAFORM_REGISTRY_HOST}/v1/modules"
+REGISTRY_CACHE_PATH = f"{CACHE_FOLDER}/registry.sqlite"
+# constraints may match newer versions over time, exact versions never change
+REGISTRY_CACHE_TTL = int(os.environ.get("REGISTRY_CACHE_TTL", str(7 * 24 * 3600)))
+REGISTRY_NEGATIVE_TTL = int(os.environ.get("REGISTRY_NEGATIVE_TTL", str(24 * 3600)))
+REGISTRY_MAX_WORKERS = int(os.environ.get("REGISTRY_MAX_WORKERS", "8"))
+
+GITHUB_SOURCE_REGEX = re.compile(r'^(?:https?://)?github\.com/([^/]*)/([^/?#]*?)(?:\.git)?/?$')
+VERSION_REGEX = re.compile(r'^v?(\d+)(?:\.(\d+))?(?:\.(\d+))?(?:-([0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?$')
+CONSTRAINT_REGEX = re.compile(r'^(=|!=|>=|<=|>|<|~>)?\s*(\S+)$')
+
+# (module address, version constraint)
+RegistryDependency = tuple[str, Optional[str]]
 
 logger = logging.getLogger("terraform_registry")
 
@@ -25,20 +45,333 @@ class TerraformModuleInfo(BaseModel):
     id: str
     source: str
     root: TerraformModuleRoot
+    version: Optional[str] = None
+    tag: Optional[str] = None
 
 
-def get_source_code(dependency: str) -> str:
-    module_url = f"{TERRAFORM_REGISTRY_MODULES_URL}/{dependency}"
-    try:
-        response = request_session.get(module_url)
-        response_json = response.json()
+class TerraformModuleVersion(BaseModel):
+    version: str
+
+
+class TerraformModuleVersions(BaseModel):
+    versions: List[TerraformModuleVersion]
+
+
+class TerraformModuleVersionsResponse(BaseModel):
+    modules: List[TerraformModuleVersions]
+
+
+MODULE_INFO_ADAPTER = TypeAdapter(TerraformModuleInfo)
+MODULE_VERSIONS_ADAPTER = TypeAdapter(TerraformModuleVersionsResponse)
+
+
+class Version(NamedTuple):
+    major: int
+    minor: int
+    patch: int
+    prerelease: str
+    # number of numeric segments written, "~>" depends on it
+    segments: int
+
+    def key(self) -> tuple:
+        # prereleases sort before their release
+        return self.major, self.minor, self.patch, not self.prerelease, self.prerelease
+
+
+class RegistrySource(NamedTuple):
+    source: str
+    version: Optional[str]
+
+
+def parse_version(version: str) -> Optional[Version]:
+    match = VERSION_REGEX.match(version.strip())
+
+    if not match:
+        return None
+
+    (major, minor, patch, prerelease) = match.groups()
+    segments = 1 + (minor is not None) + (patch is not None)
+
+    return Version(int(major), int(minor or 0), int(patch or 0), prerelease or "", segments)
+
+
+def _matches(version: Version, operator: str, operand: Version) -> bool:
+    if operator == "=":
+        return version.key() == operand.key()
+    elif operator == "!=":
+        return version.key() != operand.key()
+    elif operator == ">":
+        return version.key() > operand.key()
+    elif operator == ">=":
+        return version.key() >= operand.key()
+    elif operator == "<":
+        return version.key() < operand.key()
+    elif operator == "<=":
+        return version.key() <= operand.key()
+    elif operator == "~>":
+        # only the rightmost written segment may grow: ~> 1.2 -> [1.2, 2.0), ~> 1.2.3 -> [1.2.3, 1.3.0)
+        if version.key() < operand.key():
+            return False
+        if operand.segments <= 2:
+            return version.major == operand.major
+        return (version.major, version.minor) == (operand.major, operand.minor)
+
+    raise RuntimeError(f"Unsupported version constraint operator '{operator}'")
+
+
+def matches_constraint(version: str, constraint: Optional[str]) -> bool:
+    parsed_version = parse_version(version)
+
+    if parsed_version is None:
+        return False
+
+    if not constraint:
+        return not parsed_version.prerelease
+
+    exact_match = False
+
+    for part in constraint.split(","):
+        match = CONSTRAINT_REGEX.match(part.strip())
+        operand = parse_version(match.group(2)) if match else None
+
+        if operand is None:
+            raise RuntimeError(f"Unable to parse version constraint '{constraint}'")
+
+        operator = match.group(1) or "="
+
+        if not _matches(parsed_version, operator, operand):
+            return False
+
+        exact_match |= operator == "=" and operand.prerelease != ""
+
+    # like terraform, prereleases are only selected when explicitly asked for
+    return not parsed_version.prerelease or exact_match
+
+
+def is_exact_constraint(constraint: Optional[str]) -> bool:
+    match = CONSTRAINT_REGEX.match(constraint.strip()) if constraint and "," not in constraint else None
+
+    return match is not None and (match.group(1) or "=") == "=" and parse_version(match.group(2)) is not None
+
+
+def select_version(versions: Iterable[str], constraint: Optional[str]) -> Optional[str]:
+    candidates = [x for x in versions if matches_constraint(x, constraint)]
+
+    if not candidates:
+        return None
+
+    return max(candidates, key=lambda x: parse_version(x).key())
+
+
+def split_module_address(dependency: str) -> tuple[str, str]:
+    # eg: registry.terraform.io/terraform-aws-modules/iam/aws//modules/iam-role
+    #  -> (terraform-aws-modules/iam/aws, modules/iam-role)
+    (module, _, subpath) = dependency.partition("//")
+    parts = module.strip("/").split("/")
+
+    if len(parts) == 4:
+        if parts[0] != TERRAFORM_REGISTRY_HOST:
+            raise RuntimeError(f"Unsupported private registry module '{dependency}'")
+        parts = parts[1:]
+
+    if len(parts) != 3:
+        raise RuntimeError(f"Invalid registry module address '{dependency}'")
+
+    return "/".join(parts), subpath.strip("/")
+
+
+def _to_source(module_info: TerraformModuleInfo, subpath: str) -> str:
+    match = GITHUB_SOURCE_REGEX.match(module_info.source)
+
+    # pinning the tag keeps the crawl on the resolved version instead of the default branch
+    if match and module_info.tag:
+        (author, project) = match.groups()
+        path = f"//{subpath}" if subpath else ""
+        return f"git::https://github.com/{author}/{project}.git{path}?ref={module_info.tag}"
+
+    return module_info.source
+
 
-        ta = TypeAdapter(TerraformModuleInfo)
-        terraform_module_info = ta.validate_python(response_json)
+def _get_json(url: str) -> dict:
+    response = request_session.get(url)
+    response.raise_for_status()
+    return response.json()
 
-        return terraform_module_info.source
+
+def fetch_versions(module: str) -> list[str]:
+    versions_json = _get_json(f"{TERRAFORM_REGISTRY_MODULES_URL}/{module}/versions")
+    versions_response = MODULE_VERSIONS_ADAPTER.validate_python(versions_json)
+
+    return [v.version for m in versions_response.modules for v in m.versions]
+
+
+def fetch_source(dependency: str, constraint: Optional[str] = None) -> RegistrySource:
+    module, subpath = split_module_address(dependency)
+
+    if constraint:
+        version = select_version(fetch_versions(module), constraint)
+
+        if version is None:
+            raise RuntimeError(f"No version of '{module}' matches '{constraint}'")
+
+        module_url = f"{TERRAFORM_REGISTRY_MODULES_URL}/{module}/{version}"
+    else:
+        module_url = f"{TERRAFORM_REGISTRY_MODULES_URL}/{module}"
+
+    module_info = MODULE_INFO_ADAPTER.validate_python(_get_json(module_url))
+
+    return RegistrySource(_to_source(module_info, subpath), module_info.version)
+
+
+class RegistryCache:
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS registry_sources ("
+                                 "module TEXT NOT NULL, "
+                                 "constraint_ TEXT NOT NULL, "
+                                 "source TEXT, "
+                                 "version TEXT, "
+                                 "error TEXT, "
+                                 "resolved_at REAL NOT NULL, "
+                                 "PRIMARY KEY (module, constraint_))")
+        self._connection.commit()
+
+    def get(self, module: str, constraint: Optional[str]) -> Optional[tuple[Optional[RegistrySource], Optional[str]]]:
+        # (source, None) for a positive entry, (None, error) for a negative one, None when missing or expired
+        with self._lock:
+            row = self._connection.execute("SELECT source, version, error, resolved_at FROM registry_sources "
+                                           "WHERE module = ? AND constraint_ = ?",
+                                           (module, constraint or "")).fetchone()
+
+        if row is None:
+            return None
+
+        (source, version, error, resolved_at) = row
+        age = time.time() - resolved_at
+
+        if error is not None:
+            return (None, error) if age < REGISTRY_NEGATIVE_TTL else None
+
+        if is_exact_constraint(constraint) or age < REGISTRY_CACHE_TTL:
+            return RegistrySource(source, version), None
+
+        return None
+
+    def put(self, module: str, constraint: Optional[str], source: Optional[RegistrySource],
+            error: Optional[str] = None):
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO registry_sources VALUES (?, ?, ?, ?, ?, ?)",
+                                     (module,
+                                      constraint or "",
+                                      source.source if source else None,
+                                      source.version if source else None,
+                                      error,
+                                      time.time()))
+            self._connection.commit()
+
+
+_CACHE: Optional[RegistryCache] = None
+_CACHE_LOCK = threading.Lock()
+# key -> (lock, threads holding or waiting on it), removed once the last of them is done
+_KEY_LOCKS: dict[tuple[str, str], tuple[threading.Lock, int]] = {}
+
+
+def get_cache() -> RegistryCache:
+    global _CACHE
+
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = RegistryCache(REGISTRY_CACHE_PATH)
+        return _CACHE
+
+
+def is_permanent_error(ex: Exception) -> bool:
+    # a missing module or version stays missing for a while, network errors, 5xx and rate limits do not
+    if isinstance(ex, requests.HTTPError):
+        return ex.response is not None and ex.response.status_code == 404
+
+    # raised by the address parsing and version selection above
+    return type(ex) is RuntimeError
+
+
+def _acquire_key_lock(key: tuple[str, str]) -> threading.Lock:
+    with _CACHE_LOCK:
+        (key_lock, users) = _KEY_LOCKS.get(key, (threading.Lock(), 0))
+        _KEY_LOCKS[key] = (key_lock, users + 1)
+
+    key_lock.acquire()
+    return key_lock
+
+
+def _release_key_lock(key: tuple[str, str]):
+    with _CACHE_LOCK:
+        (key_lock, users) = _KEY_LOCKS[key]
+        if users > 1:
+            _KEY_LOCKS[key] = (key_lock, users - 1)
+        else:
+            del _KEY_LOCKS[key]
+
+    key_lock.release()
+
+
+def _resolve_uncached(dependency: str, constraint: Optional[str],
+                      cache: RegistryCache) -> tuple[Optional[RegistrySource], Optional[str]]:
+    try:
+        source = fetch_source(dependency, constraint)
     except Exception as ex:
-        logger.error(f"Failed to grab source for terraform registry {module_url}")
+        logger.error(f"Failed to grab source for terraform registry module '{dependency}' ({constraint}): {ex}")
+        error = str(ex) or type(ex).__name__
+        if is_permanent_error(ex):
+            cache.put(dependency, constraint, None, error)
+        return None, error
+
+    cache.put(dependency, constraint, source)
+    return source, None
+
+
+def resolve_source(dependency: str, constraint: Optional[str] = None) -> RegistrySource:
+    constraint = constraint.strip() if constraint else None
+    key = (dependency, constraint or "")
+    cache = get_cache()
+
+    # the same module is referenced from many files of a crawl, only one thread asks the registry
+    _acquire_key_lock(key)
+    try:
+        cached = cache.get(dependency, constraint)
+
+        if cached is None:
+            cached = _resolve_uncached(dependency, constraint, cache)
+    finally:
+        _release_key_lock(key)
+
+    (source, error) = cached
+
+    if source is None:
+        raise RuntimeError(f"Unable to resolve terraform registry module '{dependency}' ({constraint}): {error}")
+
+    return source
+
+
+def resolve_sources(dependencies: Iterable[RegistryDependency],
+                    max_workers: int = REGISTRY_MAX_WORKERS) -> dict[RegistryDependency, Optional[RegistrySource]]:
+    unique = list(dict.fromkeys(dependencies))
+
+    def resolve_or_none(dependency: RegistryDependency) -> Optional[RegistrySource]:
+        try:
+            return resolve_source(*dependency)
+        except RuntimeError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(unique, executor.map(resolve_or_none, unique)))
+
+
+def get_source_code(dependency: str, version: Optional[str] = None) -> str:
+    return resolve_source(dependency, version).source
 
 
 if __name__ == '__main__':
@@ -1,11 +1,18 @@
-from typing import Union
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 
 import matplotlib.pyplot as plt
 import networkx as nx
+from matplotlib.figure import Figure
 from networkx import Graph
 
 from terraform_analyzer.core.hcl import CloudResourceType
-from terraform_analyzer.core.schema import NodeTf, GraphTf, ComponentTf
+from terraform_analyzer.core.schema import GraphTf, ComponentTf
 
 RELEVANT_TYPES: set[CloudResourceType] = {
     CloudResourceType.AWS_SNS,
@@ -15,30 +22,19 @@ RELEVANT_TYPES: set[CloudResourceType] = {
     CloudResourceType.AWS_API_GATEWAY_REST_API
 }
 
+FIGURE_SIZE = (12, 6)
+LAYOUT_SEED = 7
+# above these amount of nodes spring layout gets too slow, use a cheaper one or skip the plot entirely
+MAX_SPRING_LAYOUT_NODES = 150
+MAX_RENDER_NODES = 1000
 
-def _get_relevant_transitive_connection(component: ComponentTf,
-                                        graph: GraphTf,
-                                        include_res: set[CloudResourceType] = None) -> list[ComponentTf]:
-    visited_nodes: set[str] = {component.terraform_resource.get_qualified_name()}
+# layouts kept in memory, least recently used first. Workers render graphs for a whole corpus, the layout cache
+# folder keeps every layout anyway
+MAX_CACHED_LAYOUTS = 256
 
-    connections: list[ComponentTf] = []
+_LAYOUT_CACHE: OrderedDict[str, dict[str, tuple[float, float]]] = OrderedDict()
 
-    nodes_to_visit: list[Union[ComponentTf, NodeTf]] = graph.get_connected(component, filter_by=[ComponentTf])
-
-    while nodes_to_visit:
-        next_node = nodes_to_visit.pop(0)
-        next_node_name = next_node.terraform_resource.get_qualified_name()
-
-        if next_node_name in visited_nodes:
-            continue
-        visited_nodes.add(next_node_name)
-
-        if include_res is None or next_node.terraform_resource.get_cloud_resource_type() in include_res:
-            connections.append(next_node)
-        else:
-            nodes_to_visit.extend(graph.get_connected(next_node, filter_by=[ComponentTf]))
-
-    return connections
+logger = logging.getLogger("ui")
 
 
 def get_small_graph(tf_graph: GraphTf) -> Graph:
@@ -56,7 +52,7 @@ def get_small_graph(tf_graph: GraphTf) -> Graph:
     for component in relevant_component:
         node_name = str(component.terraform_resource.get_qualified_name())
 
-        relevant_conns = _get_relevant_transitive_connection(component, tf_graph, RELEVANT_TYPES)
+        relevant_conns = tf_graph.get_transitive_connected(component, RELEVANT_TYPES)
         other_node: ComponentTf
         # print(f"{node_name}->{[str(n) for n in relevant_component]}")
 
@@ -88,7 +84,7 @@ def get_big_graph(tf_graph: GraphTf) -> Graph:
     for component in relevant_components:
         node_name = str(component.terraform_resource.get_qualified_name())
 
-        relevant_conns = _get_relevant_transitive_connection(component, tf_graph)
+        relevant_conns = tf_graph.get_transitive_connected(component)
         other_node: ComponentTf
         # print(f"{node_name}->{[str(n) for n in relevant_nodes]}")
 
@@ -102,7 +98,53 @@ def get_big_graph(tf_graph: GraphTf) -> Graph:
     return graph
 
 
-def show_graph(tf_graph: GraphTf):
+def _get_graph_key(graph: Graph, k: float) -> str:
+    nodes = sorted(str(node) for node in graph.nodes())
+    edges = sorted("->".join(sorted((str(a), str(b)))) for a, b in graph.edges())
+
+    return hashlib.sha1("\n".join([str(k)] + nodes + ["#"] + edges).encode()).hexdigest()
+
+
+def _compute_layout(graph: Graph, k: float) -> dict[str, tuple[float, float]]:
+    if graph.number_of_nodes() > MAX_SPRING_LAYOUT_NODES:
+        pos = nx.circular_layout(graph)
+    else:
+        pos = nx.spring_layout(graph, k, seed=LAYOUT_SEED)
+
+    return {str(node): (float(xy[0]), float(xy[1])) for node, xy in pos.items()}
+
+
+def get_layout(graph: Graph, k: float, layout_cache_folder: Optional[str] = None) -> dict[str, tuple[float, float]]:
+    key = _get_graph_key(graph, k)
+
+    if key in _LAYOUT_CACHE:
+        _LAYOUT_CACHE.move_to_end(key)
+        return _LAYOUT_CACHE[key]
+
+    cache_file_path = f"{layout_cache_folder}/{key}.json" if layout_cache_folder else None
+
+    if cache_file_path and os.path.exists(cache_file_path):
+        with open(cache_file_path, 'r') as file:
+            layout = {node: tuple(xy) for node, xy in json.load(file).items()}
+    else:
+        layout = _compute_layout(graph, k)
+
+        if cache_file_path:
+            os.makedirs(layout_cache_folder, exist_ok=True)
+            tmp_path = f"{cache_file_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as file:
+                json.dump(layout, file)
+            os.replace(tmp_path, cache_file_path)
+
+    _LAYOUT_CACHE[key] = layout
+
+    while len(_LAYOUT_CACHE) > MAX_CACHED_LAYOUTS:
+        _LAYOUT_CACHE.popitem(last=False)
+
+    return layout
+
+
+def _draw_graphs(fig: Figure, tf_graph: GraphTf, layout_cache_folder: Optional[str] = None):
     # Create two graphs
     g1 = get_small_graph(tf_graph)
     g2 = get_big_graph(tf_graph)
@@ -112,11 +154,11 @@ def show_graph(tf_graph: GraphTf):
     k = 0.7  # node distance
 
     # Set up the subplot grid
-    fig, axes = plt.subplots(1, 2, figsize=(12, 6))  # 1 row, 2 columns
+    axes = fig.subplots(1, 2)  # 1 row, 2 columns
 
     # Draw the first graph on the left subplot
     ax1 = axes[0]
-    pos = nx.spring_layout(g1, k)
+    pos = get_layout(g1, k, layout_cache_folder)
     nx.draw_networkx(g1, pos, node_color='green', ax=ax1, with_labels=True, node_size=node_size, font_size=font_size)
     ax1.set_title('Simplified')
     ax1.axis('off')
@@ -124,11 +166,60 @@ def show_graph(tf_graph: GraphTf):
     # Draw the second graph on the right subplot
     node_colors = [g2.nodes[node].get('color', 'red') for node in g2.nodes()]
     ax2 = axes[1]
-    pos = nx.spring_layout(g2, k)
+    pos = get_layout(g2, k, layout_cache_folder)
     nx.draw_networkx(g2, pos, node_color=node_colors, ax=ax2, with_labels=True, node_size=node_size,
                      font_size=font_size)
     ax2.set_title('Complete')
     ax2.axis('off')
 
-    plt.tight_layout()
+    fig.tight_layout()
+
+
+def show_graph(tf_graph: GraphTf):
+    fig = plt.figure(figsize=FIGURE_SIZE)
+
+    _draw_graphs(fig, tf_graph)
+
     plt.show()
+
+
+def render_graph(tf_graph: GraphTf, output_file_path: str, layout_cache_folder: Optional[str] = None) -> bool:
+    # headless, does not go through pyplot so it is safe to call from worker processes
+    component_count = len(tf_graph.get_all_components())
+
+    if component_count > MAX_RENDER_NODES:
+        logger.warning(f"Skipping render of '{output_file_path}' since it has {component_count} components")
+        return False
+
+    fig = Figure(figsize=FIGURE_SIZE)
+
+    _draw_graphs(fig, tf_graph, layout_cache_folder)
+
+    os.makedirs(os.path.dirname(output_file_path) or ".", exist_ok=True)
+    fig.savefig(output_file_path)
+
+    return True
+
+
+def _render_graph_job(job: tuple[GraphTf, str, Optional[str]]) -> bool:
+    tf_graph, output_file_path, layout_cache_folder = job
+
+    try:
+        return render_graph(tf_graph, output_file_path, layout_cache_folder)
+    except Exception as e:
+        logger.error(f"Failed to render '{output_file_path}'", exc_info=e)
+        return False
+
+
+def render_graphs(graphs: dict[str, GraphTf],
+                  output_folder: str,
+                  image_format: str = "svg",
+                  layout_cache_folder: Optional[str] = None,
+                  max_workers: Optional[int] = None) -> dict[str, bool]:
+    names = list(graphs)
+    jobs = [(graphs[name], f"{output_folder}/{name}.{image_format}", layout_cache_folder) for name in names]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_render_graph_job, jobs))
+
+    return dict(zip(names, results))
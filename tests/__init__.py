@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# the package reads its settings at import time, the tests never touch the real cache or github
+os.environ.setdefault("CACHE_FOLDER", tempfile.mkdtemp(prefix="terraform_analyzer_tests_"))
+os.environ.setdefault("HTTP_CACHE", "False")
+os.environ.setdefault("MONGO_DB_USER", "test")
+os.environ.setdefault("MONGO_DB_PASS", "test")
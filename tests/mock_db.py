@@ -0,0 +1,10 @@
+from beanie import init_beanie
+from mongomock_motor import AsyncMongoMockClient
+
+from one_off_scripts import GithubConfig, GithubSearchResult, GithubSearchResultDay
+
+
+async def initialize_mock_db():
+    # same models as one_off_scripts.initialize_db, on a fresh in-memory database
+    await init_beanie(database=AsyncMongoMockClient().thesis,
+                      document_models=[GithubConfig, GithubSearchResult, GithubSearchResultDay])
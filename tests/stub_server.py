@@ -0,0 +1,66 @@
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, NamedTuple, Optional
+
+
+class StubRequest(NamedTuple):
+    method: str
+    path: str
+    headers: dict[str, str]
+
+
+class StubResponse(NamedTuple):
+    status: int
+    body: bytes = b""
+    headers: dict[str, str] = {}
+
+
+# request -> response, None answers 404
+Route = Callable[[StubRequest], Optional[StubResponse]]
+
+
+class StubServer:
+    # local stand-in for the remote services, every request is recorded
+
+    def __init__(self, route: Route):
+        self.route = route
+        self.requests: list[StubRequest] = []
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                request = StubRequest(self.command, self.path, dict(self.headers.items()))
+                with server._lock:
+                    server.requests.append(request)
+
+                response = server.route(request) or StubResponse(404, b'{"message": "Not Found"}')
+
+                self.send_response(response.status)
+                for key, value in response.headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(response.body)))
+                self.end_headers()
+                self.wfile.write(response.body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+
+    def get_paths(self) -> list[str]:
+        with self._lock:
+            return [x.path for x in self.requests]
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
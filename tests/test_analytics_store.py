@@ -0,0 +1,96 @@
+import tempfile
+import unittest
+
+from one_off_scripts.analytics_store import AnalyticsStore
+from one_off_scripts.batch_analyzer import RepoAnalysisRecord, ResourceRecord, ConnectionRecord, STATUS_OK, \
+    STATUS_FAILED
+from terraform_analyzer.core.hcl import CloudResourceType
+
+LAMBDA = CloudResourceType.AWS_LAMBDA
+SQS = CloudResourceType.AWS_SQS
+DYNAMO_DB = CloudResourceType.AWS_DYNAMO_DB
+
+
+def _record(repo_id: str, *types: CloudResourceType, status: str = STATUS_OK) -> RepoAnalysisRecord:
+    resources = [ResourceRecord(name=f"{x.value}.r{i}", resource_class=f"{x.name.title()}Resource",
+                                cloud_resource_type=x) for i, x in enumerate(types)]
+    # every resource is connected to the first one
+    connections = [ConnectionRecord(a=resources[0].name, a_type=types[0], b=x.name, b_type=x.cloud_resource_type,
+                                    justification=["reference"]) for x in resources[1:]]
+
+    return RepoAnalysisRecord(repo_id=repo_id, status=status, resources=resources, connections=connections)
+
+
+class AnalyticsStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+
+        self.results_path = f"{folder.name}/results.jsonl"
+        self.store = AnalyticsStore(f"{folder.name}/analytics.sqlite")
+        self.addCleanup(self.store.close)
+
+    def append(self, *content: str):
+        with open(self.results_path, 'a') as file:
+            file.write("".join(content))
+
+    def test_missing_results_file(self):
+        self.assertEqual(self.store.ingest(self.results_path), 0)
+
+    def test_only_appended_records_are_ingested(self):
+        self.append(_record("a/1", LAMBDA).model_dump_json() + "\n", _record("a/2", SQS).model_dump_json() + "\n")
+        self.assertEqual(self.store.ingest(self.results_path), 2)
+        self.assertEqual(self.store.ingest(self.results_path), 0)
+
+        # the partial last line of a run still writing is left for the next ingestion
+        line = _record("a/3", DYNAMO_DB).model_dump_json() + "\n"
+        self.append(line[:10])
+        self.assertEqual(self.store.ingest(self.results_path), 0)
+        self.append(line[10:])
+        self.assertEqual(self.store.ingest(self.results_path), 1)
+
+        self.assertEqual(self.store.get_status_counts(), {STATUS_OK: 3})
+
+    def test_shrunk_results_file_is_ingested_again(self):
+        self.append(_record("a/1", LAMBDA).model_dump_json() + "\n", _record("a/2", SQS).model_dump_json() + "\n")
+        self.store.ingest(self.results_path)
+
+        with open(self.results_path, 'w') as file:
+            file.write(_record("a/3", SQS).model_dump_json() + "\n")
+
+        self.assertEqual(self.store.ingest(self.results_path), 1)
+        self.assertEqual(self.store.get_repos_with_resource_types([]), ["a/1", "a/2", "a/3"])
+
+    def test_analysed_again_replaces_the_rows(self):
+        self.append(_record("a/1", LAMBDA, SQS, DYNAMO_DB).model_dump_json() + "\n",
+                    _record("a/1", status=STATUS_FAILED).model_dump_json() + "\n",
+                    _record("a/1", LAMBDA, SQS).model_dump_json() + "\n")
+
+        self.store.ingest(self.results_path)
+
+        self.assertEqual(self.store.get_status_counts(), {STATUS_OK: 1})
+        self.assertEqual(self.store.get_resource_type_counts(), {LAMBDA.value: (1, 1), SQS.value: (1, 1)})
+        self.assertEqual(self.store.get_connection_type_counts(), {(LAMBDA.value, SQS.value): (1, 1)})
+
+    def test_cohorts(self):
+        self.append(*(x.model_dump_json() + "\n" for x in (_record("a/1", LAMBDA, SQS, SQS),
+                                                            _record("a/2", LAMBDA, DYNAMO_DB),
+                                                            _record("a/3", SQS, LAMBDA, DYNAMO_DB),
+                                                            _record("a/4", status=STATUS_FAILED))))
+        self.store.ingest(self.results_path)
+
+        self.assertEqual(self.store.get_repos_with_resource_types([LAMBDA.value, SQS.value]), ["a/1", "a/3"])
+        self.assertEqual(self.store.get_repos_with_resource_types([DYNAMO_DB.value, DYNAMO_DB.value]), ["a/2", "a/3"])
+        self.assertEqual(self.store.get_repos_with_resource_types([]), ["a/1", "a/2", "a/3", "a/4"])
+        self.assertEqual(self.store.get_repos_with_resource_classes([f"{SQS.name.title()}Resource"]), ["a/1", "a/3"])
+        self.assertEqual(self.store.get_repos_with_connection(LAMBDA.value), ["a/1", "a/2"])
+        self.assertEqual(self.store.get_repos_with_connection(SQS.value, DYNAMO_DB.value), ["a/3"])
+        self.assertEqual(self.store.get_connection_type_counts(),
+                         {(LAMBDA.value, SQS.value): (2, 1), (LAMBDA.value, DYNAMO_DB.value): (1, 1),
+                          (SQS.value, LAMBDA.value): (1, 1), (SQS.value, DYNAMO_DB.value): (1, 1)})
+        self.assertEqual(self.store.get_status_counts(), {STATUS_OK: 3, STATUS_FAILED: 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import io
+import tarfile
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from terraform_analyzer.core import GitHubReference, RemoteResource
+from terraform_analyzer.external import archive_manager, blob_store, download_manager, github_manager, \
+    FETCH_MODE_ARCHIVE
+from tests.stub_server import StubServer, StubRequest, StubResponse
+
+MAIN_TF = b'module "network" {\n  source = "./modules/network"\n}\n'
+NETWORK_TF = b'resource "aws_sqs_queue" "q" {\n  name = "q"\n}\n'
+VARIABLES_TF = b'variable "name" {\n  default = "x"\n}\n'
+
+FILES = {
+    "main.tf": MAIN_TF,
+    "README.md": b"# readme\n",
+    "modules/network/main.tf": NETWORK_TF,
+    "modules/network/variables.tf": VARIABLES_TF,
+    # no folder entries for these, the listing has to infer them
+    "docs/examples/simple/main.tf": MAIN_TF,
+}
+
+
+def _build_archive(prefix: str, with_folders: set[str]) -> bytes:
+    buffer = io.BytesIO()
+
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for folder in sorted(with_folders):
+            info = tarfile.TarInfo(f"{prefix}/{folder}")
+            info.type = tarfile.DIRTYPE
+            tar.addfile(info)
+
+        for path, content in FILES.items():
+            info = tarfile.TarInfo(f"{prefix}/{path}")
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+    return buffer.getvalue()
+
+
+class NoGithubApi:
+    # archive mode must not go through the github api at all
+
+    def __getattr__(self, name):
+        raise AssertionError(f"github api used: {name}")
+
+
+class ArchiveManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        archive = _build_archive("project-abc123", {"", "modules", "modules/network"})
+
+        def route(request: StubRequest):
+            if request.path.endswith("/tar.gz/abc123"):
+                return StubResponse(200, archive, {"Content-Type": "application/x-gzip"})
+            return None
+
+        self.server = StubServer(route).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+        archive_manager._ARCHIVES.clear()
+        for target, value in ((archive_manager, {"GITHUB_ARCHIVE_URL": self.server.url}),
+                              (github_manager, {"FETCH_MODE": FETCH_MODE_ARCHIVE, "github_client": NoGithubApi()}),
+                              (download_manager, {"FETCH_MODE": FETCH_MODE_ARCHIVE, "github_client": NoGithubApi()})):
+            patcher = mock.patch.multiple(target, **value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.ghr = GitHubReference(author="author", project="project", commit_hash="abc123", path="")
+
+    def test_archive_keeps_tf_files_and_lists_everything(self):
+        archive = archive_manager.get_archive(self.ghr)
+
+        self.assertEqual(set(archive.files), {x for x in FILES if x.endswith(".tf")})
+        self.assertEqual(archive.get_file("/modules/network/main.tf"), NETWORK_TF)
+        self.assertRaises(RuntimeError, archive.get_file, "README.md")
+
+        tree_index = archive.tree_index
+        self.assertEqual(tree_index.list_folder(""), {"main.tf": False, "README.md": False, "modules": True,
+                                                      "docs": True})
+        self.assertTrue(tree_index.is_directory("modules/network"))
+        self.assertTrue(tree_index.is_directory("docs/examples"))
+        self.assertFalse(tree_index.is_directory("docs/examples/simple/main.tf"))
+        self.assertRaises(RuntimeError, tree_index.is_directory, "nope")
+        self.assertEqual(tree_index.get_entry("main.tf").sha, blob_store.git_blob_sha(MAIN_TF))
+
+    def test_archive_is_downloaded_once(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(archive_manager.get_archive(self.ghr)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        archive_manager.get_archive(self.ghr)
+
+        self.assertEqual(len(self.server.get_paths()), 1)
+        self.assertTrue(all(x is results[0] for x in results))
+
+    def test_tree_questions_are_answered_by_the_archive(self):
+        self.assertEqual(github_manager.get_blob_sha("modules/network/main.tf", self.ghr),
+                         blob_store.git_blob_sha(NETWORK_TF))
+        self.assertTrue(github_manager.is_resource_link_type_a_dir("modules/network", self.ghr))
+
+        root = RemoteResource(remote_reference=self.ghr, is_directory=True, relative_path=(), name="")
+        dependency = github_manager.dependency_builder("./modules/network", root, self.ghr)
+        self.assertTrue(dependency.is_directory)
+
+        names = {x.name for x in github_manager.list_files_in_remote_folder(root, self.ghr)}
+        self.assertEqual(names, {"main.tf", "README.md", "modules", "docs"})
+
+    def test_download_folder_in_archive_mode(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        output = folder.name
+        folder = RemoteResource(remote_reference=self.ghr, is_directory=True, relative_path=("modules",),
+                                name="network")
+
+        resources = download_manager.download_file_or_folder(folder, output)
+
+        self.assertEqual({x.local_resource.name for x in resources}, {"main.tf", "variables.tf"})
+        with open(f"{output}/author/project/modules/network/variables.tf", 'rb') as file:
+            self.assertEqual(file.read(), VARIABLES_TF)
+        self.assertEqual(len(self.server.get_paths()), 1)
+
+    def test_missing_archive_raises(self):
+        ghr = GitHubReference(author="author", project="project", commit_hash="missing", path="")
+
+        with self.assertRaises(Exception):
+            archive_manager.get_archive(ghr)
+
+        self.assertNotIn(("author", "project", "missing"), archive_manager._ARCHIVE_LOCKS)
+
+
+if __name__ == '__main__':
+    unittest.main()
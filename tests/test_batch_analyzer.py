@@ -0,0 +1,98 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from one_off_scripts import batch_analyzer
+from one_off_scripts.batch_analyzer import RepoAnalysisRecord, STATUS_OK, STATUS_FAILED
+
+
+def _line(repo_id: str, status: str = STATUS_OK) -> str:
+    return RepoAnalysisRecord(repo_id=repo_id, status=status).model_dump_json() + "\n"
+
+
+def _analyze_or_die(repo_id: str) -> RepoAnalysisRecord:
+    # runs in the pool workers, the poisoned repo kills its worker like the out of memory killer would
+    if repo_id == "a/poisoned":
+        os._exit(1)
+    time.sleep(0.05)
+    return RepoAnalysisRecord(repo_id=repo_id, status=STATUS_OK)
+
+
+class OpenResultsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = f"{tempfile.mkdtemp()}/{batch_analyzer.RESULTS_FILE_NAME}"
+
+    def write(self, content: str):
+        with open(self.path, 'w') as file:
+            file.write(content)
+
+    def append(self, repo_id: str):
+        with batch_analyzer.open_results(self.path) as file:
+            file.write(_line(repo_id))
+
+    def get_repo_ids(self) -> list[str]:
+        return [x.repo_id for x in batch_analyzer.read_records(self.path)]
+
+    def test_partial_last_line_is_dropped(self):
+        self.write(_line("a/1") + _line("a/2", STATUS_FAILED) + _line("a/3")[:20])
+
+        self.append("a/4")
+
+        self.assertEqual(self.get_repo_ids(), ["a/1", "a/2", "a/4"])
+
+    def test_partial_line_across_chunks(self):
+        self.write(_line("a/1") + _line("a/2")[:-1])
+
+        with mock.patch.object(batch_analyzer, "TAIL_CHUNK_SIZE", 7):
+            self.append("a/3")
+
+        self.assertEqual(self.get_repo_ids(), ["a/1", "a/3"])
+
+    def test_single_partial_line_empties_the_file(self):
+        self.write(_line("a/1")[:-5])
+
+        self.append("a/2")
+
+        self.assertEqual(self.get_repo_ids(), ["a/2"])
+
+    def test_complete_and_missing_files_are_appended_to(self):
+        self.append("a/1")
+        size = os.path.getsize(self.path)
+
+        self.append("a/2")
+
+        self.assertEqual(os.path.getsize(self.path), size * 2)
+        self.assertEqual(self.get_repo_ids(), ["a/1", "a/2"])
+
+
+
+class RunBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.analytics_folder = folder.name
+
+        # the workers are forked and pickle the analyze function by reference, they get the patched one
+        patcher = mock.patch.object(batch_analyzer, "analyze", _analyze_or_die)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_only_the_repo_killing_its_worker_fails(self):
+        repo_ids = [f"a/{x}" for x in range(6)] + ["a/poisoned"] + [f"b/{x}" for x in range(6)]
+
+        summary = batch_analyzer.run_batch(repo_ids, self.analytics_folder, max_workers=2)
+
+        results_path = f"{self.analytics_folder}/{batch_analyzer.RESULTS_FILE_NAME}"
+        records = [(x.repo_id, x.status) for x in batch_analyzer.read_records(results_path)]
+        self.assertEqual(sorted(records), sorted((x, STATUS_FAILED if x == "a/poisoned" else STATUS_OK)
+                                                 for x in repo_ids))
+        self.assertEqual(summary["status_counts"], {STATUS_OK: 12, STATUS_FAILED: 1})
+        self.assertEqual(batch_analyzer.get_completed(results_path, retry_failed=True), set(repo_ids) - {"a/poisoned"})
+
+
+if __name__ == '__main__':
+    unittest.main()
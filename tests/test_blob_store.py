@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+
+from terraform_analyzer.external import blob_store
+
+CONTENT = b'resource "aws_sqs_queue" "q" {}\n'
+
+
+class BlobStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sha = blob_store.put_blob(CONTENT)
+        self.output = tempfile.mkdtemp()
+
+    def test_sha_is_the_git_blob_sha(self):
+        # git hash-object of the same content
+        self.assertEqual(blob_store.git_blob_sha(b"hello\n"), "ce013625030ba8dba906f756967f9e9ca394464a")
+
+    def test_link_shares_the_read_only_blob(self):
+        path = f"{self.output}/main.tf"
+        blob_store.materialise(self.sha, path, link=True)
+
+        self.assertTrue(os.path.samefile(path, blob_store.get_blob_path(self.sha)))
+        self.assertEqual(os.stat(path).st_mode & 0o222, 0)
+
+    def test_copy_is_independent_and_writable(self):
+        path = f"{self.output}/main.tf"
+        blob_store.materialise(self.sha, path, link=True)
+        blob_store.materialise(self.sha, path, link=False)
+
+        self.assertFalse(os.path.samefile(path, blob_store.get_blob_path(self.sha)))
+        self.assertTrue(os.stat(path).st_mode & 0o200)
+
+        with open(path, 'ab') as file:
+            file.write(b"# edited\n")
+
+        with open(blob_store.get_blob_path(self.sha), 'rb') as file:
+            self.assertEqual(file.read(), CONTENT)
+
+
+if __name__ == '__main__':
+    unittest.main()
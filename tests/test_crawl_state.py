@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from terraform_analyzer.core import GitHubReference, RemoteResource
+from terraform_analyzer.core import crawl_state
+
+
+class CrawlStateTest(unittest.TestCase):
+
+    def setUp(self):
+        patch = mock.patch.object(crawl_state, "CRAWL_STATE_FOLDER", tempfile.mkdtemp())
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        self.output = tempfile.mkdtemp()
+        self.root = RemoteResource(remote_reference=GitHubReference(author="a", project="p", commit_hash="c", path=""),
+                                   is_directory=True, relative_path=(), name="p")
+        self.child = RemoteResource(remote_reference=self.root.remote_reference, is_directory=False,
+                                    relative_path=("main.tf",), name="main.tf")
+        self.path = crawl_state.get_crawl_state_path(self.root, self.output)
+
+    def test_crawl_without_resume_leaves_nothing_on_disk(self):
+        state = crawl_state.open_crawl_state(self.root, self.output, resume=False)
+        state.add_pending(self.child)
+        state.mark_complete()
+        state.close()
+
+        self.assertEqual(os.listdir(crawl_state.CRAWL_STATE_FOLDER), [])
+
+    def test_resumable_crawl_is_reloaded(self):
+        state = crawl_state.open_crawl_state(self.root, self.output, resume=True)
+        state.add_pending(self.child)
+        state.close()
+
+        state = crawl_state.open_crawl_state(self.root, self.output, resume=True)
+        self.addCleanup(state.close)
+
+        self.assertEqual(state.get_pending(), [self.child])
+        self.assertFalse(state.is_complete())
+
+    def test_crawl_without_resume_drops_an_earlier_state(self):
+        state = crawl_state.open_crawl_state(self.root, self.output, resume=True)
+        state.add_pending(self.child)
+        state.close()
+
+        state = crawl_state.open_crawl_state(self.root, self.output, resume=False)
+        self.addCleanup(state.close)
+
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(state.get_visited(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from github import GithubException
+
+from terraform_analyzer.external import git_refs
+from terraform_analyzer.external.git_refs import GitRefCache, ResolvedRef, REF_KIND_TAG, REF_KIND_BRANCH, \
+    REF_KIND_COMMIT
+
+COMMIT = "0123456789abcdef0123456789abcdef01234567"
+OTHER_COMMIT = "fedcba9876543210fedcba9876543210fedcba98"
+
+
+def _git_object(sha: str, kind: str) -> SimpleNamespace:
+    return SimpleNamespace(sha=sha, type=kind)
+
+
+class FakeRepo:
+
+    def __init__(self):
+        # v1.0.0 is lightweight, v2.0.0 is annotated and points to another annotated tag
+        self.tags = {"v1.0.0": _git_object(COMMIT, "commit"), "v2.0.0": _git_object("tag-outer", "tag")}
+        self.tag_objects = {"tag-outer": _git_object("tag-inner", "tag"), "tag-inner": _git_object(COMMIT, "commit")}
+        self.branches = {"main": COMMIT}
+        self.calls = []
+
+    def get_git_matching_refs(self, ref: str):
+        self.calls.append(ref)
+        prefix = ref.removeprefix("tags/")
+        return [SimpleNamespace(ref=f"refs/tags/{name}", object=git_object)
+                for (name, git_object) in self.tags.items() if name.startswith(prefix)]
+
+    def get_git_tag(self, sha: str):
+        return SimpleNamespace(object=self.tag_objects[sha])
+
+    def get_commit(self, ref: str):
+        self.calls.append(ref)
+        if ref in self.branches:
+            return SimpleNamespace(sha=self.branches[ref])
+        if len(ref) >= 7 and COMMIT.startswith(ref.lower()):
+            return SimpleNamespace(sha=COMMIT)
+        raise GithubException(404, {"message": "No commit found"}, None)
+
+
+class GitRefsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.repo = FakeRepo()
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+
+        github_client = SimpleNamespace(get_repo=lambda *_, **__: self.repo)
+
+        for patcher in (mock.patch.object(git_refs, "github_client", github_client),
+                        mock.patch.object(git_refs, "_CACHE", GitRefCache(f"{folder.name}/git_refs.sqlite"))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_lightweight_tag(self):
+        self.assertEqual(git_refs.fetch_ref("author/project", "v1.0.0"), ResolvedRef(COMMIT, REF_KIND_TAG))
+
+    def test_annotated_tags_are_peeled(self):
+        self.assertEqual(git_refs.fetch_ref("author/project", "v2.0.0"), ResolvedRef(COMMIT, REF_KIND_TAG))
+
+    def test_tag_prefix_is_not_a_match(self):
+        self.repo.tags = {"v1.0.0-rc1": _git_object(OTHER_COMMIT, "commit")}
+        self.repo.branches["v1.0.0"] = COMMIT
+
+        self.assertEqual(git_refs.fetch_ref("author/project", "v1.0.0"), ResolvedRef(COMMIT, REF_KIND_BRANCH))
+
+    def test_branch(self):
+        self.assertEqual(git_refs.fetch_ref("author/project", "main"), ResolvedRef(COMMIT, REF_KIND_BRANCH))
+
+    def test_abbreviated_sha(self):
+        self.assertEqual(git_refs.fetch_ref("author/project", COMMIT[:7].upper()), ResolvedRef(COMMIT, REF_KIND_COMMIT))
+        self.assertEqual(git_refs.fetch_ref("author/project", COMMIT), ResolvedRef(COMMIT, REF_KIND_COMMIT))
+
+    def test_unknown_ref_raises(self):
+        with self.assertRaises(RuntimeError):
+            git_refs.fetch_ref("author/project", "missing")
+
+    def test_tags_and_commits_are_never_refetched(self):
+        for ref in ("v2.0.0", COMMIT[:7]):
+            git_refs.resolve_ref("author/project", ref)
+
+        with mock.patch.object(time, "time", return_value=time.time() + 365 * 24 * 3600):
+            for ref in ("v2.0.0", COMMIT[:7]):
+                git_refs.resolve_ref("Author/Project", ref)
+
+        self.assertEqual(self.repo.calls, ["tags/v2.0.0", f"tags/{COMMIT[:7]}", COMMIT[:7]])
+
+    def test_branches_expire(self):
+        self.assertEqual(git_refs.resolve_ref("author/project", "main").commit_hash, COMMIT)
+
+        self.repo.branches["main"] = OTHER_COMMIT
+        self.assertEqual(git_refs.resolve_ref("author/project", "main").commit_hash, COMMIT)
+
+        with mock.patch.object(time, "time", return_value=time.time() + git_refs.GIT_REF_BRANCH_TTL):
+            self.assertEqual(git_refs.resolve_ref("author/project", "main").commit_hash, OTHER_COMMIT)
+
+    def test_key_locks_are_released(self):
+        threads = [threading.Thread(target=git_refs.resolve_ref, args=("author/project", "v1.0.0")) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.repo.calls, ["tags/v1.0.0"])
+        self.assertEqual(git_refs._KEY_LOCKS, {})
+
+    def test_key_locks_are_released_on_failure(self):
+        with self.assertRaises(RuntimeError):
+            git_refs.resolve_ref("author/project", "missing")
+
+        self.assertEqual(git_refs._KEY_LOCKS, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
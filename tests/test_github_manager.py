@@ -0,0 +1,50 @@
+import unittest
+from unittest import mock
+
+from terraform_analyzer.core import GitHubReference
+from terraform_analyzer.external import github_manager
+from terraform_analyzer.external.git_tree import GitTreeEntry, GitTreeEntryType
+
+
+class TreeIndexCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fetched: list[str] = []
+
+        def fetch_tree_entries(repo_id: str, tree_ish: str):
+            self.fetched.append(tree_ish)
+            if tree_ish.startswith("truncated"):
+                return None
+            return {"main.tf": GitTreeEntry(type=GitTreeEntryType.BLOB, sha=f"sha-{tree_ish}")}
+
+        patcher = mock.patch.object(github_manager, "fetch_tree_entries", fetch_tree_entries)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        github_manager._TREE_INDEXES.clear()
+
+    def _get(self, commit_hash: str):
+        return github_manager.get_tree_index(GitHubReference(author=self.id(), project="p",
+                                                             commit_hash=commit_hash, path=""))
+
+    def test_memory_cache_is_bounded(self):
+        for i in range(github_manager.MAX_CACHED_TREE_INDEXES + 10):
+            self._get(f"c{i}")
+
+        self.assertEqual(len(github_manager._TREE_INDEXES), github_manager.MAX_CACHED_TREE_INDEXES)
+        self.assertEqual(github_manager._TREE_INDEX_LOCKS, {})
+
+        # evicted from memory, read back from disk
+        self.assertEqual(self._get("c0").get_entry("main.tf").sha, "sha-c0")
+        self.assertEqual(self.fetched.count("c0"), 1)
+
+    def test_truncated_listing_is_persisted(self):
+        self.assertIsNone(self._get("truncated"))
+
+        github_manager._TREE_INDEXES.clear()
+
+        self.assertIsNone(self._get("truncated"))
+        self.assertEqual(self.fetched.count("truncated"), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import asyncio
+import json
+import unittest
+from datetime import datetime
+from typing import Optional
+from unittest import mock
+from urllib.parse import urlparse, parse_qs
+
+from github import Github
+
+from one_off_scripts import github_search
+from tests.mock_db import initialize_mock_db
+from tests.stub_server import StubServer, StubRequest, StubResponse
+
+
+def _repo(i: int) -> dict:
+    return {"id": i, "name": f"r{i}", "full_name": f"a/r{i}", "stargazers_count": i, "archived": False,
+            "fork": False, "created_at": "2020-01-01T00:00:00Z", "pushed_at": "2020-01-02T00:00:00Z",
+            "description": None}
+
+
+class FetchWindowTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # the results are documents, their models have to be initialised
+        asyncio.run(initialize_mock_db())
+
+    def setUp(self):
+        self.total_count = 0
+        self.server = StubServer(self.route).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+        patch = mock.patch.object(github_search, "github_client", Github(base_url=self.server.url, per_page=100))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def route(self, request: StubRequest) -> Optional[StubResponse]:
+        url = urlparse(request.path)
+
+        if url.path != "/search/repositories":
+            return None
+
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        page, per_page = int(params.get("page", "1")), int(params["per_page"])
+        items = [_repo(i) for i in range((page - 1) * per_page, min(page * per_page, self.total_count))]
+
+        return StubResponse(200, json.dumps({"total_count": self.total_count, "items": items}).encode(),
+                            {"Content-Type": "application/json"})
+
+    def fetch(self):
+        return github_search._fetch_window(datetime(2020, 1, 1), datetime(2020, 1, 2))
+
+    def test_empty_window_costs_one_request(self):
+        self.assertEqual(self.fetch(), (0, []))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_every_page_is_fetched_once(self):
+        self.total_count = 150
+
+        total_count, results = self.fetch()
+
+        self.assertEqual(total_count, 150)
+        self.assertEqual([x.id for x in results], [f"a/r{i}" for i in range(150)])
+        self.assertEqual(results[0].all_attributes, _repo(0))
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_capped_window_is_split(self):
+        self.total_count = github_search.SEARCH_RESULT_CAP
+
+        self.assertEqual(self.fetch(), (github_search.SEARCH_RESULT_CAP, None))
+        self.assertEqual(len(self.server.requests), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
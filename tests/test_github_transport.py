@@ -0,0 +1,75 @@
+import json
+import time
+import unittest
+from unittest import mock
+
+from github import Github
+from github.GithubRetry import GithubRetry
+
+from terraform_analyzer import external
+from terraform_analyzer.external import rate_limiter, GITHUB_RETRY
+from terraform_analyzer.external.github_transport import without_rate_limit_retries
+from tests.stub_server import StubServer, StubRequest, StubResponse
+
+REPO = {"id": 1, "name": "r", "full_name": "o/r", "owner": {"login": "o"}}
+
+
+class GithubTransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.failures: dict[str, list[StubResponse]] = {}
+        self.server = StubServer(self.route).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+        for patch in (mock.patch.object(rate_limiter, "GITHUB_API_HOSTS", {"127.0.0.1"}),
+                      mock.patch.object(rate_limiter, "RESET_MARGIN", 0)):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def route(self, request: StubRequest):
+        if request.path.startswith("/repos/o/"):
+            failures = self.failures.get(request.path)
+            if failures:
+                return failures.pop(0)
+            return StubResponse(200, json.dumps(REPO).encode(), {"Content-Type": "application/json"})
+
+        return None
+
+    def get_stats(self) -> tuple[int, int]:
+        stats = external.rate_limit_scheduler.stats
+        return stats.requests.get("core", 0), stats.rate_limited.get("core", 0)
+
+    def test_rate_limit_statuses_are_removed_from_the_retry(self):
+        retry = without_rate_limit_retries(GithubRetry())
+
+        self.assertNotIn(403, retry.status_forcelist)
+        self.assertIn(502, retry.status_forcelist)
+        self.assertEqual(retry.total, GithubRetry().total)
+        self.assertNotIn(403, GITHUB_RETRY.status_forcelist)
+
+    def test_rate_limited_response_reaches_the_scheduler(self):
+        headers = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(int(time.time()) - 1),
+                   "Content-Type": "application/json"}
+        self.failures["/repos/o/r"] = [StubResponse(403, b'{"message": "API rate limit exceeded"}', headers)]
+        requests_before, rate_limited_before = self.get_stats()
+
+        # the default retry of PyGithub, the shared adapter must not let urllib3 retry the 403
+        repo = Github(base_url=self.server.url, retry=GithubRetry()).get_repo("o/r")
+
+        requests_after, rate_limited_after = self.get_stats()
+        self.assertEqual(repo.full_name, "o/r")
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(rate_limited_after - rate_limited_before, 1)
+        self.assertEqual(requests_after - requests_before, 2)
+
+    def test_server_errors_are_retried(self):
+        self.failures["/repos/o/r"] = [StubResponse(502, b'{"message": "Bad Gateway"}')]
+
+        repo = Github(base_url=self.server.url, retry=GITHUB_RETRY).get_repo("o/r")
+
+        self.assertEqual(repo.full_name, "o/r")
+        self.assertEqual(len(self.server.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
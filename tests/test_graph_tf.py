@@ -0,0 +1,142 @@
+import tempfile
+import unittest
+from typing import Union
+
+from terraform_analyzer.core import LocalResource
+from terraform_analyzer.core.hcl import hcl_project_parser
+from terraform_analyzer.core.hcl.hcl_obj import TerraformResource
+from terraform_analyzer.core.schema import schema_factory, GraphTf, ComponentTf, NodeTf
+
+PROJECT = '''
+resource "aws_lambda_function" "writer" {
+  function_name = "writer"
+  environment {
+    variables = {
+      TABLE = aws_dynamodb_table.orders.name
+      QUEUE = aws_sqs_queue.jobs.arn
+    }
+  }
+}
+
+resource "aws_lambda_function" "notifier" {
+  function_name = "notifier"
+  environment {
+    variables = {
+      TOPIC = aws_sns_topic.events.arn
+    }
+  }
+}
+
+resource "aws_lambda_permission" "from_sns" {
+  action = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.notifier.function_name
+  principal = "sns.amazonaws.com"
+  source_arn = aws_sns_topic.events.arn
+}
+
+resource "aws_dynamodb_table" "orders" {
+  name = "orders"
+}
+
+resource "aws_dynamodb_table" "archive" {
+  name = "archive"
+}
+
+resource "aws_sqs_queue" "jobs" {
+  name = "jobs"
+}
+
+resource "aws_sns_topic" "events" {
+  name = "events"
+}
+'''
+
+
+def _get_name(component_or_node: Union[ComponentTf, NodeTf]) -> str:
+    if isinstance(component_or_node, ComponentTf):
+        return component_or_node.terraform_resource.get_qualified_name()
+
+    return f"node:{component_or_node.get_cloud_resource_type().value}"
+
+
+def _describe(graph: GraphTf) -> tuple:
+    connections = [(_get_name(x.a), _get_name(x.b), tuple(sorted(x.justification))) for x in graph.connections]
+    nodes = {(x.cloud_resource_type, frozenset(_get_name(c) for c in x.components)) for x in graph.nodes}
+    components = [_get_name(x) for x in graph.get_components()]
+
+    return connections, nodes, components
+
+
+class GraphTfIncrementalTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        folder = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(folder.cleanup)
+
+        with open(f"{folder.name}/main.tf", 'w') as file:
+            file.write(PROJECT)
+
+        cls.resources: list[TerraformResource] = hcl_project_parser.parse_project(
+            LocalResource(full_path=f"{folder.name}/main.tf", name="main.tf", is_directory=False))
+
+    def _get(self, *names: str) -> list[TerraformResource]:
+        by_name = {x.get_qualified_name(): x for x in self.resources}
+        return [by_name[x] for x in names]
+
+    def assertSameAsRebuild(self, graph: GraphTf):
+        rebuilt = schema_factory.build_graph([x.terraform_resource for x in graph.get_components()])
+        self.assertEqual(_describe(rebuilt), _describe(graph))
+
+    def test_project_has_connections(self):
+        graph = schema_factory.build_graph(self.resources)
+
+        self.assertEqual(len(self.resources), 7)
+        self.assertTrue(graph.connections)
+
+    def test_add_resources_matches_rebuild(self):
+        for split in range(len(self.resources) + 1):
+            with self.subTest(split=split):
+                graph = schema_factory.build_graph(self.resources[:split])
+                graph.add_resources(self.resources[split:])
+
+                self.assertSameAsRebuild(graph)
+                self.assertEqual(_describe(graph), _describe(schema_factory.build_graph(self.resources)))
+
+    def test_add_one_by_one_matches_rebuild(self):
+        graph = schema_factory.build_graph([])
+
+        for resource in reversed(self.resources):
+            graph.add_resources([resource])
+            self.assertSameAsRebuild(graph)
+
+    def test_remove_resources_matches_rebuild(self):
+        for resource in self.resources:
+            with self.subTest(removed=resource.get_qualified_name()):
+                graph = schema_factory.build_graph(self.resources)
+                removed = graph.remove_resources([resource])
+
+                self.assertEqual(len(removed), 1)
+                self.assertSameAsRebuild(graph)
+
+    def test_remove_then_add_back_matches_rebuild(self):
+        targets = [x for x in self.resources if x.get_qualified_name().startswith(("aws_dynamodb_table.",
+                                                                                    "aws_sns_topic."))]
+        graph = schema_factory.build_graph(self.resources)
+
+        graph.remove_resources(targets)
+        self.assertSameAsRebuild(graph)
+
+        graph.add_resources(targets)
+        self.assertSameAsRebuild(graph)
+
+    def test_remove_unknown_resource_is_noop(self):
+        graph = schema_factory.build_graph(self.resources[:3])
+        before = _describe(graph)
+
+        self.assertEqual(graph.remove_resources(self.resources[3:4]), [])
+        self.assertEqual(_describe(graph), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
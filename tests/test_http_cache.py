@@ -0,0 +1,121 @@
+import tempfile
+import unittest
+
+import requests
+
+from terraform_analyzer.external.http_cache import HttpCache, CachingHTTPAdapter
+from terraform_analyzer.external.github_transport import mount_adapter
+from tests.stub_server import StubServer, StubRequest, StubResponse
+
+SHA = "0123456789abcdef0123456789abcdef01234567"
+
+
+class HttpCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.version = "v1"
+        self.server = StubServer(self.route).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+        self.cache = HttpCache(tempfile.mkdtemp())
+        self.session = requests.Session()
+        mount_adapter(self.session, CachingHTTPAdapter(self.cache))
+
+    def route(self, request: StubRequest):
+        path = request.path.split("?")[0]
+
+        if path == "/etag":
+            etag = f'"{self.version}"'
+            if request.headers.get("If-None-Match") == etag:
+                return StubResponse(304, headers={"ETag": etag, "X-RateLimit-Remaining": "41"})
+            return StubResponse(200, f"body {self.version} {request.headers.get('Accept')}".encode(),
+                                {"ETag": etag, "X-RateLimit-Remaining": "42"})
+        elif path == "/last-modified":
+            last_modified = "Wed, 21 Oct 2015 07:28:00 GMT"
+            if request.headers.get("If-Modified-Since") == last_modified:
+                return StubResponse(304)
+            return StubResponse(200, b"dated body", {"Last-Modified": last_modified})
+        elif path == f"/repos/a/p/git/trees/{SHA}":
+            return StubResponse(200, b'{"tree": []}', {"Content-Type": "application/json"})
+        elif path == "/plain":
+            return StubResponse(200, b"no validators")
+        elif path == "/large":
+            return StubResponse(200, b"x" * 1000, {"ETag": f'"{request.path}"'})
+
+        return None
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.session.get(f"{self.server.url}{path}", **kwargs)
+
+    def test_revalidation_sends_validators_and_serves_the_cached_body_on_304(self):
+        first = self.get("/etag")
+        second = self.get("/etag")
+
+        self.assertEqual(first.content, b"body v1 */*")
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, b"body v1 */*")
+        self.assertTrue(getattr(second, "from_cache", False))
+        # the 304 headers refresh the stored ones
+        self.assertEqual(second.headers["X-RateLimit-Remaining"], "41")
+
+        self.assertNotIn("If-None-Match", self.server.requests[0].headers)
+        self.assertEqual(self.server.requests[1].headers["If-None-Match"], '"v1"')
+        self.assertEqual((self.cache.stats.misses, self.cache.stats.revalidations), (1, 1))
+
+    def test_changed_resource_replaces_the_cached_body(self):
+        self.get("/etag")
+        self.version = "v2"
+
+        response = self.get("/etag")
+
+        self.assertEqual(response.content, b"body v2 */*")
+        self.assertEqual(self.get("/etag").content, b"body v2 */*")
+        self.assertEqual(self.server.requests[2].headers["If-None-Match"], '"v2"')
+
+    def test_last_modified_revalidation(self):
+        self.get("/last-modified")
+        response = self.get("/last-modified")
+
+        self.assertEqual(response.content, b"dated body")
+        self.assertEqual(self.server.requests[1].headers["If-Modified-Since"], "Wed, 21 Oct 2015 07:28:00 GMT")
+        self.assertEqual(self.cache.stats.revalidations, 1)
+
+    def test_immutable_urls_are_served_without_a_request(self):
+        self.get(f"/repos/a/p/git/trees/{SHA}")
+        response = self.get(f"/repos/a/p/git/trees/{SHA}")
+
+        self.assertEqual(response.json(), {"tree": []})
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.cache.stats.hits, 1)
+
+    def test_vary_headers_are_part_of_the_key(self):
+        self.get("/etag", headers={"Accept": "application/json"})
+        response = self.get("/etag", headers={"Accept": "text/plain"})
+
+        self.assertEqual(response.content, b"body v1 text/plain")
+        self.assertNotIn("If-None-Match", self.server.requests[1].headers)
+
+    def test_uncacheable_responses_always_hit_the_server(self):
+        for path in ("/plain", "/missing"):
+            self.get(path)
+            self.get(path)
+
+        self.get("/etag", stream=True).close()
+        self.get("/etag", stream=True).close()
+
+        self.assertEqual(len(self.server.requests), 6)
+        self.assertTrue(all("If-None-Match" not in x.headers for x in self.server.requests))
+        self.assertEqual(self.cache.stats.stores, 0)
+
+    def test_eviction_keeps_the_cache_under_its_max_size(self):
+        self.cache.max_size = 3500
+
+        for i in range(10):
+            self.get(f"/large?{i}")
+
+        self.assertLessEqual(self.cache.get_size(), 3500)
+        self.assertGreater(self.cache.stats.evictions, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
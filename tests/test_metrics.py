@@ -0,0 +1,46 @@
+import json
+import os
+import tempfile
+import unittest
+
+from terraform_analyzer.core import metrics
+from terraform_analyzer.core.metrics import MetricsRegistry
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+        self.registry = MetricsRegistry(enabled=True)
+
+    def test_exported_series_carry_the_process_label(self):
+        self.registry.counter("repos_total", "Repos").inc(status="ok")
+        self.registry.histogram("parse_seconds", "Parse time", buckets=(1.0,)).observe(0.5)
+
+        prefix = self.registry.export("run", self.output)
+
+        with open(f"{prefix}.prom") as file:
+            prom = file.read()
+        with open(f"{prefix}.json") as file:
+            summary = json.load(file)
+
+        process = f'process="{os.getpid()}"'
+        self.assertIn(f'terraform_analyzer_repos_total{{{process},status="ok"}} 1', prom)
+        self.assertIn(f'terraform_analyzer_parse_seconds_bucket{{{process},le="1.0"}} 1', prom)
+        self.assertIn(f'terraform_analyzer_parse_seconds_count{{{process}}} 1', prom)
+        self.assertEqual(summary["labels"], {"process": str(os.getpid())})
+
+    def test_remove_exports_only_removes_the_prefixed_exports(self):
+        self.registry.export("batch_analyzer_1", self.output)
+        self.registry.export("batch_analyzer_2", self.output)
+        self.registry.export("pipeline", self.output)
+        open(f"{self.output}/batch_analyzer_notes.txt", 'w').close()
+
+        metrics.remove_exports("batch_analyzer_", self.output)
+
+        self.assertEqual(sorted(os.listdir(self.output)),
+                         ["batch_analyzer_notes.txt", "pipeline.json", "pipeline.prom"])
+
+
+if __name__ == '__main__':
+    unittest.main()
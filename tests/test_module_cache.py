@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from terraform_analyzer.core import RemoteResource, GitHubReference, Resource, LocalResource, module_cache
+from terraform_analyzer.core.module_cache import ModuleGraph
+from terraform_analyzer.external import blob_store
+
+
+def _module(project: str) -> RemoteResource:
+    ghr = GitHubReference(author="author", project=project, commit_hash="abc123", path="")
+    return RemoteResource(remote_reference=ghr, is_directory=True, relative_path=(), name="")
+
+
+class ModuleCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.output = f"{folder.name}/output"
+
+        patcher = mock.patch.object(module_cache, "MODULE_CACHE_FOLDER", f"{folder.name}/modules")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # a -> b -> c, each module with a single file
+        (self.a, self.b, self.c) = (_module("a"), _module("b"), _module("c"))
+        self.graph = ModuleGraph(self.output)
+        for rr in (self.a, self.b, self.c):
+            self.graph.add_download(rr, [self._write(rr, f'# {rr.remote_reference.project}\n'.encode())])
+        self.graph.add_edge(self.a, self.b)
+        self.graph.add_edge(self.b, self.c)
+
+    def _write(self, rr: RemoteResource, content: bytes) -> Resource:
+        path = f"{self.output}/author/{rr.remote_reference.project}/main.tf"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(content)
+
+        file_rr = RemoteResource(remote_reference=rr.remote_reference, is_directory=False, relative_path=(),
+                                 name="main.tf")
+        return Resource(remote_resource=file_rr,
+                        local_resource=LocalResource(full_path=path, name="main.tf", is_directory=False))
+
+    def test_closure(self):
+        self.assertEqual(set(self.graph.get_closure(self.a)), {self.a, self.b, self.c})
+        self.assertEqual(set(self.graph.get_closure(self.c)), {self.c})
+
+    def test_closure_not_crawled_in_this_run(self):
+        self.graph.add_edge(self.c, _module("d"))
+
+        self.assertIsNone(self.graph.get_closure(self.a))
+        self.assertIsNone(self.graph.build_entry(self.c))
+
+    def test_store_and_materialise(self):
+        self.assertEqual(self.graph.store_modules(), 3)
+
+        entry = module_cache.get(self.a)
+        self.assertEqual(set(entry.get_resources()), {self.a, self.b, self.c})
+
+        with tempfile.TemporaryDirectory() as output:
+            self.assertTrue(module_cache.materialise(entry, output))
+
+            for project in ("a", "b", "c"):
+                with open(f"{output}/author/{project}/main.tf", 'rb') as file:
+                    self.assertEqual(file.read(), f'# {project}\n'.encode())
+
+    def test_materialise_with_missing_blob(self):
+        self.graph.store_modules()
+        entry = module_cache.get(self.a)
+        (_, sha) = entry.files[entry.resources[0]][0]
+        os.remove(blob_store.get_blob_path(sha))
+
+        with tempfile.TemporaryDirectory() as output:
+            self.assertFalse(module_cache.materialise(entry, output))
+
+    def test_unresolved_child_is_not_stored(self):
+        # b references a module that failed to resolve, neither b nor anything depending on it is complete
+        self.graph.add_unresolved(self.b)
+
+        self.assertIsNone(self.graph.get_closure(self.a))
+        self.assertIsNone(self.graph.get_closure(self.b))
+        self.assertEqual(self.graph.store_modules(), 1)
+        self.assertIsNone(module_cache.get(self.a))
+        self.assertIsNone(module_cache.get(self.b))
+        self.assertIsNotNone(module_cache.get(self.c))
+
+    def test_cached_modules_are_not_stored_again(self):
+        self.graph.store_modules()
+        graph = ModuleGraph(self.output)
+        graph.add_cached(self.a, module_cache.get(self.a))
+
+        self.assertEqual(set(graph.get_closure(self.a)), {self.a, self.b, self.c})
+        self.assertEqual(graph.store_modules(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
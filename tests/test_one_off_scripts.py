@@ -0,0 +1,80 @@
+import unittest
+from datetime import datetime, timedelta
+
+from beanie.odm.operators.update.general import Set
+
+from one_off_scripts import GithubSearchResult, BulkUpdater, iterate_pages, PRIORITY_SORT, ID_SORT
+from tests.mock_db import initialize_mock_db
+
+CREATED_AT = datetime(2020, 1, 1)
+
+
+def _result(i: int) -> GithubSearchResult:
+    # few distinct stars and dates, so the pages break in the middle of ties
+    return GithubSearchResult(id=f"a/r{i:03}", repo_name=f"r{i:03}", star_gazers=i % 7, archived=False, is_fork=False,
+                              created_at=CREATED_AT, last_pushed_at=CREATED_AT + timedelta(days=i % 5),
+                              description=None, all_attributes={})
+
+
+class IteratePagesTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        await initialize_mock_db()
+        await GithubSearchResult.insert_many([_result(i) for i in range(237)])
+
+    async def test_every_document_once_in_sort_order(self):
+        expected = [x.id for x in await GithubSearchResult.find({}).sort(PRIORITY_SORT).to_list()]
+
+        pages = [page async for page in iterate_pages(GithubSearchResult, {}, PRIORITY_SORT, 25)]
+
+        self.assertEqual([x.id for page in pages for x in page], expected)
+        self.assertEqual([len(x) for x in pages], [25] * 9 + [12])
+
+    async def test_documents_leaving_the_query_do_not_shift_the_pages(self):
+        seen: list[str] = []
+
+        async for page in iterate_pages(GithubSearchResult, {"main_tf": None}, ID_SORT, 10):
+            seen.extend(x.id for x in page)
+            for result in page:
+                await GithubSearchResult.find_one(GithubSearchResult.id == result.id).update(
+                    Set({GithubSearchResult.main_tf: []}))
+
+        self.assertEqual(seen, [f"a/r{i:03}" for i in range(237)])
+
+    async def test_sort_has_to_end_with_id(self):
+        with self.assertRaises(RuntimeError):
+            async for _ in iterate_pages(GithubSearchResult, {}, [("star_gazers", 1)], 10):
+                pass
+
+
+class BulkUpdaterTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        await initialize_mock_db()
+        await GithubSearchResult.insert_many([_result(i) for i in range(10)])
+
+    async def get_stored(self, field: str, value) -> int:
+        return await GithubSearchResult.find({field: value}).count()
+
+    async def test_operators_are_merged_and_flushed_by_batch(self):
+        async with BulkUpdater(GithubSearchResult, batch_size=4) as updater:
+            for i in range(10):
+                await updater.update(f"a/r{i:03}", Set({GithubSearchResult.main_tf: ["main.tf"]}),
+                                     Set({GithubSearchResult.downloaded: True}))
+
+            # two full batches were sent, the last two updates are still buffered
+            self.assertEqual(updater.written, 8)
+            self.assertEqual(await self.get_stored("downloaded", True), 8)
+
+        self.assertEqual(updater.written, 10)
+        self.assertEqual(await GithubSearchResult.find({"main_tf": ["main.tf"], "downloaded": True}).count(), 10)
+
+    async def test_nothing_buffered_sends_nothing(self):
+        async with BulkUpdater(GithubSearchResult) as updater:
+            pass
+
+        self.assertEqual(updater.written, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import asyncio
+import io
+import unittest
+from concurrent.futures import ThreadPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
+
+from one_off_scripts import pipeline, batch_analyzer
+from one_off_scripts.batch_analyzer import RepoAnalysisRecord, STATUS_OK, STATUS_FAILED
+from one_off_scripts.pipeline import Pipeline
+
+
+def _broken_future() -> Future:
+    future = Future()
+    future.set_exception(BrokenProcessPool("A process in the process pool was terminated abruptly"))
+    return future
+
+
+class BrokenExecutor(ThreadPoolExecutor):
+    # every submitted call fails like the ones in flight when a pool worker dies
+
+    def submit(self, *args, **kwargs) -> Future:
+        return _broken_future()
+
+
+class PoisonedExecutor(ThreadPoolExecutor):
+    # the worker running the poisoned repo dies
+
+    def __init__(self, poisoned: str):
+        super().__init__(max_workers=1)
+        self.poisoned = poisoned
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        return _broken_future() if args[0] == self.poisoned else super().submit(fn, *args, **kwargs)
+
+
+class PipelineTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.executors = [BrokenExecutor(max_workers=1), ThreadPoolExecutor(max_workers=1)]
+        self.results_file = io.StringIO()
+        self.pipeline = Pipeline(mock.AsyncMock(), self.results_file, ThreadPoolExecutor(max_workers=1),
+                                 ThreadPoolExecutor(max_workers=1), lambda: self.executors.pop(0))
+
+        patch = mock.patch.object(batch_analyzer, "analyze",
+                                  lambda repo_id: RepoAnalysisRecord(repo_id=repo_id, status=STATUS_OK))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def get_records(self) -> list[tuple[str, str]]:
+        return [(x.repo_id, x.status) for x in map(RepoAnalysisRecord.model_validate_json,
+                                                   self.results_file.getvalue().splitlines())]
+
+    async def test_broken_analysis_pool_is_replaced(self):
+        self.executors.append(ThreadPoolExecutor(max_workers=1))
+        broken = self.pipeline.analyze_executor
+
+        await asyncio.gather(self.pipeline.analyze("a/1"), self.pipeline.analyze("a/2"))
+        await self.pipeline.analyze("a/3")
+
+        self.assertIsNot(self.pipeline.analyze_executor, broken)
+        self.assertEqual(self.executors, [])
+        # the repos in flight on the broken pool were run again
+        self.assertEqual(self.get_records(), [("a/1", STATUS_OK), ("a/2", STATUS_OK), ("a/3", STATUS_OK)])
+
+    async def test_only_the_repo_killing_its_worker_fails(self):
+        self.executors.extend([PoisonedExecutor("a/2"), ThreadPoolExecutor(max_workers=1)])
+
+        await asyncio.gather(*(self.pipeline.analyze(f"a/{x}") for x in range(1, 4)))
+        await self.pipeline.analyze("a/4")
+
+        self.assertEqual(self.executors, [])
+        self.assertEqual(sorted(self.get_records()),
+                         [("a/1", STATUS_OK), ("a/2", STATUS_FAILED), ("a/3", STATUS_OK), ("a/4", STATUS_OK)])
+
+    async def test_failed_source_stops_the_others_before_closing_the_stages(self):
+        self.pipeline.analyze_executor = self.executors.pop()
+        search_cancelled = asyncio.Event()
+
+        async def feed_backlog(cutoff, completed):
+            await self.pipeline.analyze_stage.put("a/1")
+            raise RuntimeError("backlog failed")
+
+        async def feed_search(completed):
+            try:
+                await asyncio.Event().wait()
+            finally:
+                search_cancelled.set()
+
+        with mock.patch.object(pipeline, "PIPELINE_SEARCH", True), \
+                mock.patch.object(self.pipeline, "feed_backlog", feed_backlog), \
+                mock.patch.object(self.pipeline, "feed_search", feed_search), \
+                self.assertRaises(RuntimeError):
+            await self.pipeline.run(datetime(2020, 1, 1), set())
+
+        self.assertTrue(search_cancelled.is_set())
+        self.assertTrue(self.pipeline.stop.is_set())
+        # the stages were closed after the item was handled
+        self.assertEqual(self.get_records(), [("a/1", STATUS_OK)])
+        self.assertTrue(all(x.done() for x in self.pipeline.analyze_stage._tasks))
+
+    async def test_search_skips_the_analysed_repos(self):
+        async def harvest(on_inserted, stop):
+            await on_inserted([SimpleNamespace(id="a/1"), SimpleNamespace(id="a/2")])
+
+        with mock.patch.object(pipeline.github_search, "harvest", harvest):
+            await self.pipeline.feed_search({"a/1"})
+
+        queue = self.pipeline.discover_stage.queue
+        self.assertEqual(queue.qsize(), 1)
+        self.assertEqual(queue.get_nowait().id, "a/2")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from terraform_analyzer.core.profiling import SlowLog, Profiler, NOOP_PROFILER, PROFILE_MODE_OFF, \
+    PROFILE_MODE_SAMPLE, PROFILE_MODE_CPROFILE
+
+
+class SlowLogTest(unittest.TestCase):
+
+    def test_keeps_the_slowest_entries(self):
+        slow_log = SlowLog(3)
+
+        for seconds in (0.3, 0.1, 0.5, 0.2, 0.4, 0.05):
+            slow_log.add(f"file_{seconds}", seconds, lambda: 10)
+
+        self.assertEqual([x.seconds for x in slow_log.get_entries()], [0.5, 0.4, 0.3])
+
+    def test_size_is_only_computed_for_kept_entries(self):
+        slow_log = SlowLog(2)
+        sized: list[str] = []
+
+        def add(name: str, seconds: float):
+            slow_log.add(name, seconds, lambda: sized.append(name) or len(name))
+
+        for name, seconds in (("a", 0.2), ("b", 0.3), ("c", 0.1), ("d", 0.2), ("e", 0.4)):
+            add(name, seconds)
+
+        self.assertEqual(sized, ["a", "b", "e"])
+        self.assertEqual([(x.name, x.size) for x in slow_log.get_entries()], [("e", 1), ("b", 1)])
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.output = folder.name
+
+    def run_profiler(self, budget: float, mode: str = PROFILE_MODE_OFF) -> Profiler:
+        with Profiler("author/project", budget=budget, mode=mode, output_folder=self.output) as profiler:
+            for _ in range(2):
+                with profiler.stage("parse"):
+                    time.sleep(0.01)
+            profiler.record_file(__file__, 0.01)
+
+        return profiler
+
+    def test_within_budget_is_not_exported(self):
+        profiler = self.run_profiler(budget=60)
+
+        self.assertEqual(profiler.calls, {"parse": 2})
+        self.assertEqual(os.listdir(self.output), [])
+
+    def test_over_budget_is_exported(self):
+        self.run_profiler(budget=0)
+
+        with open(f"{self.output}/author_project.json") as file:
+            report = json.load(file)
+
+        self.assertEqual(report["name"], "author/project")
+        self.assertEqual(report["stages"]["parse"]["calls"], 2)
+        self.assertEqual(report["slow_files"], [{"name": __file__, "seconds": 0.01, "size": os.path.getsize(__file__)}])
+
+    def test_captures_are_exported(self):
+        self.run_profiler(budget=0, mode=PROFILE_MODE_SAMPLE)
+        self.run_profiler(budget=0, mode=PROFILE_MODE_CPROFILE)
+
+        self.assertEqual(sorted(os.listdir(self.output)),
+                         ["author_project.collapsed", "author_project.json", "author_project.pstats"])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(RuntimeError):
+            Profiler("author/project", mode="trace")
+
+
+class NoopProfilerTest(unittest.TestCase):
+
+    def test_records_nothing(self):
+        with NOOP_PROFILER as profiler:
+            with profiler.stage("parse"):
+                pass
+            profiler.add_timing("parse", 1.0)
+            profiler.record_file(__file__, 1.0)
+            profiler.record_resource("aws_sqs_queue.q", 1.0, {})
+
+        self.assertFalse(profiler.enabled)
+        self.assertIs(profiler.stage("parse"), profiler.stage("graph"))
+        self.assertEqual(profiler.timings, {})
+        self.assertEqual(profiler.slow_files.get_entries(), [])
+        self.assertEqual(profiler.slow_resources.get_entries(), [])
+        self.assertIsNone(profiler.export())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+from terraform_analyzer.core import repo_inventory
+
+
+def _write(path: str, content: str = ""):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        file.write(content)
+
+
+class RepoInventoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        _write(f"{self.root}/modules/vpc/main.tf")
+        _write(f"{self.root}/main.tf")
+        _write(f"{self.root}/README.md")
+
+    def test_walk(self):
+        inventory = repo_inventory.get_inventory(self.root)
+
+        self.assertEqual(inventory.file_count, 6)
+        self.assertEqual(inventory.main_candidates, ["main.tf", "modules/vpc/main.tf"])
+        self.assertEqual(inventory.tf_files, {"": ["main.tf"], "modules/vpc": ["main.tf"]})
+        self.assertEqual(inventory.get_root_main(), f"{self.root}/main.tf")
+        self.assertIsNone(inventory.list_folder(f"{self.root}/missing"))
+
+    def test_invalidate_drops_the_cached_inventory(self):
+        repo_inventory.get_inventory(self.root)
+        # deeper than the root, its mtime does not change
+        _write(f"{self.root}/modules/vpc/variables.tf")
+
+        self.assertEqual(repo_inventory.get_inventory(self.root).tf_files["modules/vpc"], ["main.tf"])
+
+        repo_inventory.invalidate(self.root)
+        repo_inventory.invalidate(self.root)
+
+        self.assertEqual(sorted(repo_inventory.get_inventory(self.root).tf_files["modules/vpc"]),
+                         ["main.tf", "variables.tf"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import unittest
+from datetime import datetime
+from typing import Optional
+from unittest import mock
+
+from github import Github, GithubException
+
+from one_off_scripts import GithubSearchResult, repo_main_fetcher
+from terraform_analyzer.external import github_manager
+from tests.mock_db import initialize_mock_db
+from tests.stub_server import StubServer, StubRequest, StubResponse
+
+
+def _blob(path: str) -> dict:
+    return {"path": path, "type": "blob", "sha": "1", "mode": "100644"}
+
+
+class RepoMainFetcherTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        asyncio.run(initialize_mock_db())
+
+    def setUp(self):
+        self.server = StubServer(self.route).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+        client = Github(base_url=self.server.url, retry=None)
+        patch = mock.patch.multiple(repo_main_fetcher, github_client=client, DISCOVERY_MODE="tree")
+        patch.start()
+        self.addCleanup(patch.stop)
+        patch = mock.patch.object(github_manager, "github_client", client)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def route(self, request: StubRequest) -> Optional[StubResponse]:
+        body = None
+        path = request.path.split("?")[0]
+
+        if path == "/repos/o/a/git/trees/main":
+            body = {"sha": "t", "truncated": False,
+                    "tree": [_blob("modules/x/main.tf"), _blob("main.tf"), _blob("m/main.tf"), _blob("x/main.tf.bak")]}
+        elif path == "/repos/o/large/git/trees/HEAD":
+            body = {"sha": "t", "truncated": True, "tree": []}
+        elif path == "/repos/o/large":
+            body = {"full_name": "o/large", "name": "large", "url": f"{self.server.url}/repos/o/large"}
+        elif path == "/repos/o/large/contents/":
+            body = [{"type": "dir", "path": "d", "name": "d"}]
+        elif path == "/repos/o/large/contents/d":
+            body = [{"type": "file", "path": "d/main.tf", "name": "main.tf"}]
+        elif path == "/repos/o/broken/git/trees/HEAD":
+            return StubResponse(500, b'{"message": "Server Error"}', {"Content-Type": "application/json"})
+
+        if body is None:
+            return None
+
+        return StubResponse(200, json.dumps(body).encode(), {"Content-Type": "application/json"})
+
+    def test_tree_listing_shallowest_first(self):
+        self.assertEqual(repo_main_fetcher.fetch_repo_mains("o/a", "main"), ["main.tf", "m/main.tf", "modules/x/main.tf"])
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_truncated_listing_falls_back_to_bfs(self):
+        self.assertEqual(repo_main_fetcher.fetch_repo_mains("o/large"), ["d/main.tf"])
+
+    def test_missing_repo_has_no_mains(self):
+        self.assertEqual(repo_main_fetcher.fetch_repo_mains("o/missing", "main"), [])
+
+    def test_failed_listing_is_raised(self):
+        with self.assertRaises(GithubException):
+            repo_main_fetcher.fetch_repo_mains("o/broken")
+
+    def test_failed_discovery_is_not_stored(self):
+        result = GithubSearchResult(id="o/broken", repo_name="broken", star_gazers=0, archived=False, is_fork=False,
+                                    created_at=datetime(2020, 1, 1), last_pushed_at=datetime(2020, 1, 1),
+                                    description=None, all_attributes={})
+
+        mains = asyncio.run(repo_main_fetcher.fetch_result_mains(result, asyncio.Semaphore(1)))
+
+        self.assertIsNone(mains)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import asyncio
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import requests
+
+from one_off_scripts import GithubSearchResult, repo_tf_fetcher
+from tests.mock_db import initialize_mock_db
+
+
+class DownloadRepoTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        asyncio.run(initialize_mock_db())
+
+    def setUp(self):
+        self.result = GithubSearchResult(id="a/p", repo_name="p", star_gazers=0, archived=False, is_fork=False,
+                                         created_at=datetime(2020, 1, 1), last_pushed_at=datetime(2020, 1, 1),
+                                         description=None, main_tf=["main.tf"],
+                                         all_attributes={"default_branch": "main"})
+
+        patch = mock.patch.object(repo_tf_fetcher, "fetch_hash", return_value="abc123")
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def download(self, error: Exception):
+        with mock.patch("terraform_analyzer.download_terraform", side_effect=error):
+            return repo_tf_fetcher.download_repo(self.result)
+
+    def test_unusable_repos_are_not_downloaded(self):
+        self.assertFalse(self.download(RuntimeError("'main.tf' does not exist")))
+
+        self.result.main_tf = ["a/main.tf", "b/main.tf"]
+        self.assertFalse(self.download(RuntimeError("not reached")))
+
+    def test_infrastructure_errors_are_raised(self):
+        with self.assertRaises(requests.ConnectionError):
+            self.download(requests.ConnectionError())
+
+        response = requests.Response()
+        response.status_code = 502
+        with self.assertRaises(requests.HTTPError):
+            self.download(requests.HTTPError(response=response))
+
+    def test_download(self):
+        with mock.patch("terraform_analyzer.download_terraform") as download_terraform:
+            self.assertTrue(repo_tf_fetcher.download_repo(self.result))
+
+        download_terraform.assert_called_once_with("a", "p", "abc123", "", "main.tf", repo_tf_fetcher.OUTPUT_FOLDER)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import itertools
+import tempfile
+import unittest
+from collections import deque
+from typing import Optional
+from unittest import mock
+
+from terraform_analyzer.core import LocalResource
+from terraform_analyzer.core.hcl import hcl_project_parser, CloudResourceType
+from terraform_analyzer.core.schema import schema_factory, schema_query, GraphTf, ComponentTf
+from terraform_analyzer.core.schema.schema_query import ReachabilityQuery, PathQuery, NeighbourhoodQuery, GraphIndex
+from tests.test_graph_tf import PROJECT
+
+TYPES = [CloudResourceType.AWS_LAMBDA, CloudResourceType.AWS_LAMBDA_PERMISSION, CloudResourceType.AWS_DYNAMO_DB,
+         CloudResourceType.AWS_SQS, CloudResourceType.AWS_SNS]
+FILTERS: list[Optional[frozenset[CloudResourceType]]] = [
+    None,
+    frozenset({CloudResourceType.AWS_SQS}),
+    frozenset({CloudResourceType.AWS_DYNAMO_DB, CloudResourceType.AWS_SNS}),
+    frozenset({CloudResourceType.AWS_LAMBDA, CloudResourceType.AWS_SQS})
+]
+
+
+def _name(component: ComponentTf) -> str:
+    return component.terraform_resource.get_qualified_name()
+
+
+class PlainGraph:
+    # reference implementation, breadth first walks over the components of a graph
+
+    def __init__(self, graph: GraphTf):
+        self.components: dict[str, ComponentTf] = {_name(x): x for x in graph.get_components()}
+        self.neighbours: dict[str, set[str]] = {x: set() for x in self.components}
+
+        for conn in graph.connections:
+            if isinstance(conn.a, ComponentTf) and isinstance(conn.b, ComponentTf) and conn.a != conn.b:
+                self.neighbours[_name(conn.a)].add(_name(conn.b))
+                self.neighbours[_name(conn.b)].add(_name(conn.a))
+
+    def get_type(self, name: str) -> CloudResourceType:
+        return self.components[name].get_cloud_resource_type()
+
+    def of_type(self, cloud_resource_type: CloudResourceType) -> list[str]:
+        return [x for x in self.components if self.get_type(x) == cloud_resource_type]
+
+    def reach(self, source: str, targets: frozenset[CloudResourceType],
+              through: Optional[frozenset[CloudResourceType]]) -> set[str]:
+        visited = {source}
+        reached: set[str] = set()
+        queue = deque(self.neighbours[source])
+
+        while queue:
+            name = queue.popleft()
+            if name in visited:
+                continue
+            visited.add(name)
+
+            if self.get_type(name) in targets:
+                reached.add(name)
+            elif through is None or self.get_type(name) in through:
+                queue.extend(self.neighbours[name])
+
+        return reached
+
+    def neighbourhood(self, source: str, k: int) -> set[str]:
+        distances = {source: 0}
+        queue = deque([source])
+
+        while queue:
+            name = queue.popleft()
+            if distances[name] == k:
+                continue
+            for neighbour in self.neighbours[name]:
+                if neighbour not in distances:
+                    distances[neighbour] = distances[name] + 1
+                    queue.append(neighbour)
+
+        return set(distances) - {source}
+
+    def paths(self, pattern: tuple[CloudResourceType, ...],
+              through: Optional[frozenset[CloudResourceType]]) -> list[tuple[str, ...]]:
+        paths = [(x,) for x in self.of_type(pattern[0])]
+
+        for target in pattern[1:]:
+            paths = [path + (x,) for path in paths for x in self.reach(path[-1], frozenset({target}), through)
+                     if x not in path]
+
+        return paths
+
+
+class GraphIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        folder = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(folder.cleanup)
+
+        with open(f"{folder.name}/main.tf", 'w') as file:
+            file.write(PROJECT)
+
+        cls.resources = hcl_project_parser.parse_project(
+            LocalResource(full_path=f"{folder.name}/main.tf", name="main.tf", is_directory=False))
+
+    def setUp(self):
+        self.graph: GraphTf = schema_factory.build_graph(self.resources)
+        self.plain = PlainGraph(self.graph)
+
+    def run_query(self, query) -> list[tuple[str, ...]]:
+        return sorted(tuple(_name(x) for x in result) for result in self.graph.query([query])[0])
+
+    def test_fixture_has_multi_hop_paths(self):
+        # orders -> writer -> jobs, the reach has to go through a component to be meaningful
+        reached = self.plain.reach("aws_dynamodb_table.orders.orders", frozenset({CloudResourceType.AWS_SQS}), None)
+
+        self.assertEqual(reached, {"aws_sqs_queue.jobs.jobs"})
+
+    def test_reachability(self):
+        for source, targets, through in itertools.product(TYPES, FILTERS[1:], FILTERS):
+            with self.subTest(source=source, targets=targets, through=through):
+                expected = sorted((x, y) for x in self.plain.of_type(source)
+                                  for y in self.plain.reach(x, targets, through))
+
+                query = ReachabilityQuery(source=source, targets=targets, through=through)
+                self.assertEqual(self.run_query(query), expected)
+
+    def test_path(self):
+        patterns = [tuple(x) for length in (1, 2, 3) for x in itertools.product(TYPES, repeat=length)]
+
+        for pattern, through in itertools.product(patterns, FILTERS):
+            with self.subTest(pattern=pattern, through=through):
+                self.assertEqual(self.run_query(PathQuery(pattern=pattern, through=through)),
+                                 sorted(self.plain.paths(pattern, through)))
+
+    def test_neighbourhood(self):
+        for source, k, types in itertools.product(TYPES, (1, 2, 3), FILTERS):
+            with self.subTest(source=source, k=k, types=types):
+                expected = sorted((x, y) for x in self.plain.of_type(source) for y in self.plain.neighbourhood(x, k)
+                                  if types is None or self.plain.get_type(y) in types)
+
+                self.assertEqual(self.run_query(NeighbourhoodQuery(source=source, k=k, types=types)), expected)
+
+    def test_transitive_connected(self):
+        # without a filter every neighbour is a target, so only the direct neighbours are returned
+        for name, filter_by in itertools.product(self.plain.components, FILTERS):
+            with self.subTest(component=name, filter_by=filter_by):
+                component = self.plain.components[name]
+                expected = self.plain.reach(name, filter_by or frozenset(TYPES), None)
+
+                self.assertEqual({_name(x) for x in self.graph.get_transitive_connected(component, filter_by)},
+                                 expected)
+                self.assertEqual({_name(x) for x in self.graph._walk_transitive_connected(component, filter_by)},
+                                 expected)
+
+    def test_graphs_over_the_limit_are_walked(self):
+        component = self.plain.components["aws_dynamodb_table.orders.orders"]
+        filter_by = {CloudResourceType.AWS_SQS}
+
+        with mock.patch.object(schema_query, "MAX_INDEX_COMPONENTS", 3), \
+                mock.patch("terraform_analyzer.core.schema.MAX_INDEX_COMPONENTS", 3):
+            with self.assertRaises(RuntimeError):
+                GraphIndex(self.graph.get_components(), self.graph.connections)
+
+            connected = self.graph.get_transitive_connected(component, filter_by)
+
+        self.assertEqual([_name(x) for x in connected], ["aws_sqs_queue.jobs.jobs"])
+
+
+if __name__ == '__main__':
+    unittest.main()
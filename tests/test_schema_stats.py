@@ -0,0 +1,85 @@
+import tempfile
+import unittest
+from typing import Optional
+
+import numpy as np
+
+from terraform_analyzer.core import LocalResource
+from terraform_analyzer.core.hcl import hcl_project_parser, CloudResourceType, CLOUD_RESOURCE_TYPE_INDEX
+from terraform_analyzer.core.schema import schema_factory, GraphTf
+from terraform_analyzer.core.schema import schema_stats
+from terraform_analyzer.core.schema.schema_stats import ConnectionTypeStats
+from tests.test_graph_tf import PROJECT
+
+LAMBDA = CLOUD_RESOURCE_TYPE_INDEX[CloudResourceType.AWS_LAMBDA]
+SQS = CLOUD_RESOURCE_TYPE_INDEX[CloudResourceType.AWS_SQS]
+DYNAMO_DB = CLOUD_RESOURCE_TYPE_INDEX[CloudResourceType.AWS_DYNAMO_DB]
+
+
+def _load_graph(item: tuple[str, int]) -> Optional[GraphTf]:
+    # module level, the parallel aggregate runs it in the worker processes
+    (main_path, resource_count) = item
+
+    if resource_count < 0:
+        raise RuntimeError("unloadable graph")
+
+    resources = hcl_project_parser.parse_project(LocalResource(full_path=main_path, name="main.tf", is_directory=False))
+
+    return schema_factory.build_graph(resources[:resource_count]) if resource_count else None
+
+
+class ConnectionTypeStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+
+        self.main_path = f"{folder.name}/main.tf"
+        with open(self.main_path, 'w') as file:
+            file.write(PROJECT)
+
+    def test_add_codes(self):
+        stats = ConnectionTypeStats()
+        stats.add_codes(np.array([[LAMBDA, SQS], [LAMBDA, SQS], [LAMBDA, DYNAMO_DB]]), np.array([LAMBDA, SQS, SQS]))
+        stats.add_codes(np.array([[LAMBDA, SQS]]), np.array([LAMBDA, SQS, DYNAMO_DB]))
+        # no connections at all
+        stats.add_codes(np.empty((0, 2)), np.array([DYNAMO_DB]))
+
+        self.assertEqual(stats.repo_count, 3)
+        self.assertEqual(stats.get_connection_histogram(), {
+            (CloudResourceType.AWS_LAMBDA, CloudResourceType.AWS_SQS): 3,
+            (CloudResourceType.AWS_LAMBDA, CloudResourceType.AWS_DYNAMO_DB): 1})
+        self.assertEqual(stats.get_connection_histogram(per_repo=True), {
+            (CloudResourceType.AWS_LAMBDA, CloudResourceType.AWS_SQS): 2,
+            (CloudResourceType.AWS_LAMBDA, CloudResourceType.AWS_DYNAMO_DB): 1})
+        self.assertEqual(stats.get_resource_histogram(), {CloudResourceType.AWS_LAMBDA: 2,
+                                                          CloudResourceType.AWS_SQS: 3,
+                                                          CloudResourceType.AWS_DYNAMO_DB: 2})
+        self.assertEqual(stats.get_resource_histogram(per_repo=True), {CloudResourceType.AWS_LAMBDA: 2,
+                                                                       CloudResourceType.AWS_SQS: 2,
+                                                                       CloudResourceType.AWS_DYNAMO_DB: 2})
+        self.assertEqual(stats.co_occurrence[LAMBDA, SQS], 2)
+        self.assertEqual(stats.co_occurrence[SQS, DYNAMO_DB], 1)
+
+    def test_merge_matches_a_single_aggregate(self):
+        graphs = [_load_graph((self.main_path, x)) for x in range(1, 8)]
+
+        merged = schema_stats.aggregate(graphs[:3]).merge(schema_stats.aggregate(graphs[3:]))
+
+        self.assertEqual(merged.to_dict(), schema_stats.aggregate(graphs).to_dict())
+
+    def test_parallel_aggregate_matches_the_serial_one(self):
+        # None and failing loads are skipped by both
+        items = [(self.main_path, x) for x in (0, 1, 2, 3, 4, 5, 6, 7, -1, 7)]
+        graphs = [_load_graph(x) for x in items if x[1] > 0]
+
+        parallel = schema_stats.aggregate_parallel(items, _load_graph, max_workers=2, chunk_size=3)
+        serial = schema_stats.aggregate(graphs)
+
+        self.assertEqual(parallel.repo_count, 8)
+        self.assertGreater(parallel.get_total_connections(), 0)
+        self.assertEqual(parallel.to_dict(), serial.to_dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
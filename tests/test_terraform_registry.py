@@ -0,0 +1,85 @@
+import json
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from terraform_analyzer.external import terraform_registry
+from terraform_analyzer.external.terraform_registry import RegistryCache
+from tests.stub_server import StubServer, StubRequest, StubResponse
+
+MODULE_INFO = {
+    "id": "acme/network/aws/1.2.0",
+    "source": "https://github.com/acme/terraform-aws-network",
+    "version": "1.2.0",
+    "tag": "v1.2.0",
+    "root": {"provider_dependencies": []},
+}
+
+
+class TerraformRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.failures = {"flaky": 1}
+        self.server = StubServer(self.route).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+        for patcher in (mock.patch.object(terraform_registry, "TERRAFORM_REGISTRY_MODULES_URL",
+                                          f"{self.server.url}/v1/modules"),
+                        mock.patch.object(terraform_registry, "_CACHE",
+                                          RegistryCache(f"{tempfile.mkdtemp()}/registry.sqlite"))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def route(self, request: StubRequest):
+        namespace = request.path.split("/")[3]
+
+        if namespace == "flaky" and self.failures["flaky"]:
+            self.failures["flaky"] -= 1
+            return StubResponse(502, b"bad gateway")
+        elif namespace in ("acme", "flaky"):
+            return StubResponse(200, json.dumps(MODULE_INFO).encode(), {"Content-Type": "application/json"})
+
+        return None
+
+    def test_resolves_to_the_tagged_github_source(self):
+        source = terraform_registry.resolve_source("acme/network/aws//modules/vpc")
+
+        self.assertEqual(source.source, "git::https://github.com/acme/terraform-aws-network.git//modules/vpc?ref=v1.2.0")
+        self.assertEqual(source.version, "1.2.0")
+
+    def test_missing_module_is_cached(self):
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                terraform_registry.resolve_source("missing/network/aws")
+
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_server_errors_are_not_cached(self):
+        with self.assertRaises(RuntimeError):
+            terraform_registry.resolve_source("flaky/network/aws")
+
+        self.assertEqual(terraform_registry.resolve_source("flaky/network/aws").version, "1.2.0")
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_network_errors_are_not_cached(self):
+        with mock.patch.object(terraform_registry, "TERRAFORM_REGISTRY_MODULES_URL", "http://127.0.0.1:1/v1/modules"):
+            with self.assertRaises(RuntimeError):
+                terraform_registry.resolve_source("acme/network/aws")
+
+        self.assertEqual(terraform_registry.resolve_source("acme/network/aws").version, "1.2.0")
+
+    def test_key_locks_are_released(self):
+        threads = [threading.Thread(target=terraform_registry.resolve_source, args=("acme/network/aws",))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(terraform_registry._KEY_LOCKS, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
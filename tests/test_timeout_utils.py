@@ -0,0 +1,37 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from terraform_analyzer.core.hcl.timeout_utils import timeout
+
+
+@timeout(1)
+def sleep_for(seconds: float) -> str:
+    time.sleep(seconds)
+    return "done"
+
+
+@timeout(1)
+def fail():
+    raise ValueError("failed")
+
+
+class TimeoutTest(unittest.TestCase):
+
+    def test_main_thread(self):
+        self.assertIs(threading.current_thread(), threading.main_thread())
+
+        self.assertEqual(sleep_for(0), "done")
+        self.assertRaises(TimeoutError, sleep_for, 3)
+        self.assertRaises(ValueError, fail)
+
+    def test_worker_thread(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(executor.submit(sleep_for, 0).result(), "done")
+            self.assertRaises(TimeoutError, executor.submit(sleep_for, 3).result)
+            self.assertRaises(ValueError, executor.submit(fail).result)
+
+
+if __name__ == '__main__':
+    unittest.main()
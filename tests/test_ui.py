@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+from collections import OrderedDict
+from unittest import mock
+
+import networkx as nx
+
+from terraform_analyzer import ui
+
+
+def _path_graph(size: int) -> nx.Graph:
+    graph = nx.Graph()
+    nx.add_path(graph, [f"n{i}" for i in range(size)])
+    return graph
+
+
+class LayoutCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+
+        patch = mock.patch.multiple(ui, _LAYOUT_CACHE=OrderedDict(), MAX_CACHED_LAYOUTS=2)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_memory_cache_is_bounded_least_recently_used_first(self):
+        graphs = [_path_graph(x) for x in (2, 3, 4)]
+
+        first = ui.get_layout(graphs[0], 0.7, self.folder)
+        ui.get_layout(graphs[1], 0.7, self.folder)
+        # used again, so the second graph is the one evicted
+        ui.get_layout(graphs[0], 0.7, self.folder)
+        ui.get_layout(graphs[2], 0.7, self.folder)
+
+        self.assertEqual(list(ui._LAYOUT_CACHE), [ui._get_graph_key(x, 0.7) for x in (graphs[0], graphs[2])])
+        self.assertEqual(len(os.listdir(self.folder)), 3)
+
+        with mock.patch.object(ui, "_compute_layout") as compute_layout:
+            self.assertEqual(ui.get_layout(graphs[0], 0.7, self.folder), first)
+            # evicted from memory, read back from the layout cache folder
+            ui.get_layout(graphs[1], 0.7, self.folder)
+
+        compute_layout.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()